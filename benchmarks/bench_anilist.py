@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from stub_server import start_stub_server
+from suite import Result, benchmark, latency_results, throughput
+from utils.anilist import AniListAPI
+from utils.circuit import CircuitBreaker
+
+"""
+
+    AniListAPI throughput against the stub server, with and without 429s.
+
+"""
+
+
+async def drive(api, requests, concurrency):
+    """Fire get_media calls with bounded concurrency; returns (elapsed, latencies, successes)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    successes = 0
+
+    async def one(anime_id):
+        nonlocal successes
+        async with semaphore:
+            started = time.perf_counter()
+            media = await api.get_media(anime_id, profile="card")
+            latencies.append(time.perf_counter() - started)
+            successes += media is not None
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(150000 + i) for i in range(requests)))
+    return time.perf_counter() - started, latencies, successes
+
+
+async def run_case(name, config, requests, concurrency):
+    stub, runner, url = await start_stub_server(config=config, seed=0)
+    # Own breaker so a tripped circuit here never leaks into another case
+    api = AniListAPI(base_url=url + "/anilist", breaker=CircuitBreaker(f"AniList {name}"))
+    try:
+        elapsed, latencies, successes = await drive(api, requests, concurrency)
+    finally:
+        await api.cleanup()
+        await runner.cleanup()
+
+    results = [
+        throughput(f"anilist.{name}.throughput", successes, elapsed, "req/s"),
+        Result(f"anilist.{name}.success_ratio", successes / requests, "ratio", True),
+    ]
+    results += latency_results(f"anilist.{name}.latency", latencies, unit="ms", percentiles=(0.50, 0.95))
+    return results
+
+
+@benchmark("anilist.client")
+async def anilist_client(options):
+    requests = 2000 if options.full else 600
+    results = await run_case("clean", {"latency_ms": 20, "jitter_ms": 10}, requests, 30)
+    # Every 40th request is a 429 with a short Retry-After the client is expected to wait out
+    results += await run_case(
+        "rate_limited",
+        {"latency_ms": 20, "jitter_ms": 10, "rate_limit_every": 40, "retry_after": 1},
+        requests, 30
+    )
+    return results
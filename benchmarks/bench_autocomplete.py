@@ -0,0 +1,34 @@
+import time
+
+from suite import benchmark, latency_results
+from utils.genres import complete_genres, parse_genres
+
+"""
+
+    Per-keystroke cost of the /anilist recommend genre autocomplete.
+
+"""
+
+# What people actually type: empty box, prefixes, aliases, typos and long lists
+INPUTS = [
+    "", "a", "act", "sci", "slice of l", "shonen", "mahou shojo", "psych",
+    "Action, com", "Action, Comedy, Drama, fan", "romcom", "xyzzy", "Isekai, Fantasy, Adventure, Ma",
+]
+
+
+def sample(func, inputs, rounds):
+    samples = []
+    for _ in range(rounds):
+        for text in inputs:
+            started = time.perf_counter()
+            func(text)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+@benchmark("autocomplete.genres")
+async def genre_autocomplete(options):
+    rounds = 2000 if options.full else 500
+    results = latency_results("autocomplete.complete_genres", sample(complete_genres, INPUTS, rounds))
+    results += latency_results("autocomplete.parse_genres", sample(parse_genres, INPUTS, rounds))
+    return results
@@ -0,0 +1,103 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+
+from nextcord.ext import commands
+
+from discord_harness import DiscordHarness, default_intents
+from suite import Result, benchmark
+from launcher import shard_ranges
+from utils import sharding
+from utils.leader import FileLeaderLock
+
+"""
+
+    Leader election across cluster processes (launcher.py).
+
+    Spawns one process per shard range, each driving its own bot through the
+    fake Discord with SHARD_IDS/SHARD_COUNT as the launcher would set them,
+    and electing a leader through a FileLeaderLock. Measures how long the
+    cluster takes to come up with exactly one leader, then kills the leader
+    and measures how long the others take to elect a new one.
+
+"""
+
+LOCK_INTERVAL = 0.05
+
+
+async def run_cluster(cluster_id, shard_ids, shard_count, lock_path, reports):
+    # The harness is one gateway per bot, so each process runs the first shard of its range
+    bot = commands.Bot(command_prefix="$", intents=default_intents(), guild_ready_timeout=0.1,
+                       shard_id=shard_ids[0], shard_count=shard_count)
+    bot.leader = FileLeaderLock("bench_cluster", lock_path, interval=LOCK_INTERVAL)
+    async with DiscordHarness(bot=bot, enforce_limits=False) as harness:
+        harness.world.add_guild(members=50)
+        await harness.connect()
+        bot.leader.start()
+        await sharding.wait_for_election(bot)
+        while True:
+            reports.put((cluster_id, sharding.is_elected(bot), time.perf_counter()))
+            await asyncio.sleep(LOCK_INTERVAL / 2)
+
+
+def cluster_process(cluster_id, shard_ids, shard_count, lock_path, reports):
+    asyncio.run(run_cluster(cluster_id, shard_ids, shard_count, lock_path, reports))
+
+
+def wait_for(reports, states, condition, timeout=30):
+    """Read reports into states ({cluster: elected}) until condition(states) holds; returns when it did"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            cluster_id, elected, at = reports.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        states[cluster_id] = elected
+        if condition(states):
+            return at
+    raise RuntimeError(f"Cluster did not settle within {timeout}s: {states}")
+
+
+def failover(workers, shard_count):
+    context = multiprocessing.get_context("spawn")
+    reports = context.Queue()
+    lock_path = os.path.join(tempfile.mkdtemp(prefix="bench-cluster-"), "leader.lock")
+    processes = {}
+    started = time.perf_counter()
+    try:
+        for cluster_id, shard_ids in enumerate(shard_ranges(shard_count, workers)):
+            process = context.Process(target=cluster_process, args=(cluster_id, shard_ids, shard_count, lock_path, reports), daemon=True)
+            process.start()
+            processes[cluster_id] = process
+
+        states = {}
+        wait_for(reports, states, lambda s: len(s) == len(processes) and sum(s.values()) == 1)
+        startup = time.perf_counter() - started
+
+        leader = next(cluster_id for cluster_id, elected in states.items() if elected)
+        killed = time.perf_counter()
+        # SIGKILL, so nothing is released politely; the kernel drops the lock with the process
+        processes.pop(leader).kill()
+        states = {}
+        elected_at = wait_for(reports, states, lambda s: any(elected for cluster_id, elected in s.items() if cluster_id != leader))
+        if sum(elected for cluster_id, elected in states.items() if cluster_id != leader) != 1:
+            raise RuntimeError(f"Expected one new leader, got {states}")
+        return startup, elected_at - killed
+    finally:
+        for process in processes.values():
+            process.kill()
+            process.join()
+
+
+@benchmark("cluster.leader")
+async def leader_failover(options):
+    workers = 4 if options.full else 3
+    startup, elapsed = await asyncio.to_thread(failover, workers, workers * 2)
+    print(f"  {workers} clusters up with one leader in {startup:.2f}s, new leader {elapsed * 1000:.0f}ms after killing it")
+    return [
+        Result("cluster.leader.startup_s", startup, "s", False),
+        Result("cluster.leader.failover_ms", elapsed * 1000, "ms", False),
+    ]
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from fixtures import synthetic_season_page
+from suite import benchmark, throughput
+from utils.db import DatabaseManager
+
+"""
+
+    DatabaseManager upsert throughput against a real MySQL server.
+
+    Only runs with `run.py --mysql`, against the database named by the DB_*
+    variables. Point DB_NAME at a scratch database: the tables are created if
+    missing and filled with synthetic anime.
+
+"""
+
+
+def synthetic_catalog(count):
+    media = []
+    seed = 0
+    while len(media) < count:
+        media.extend(synthetic_season_page(count=50, seed=seed)["data"]["Page"]["media"])
+        seed += 1
+    return media[:count]
+
+
+@benchmark("database.upsert")
+async def database_upsert(options):
+    if not options.mysql:
+        print("  skipped, pass --mysql to run against DB_* (use a scratch database)")
+        return []
+
+    db = DatabaseManager()
+    if await asyncio.to_thread(db.ensure_pool) is None:
+        raise RuntimeError("Could not connect to MySQL with the DB_* settings")
+    await db.setup_database()
+
+    rows = 20000 if options.full else 5000
+    catalog = synthetic_catalog(rows)
+    schedules = [(media["id"], episode, 1792000000 + episode * 3600) for media in catalog for episode in (1, 2)]
+
+    # First pass inserts, the second updates every row
+    results = []
+    for label in ("insert", "update"):
+        started = time.perf_counter()
+        await db.bulk_cache_anime(catalog)
+        results.append(throughput(f"database.bulk_cache_anime.{label}", rows, time.perf_counter() - started, "rows/s"))
+
+    started = time.perf_counter()
+    await db.bulk_update_airing_schedule(schedules)
+    results.append(throughput("database.bulk_update_airing_schedule", len(schedules), time.perf_counter() - started, "rows/s"))
+    return results
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import tempfile
+import time
+from io import BytesIO
+
+import nextcord
+from PIL import Image
+
+from discord_harness import DiscordHarness
+from suite import Result, benchmark, latency_results, throughput
+from utils import membercache
+from utils import rendering
+
+"""
+
+    Greeting banner rendering and the on_member_join path of MemberEvents.
+
+"""
+
+
+def png_avatar(size, seed):
+    avatar = Image.effect_noise((size, size), 64).convert("RGB")
+    avatar.paste((seed * 37 % 256, 90, 160), (0, 0, size // 2, size // 2))
+    buffer = BytesIO()
+    avatar.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@benchmark("greetings.banner")
+async def greeting_banner(options):
+    """rendering.render_banner alone, as a pool worker runs it, over a full-size JPEG background"""
+    renders = 500 if options.full else 150
+    workdir = tempfile.mkdtemp(prefix="bench-banner-")
+    os.makedirs(os.path.join(workdir, "assets"))
+    # Gradients with a little grain compress like artwork, where pure noise would only measure zlib
+    radial = Image.radial_gradient("L").resize((1920, 640))
+    background = Image.merge("RGB", (radial, Image.linear_gradient("L").resize((1920, 640)), radial.transpose(Image.FLIP_LEFT_RIGHT)))
+    background = Image.blend(background, Image.effect_noise((1920, 640), 12).convert("RGB"), 0.15)
+    background.save(os.path.join(workdir, "assets", "welcome_banner.jpg"), quality=90)
+    # Tiles as AvatarCache keeps them; decoding happens once per avatar, outside the worker
+    avatars = [rendering.decode_avatar(png_avatar(128, seed)) for seed in range(16)]
+
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        samples = []
+        for index in range(renders):
+            started = time.perf_counter()
+            rendering.render_banner("welcome", avatars[index % len(avatars)])
+            samples.append(time.perf_counter() - started)
+    finally:
+        os.chdir(previous_cwd)
+
+    return [throughput("greetings.banner.throughput", len(samples), sum(samples), "img/s")] + \
+        latency_results("greetings.banner.latency", samples, unit="ms")
+
+
+@benchmark("greetings.render")
+async def greeting_render(options):
+    renders = 200 if options.full else 50
+    async with DiscordHarness(enforce_limits=False) as harness:
+        guild = harness.world.add_guild(members=renders)
+        harness.load_extension("cogs.Events.greetings")
+        await harness.connect()
+
+        cog = harness.bot.get_cog("MemberEvents")
+        # The cog loader starts the pool in cog_setup, before the first join
+        await cog.renderer.start()
+        user_ids = [int(member["user"]["id"]) for member in guild["members"][:renders]]
+        members = await membercache.find_members(harness.bot.get_guild(int(guild["id"])), user_ids)
+        # First pass downloads every avatar, the second (a rejoin or /greetings test) finds them cached
+        passes = []
+        for _ in range(2):
+            samples = []
+            for member in members:
+                started = time.perf_counter()
+                await cog.create_welcome_image(member)
+                samples.append(time.perf_counter() - started)
+            passes.append(samples)
+        downloads = sum(1 for hit in harness.server.hits if hit["route"] == "cdn avatar")
+        print(f"  {downloads} avatar downloads for {2 * len(members)} banners")
+
+    cold, warm = passes
+    return [throughput("greetings.render.throughput", len(cold), sum(cold), "img/s")] + \
+        latency_results("greetings.render.latency", cold, unit="ms") + \
+        latency_results("greetings.render.cached_avatar", warm, unit="ms")
+
+
+@benchmark("greetings.join_burst")
+async def greeting_join_burst(options):
+    joins = 500 if options.full else 100
+    async with DiscordHarness(enforce_limits=False) as harness:
+        guild = harness.world.add_guild(members=10000)
+        harness.load_extension("cogs.Events.greetings")
+        await harness.connect()
+
+        cog = harness.bot.get_cog("MemberEvents")
+        welcome_channel = next(c for c in guild["channels"] if c["type"] == 0)
+        cog._save_channel(guild["id"], welcome_channel["id"])
+        # Shorter than the 5s and 10s defaults so the run stays short; delays scale with the interval
+        cog.burst_interval = 1.0
+        cog.burst_window = 2.0
+
+        # Seconds after the burst started that each member's welcome went out
+        welcomed = []
+        send_welcome, send_batch = cog.send_welcome_message, cog.send_batch_welcome
+
+        async def timed_welcome(member):
+            await send_welcome(member)
+            welcomed.append(time.perf_counter() - started)
+
+        async def timed_batch(guild, members):
+            await send_batch(guild, members)
+            welcomed.extend([time.perf_counter() - started] * len(members))
+
+        cog.send_welcome_message, cog.send_batch_welcome = timed_welcome, timed_batch
+
+        renders_before = sum(rendering.RENDERS.get(template="welcome", result=result) for result in ("rendered", "shed"))
+        started = time.perf_counter()
+        for _ in range(joins):
+            harness.member_join(guild["id"])
+        await harness.drain(timeout=600)
+        # Flushing carries on until a burst_window passes without joins; only the welcomes count
+        while cog.flush_tasks:
+            await asyncio.gather(*list(cog.flush_tasks.values()))
+
+        if len(welcomed) != joins:
+            raise RuntimeError(f"Only {len(welcomed)} of {joins} members were welcomed")
+        sent = sum(1 for call in harness.calls if call["route"] == "/channels/{channel_id}/messages")
+        renders = sum(rendering.RENDERS.get(template="welcome", result=result) for result in ("rendered", "shed")) - renders_before
+        print(f"  {joins} joins welcomed in {sent} messages with {renders} banner renders")
+
+    return [throughput("greetings.join_burst.throughput", joins, max(welcomed), "joins/s"),
+            Result("greetings.join_burst.messages_per_join", sent / joins, "msg", False),
+            Result("greetings.join_burst.renders_per_join", renders / joins, "img", False)] + \
+        latency_results("greetings.join_burst.welcome_delay", welcomed, unit="ms", percentiles=(0.50, 0.95))
+
+
+@benchmark("greetings.custom_image")
+async def greeting_custom_image(options):
+    """A join burst in a guild with a custom welcome image, checked once when it was saved"""
+    joins = 500 if options.full else 100
+    async with DiscordHarness(enforce_limits=False) as harness:
+        guild = harness.world.add_guild(members=100)
+        harness.load_extension("cogs.Events.greetings")
+        await harness.connect()
+
+        cog = harness.bot.get_cog("MemberEvents")
+        welcome_channel = next(c for c in guild["channels"] if c["type"] == 0)
+        cog._save_channel(guild["id"], welcome_channel["id"])
+        # Served by the fake CDN, which answers HEAD like the real one
+        image_url = nextcord.Asset.BASE + "/embed/avatars/0.png"
+        cog._save_message(guild["id"], "welcome", "Welcome {user}!", image_url)
+        # One welcome per join, so every join reads the remembered check instead of a batch reading it once;
+        # greetings.join_burst covers the batched path
+        cog.burst_threshold = joins
+        await cog.image_urls.check(image_url)
+
+        checks_before = sum(1 for hit in harness.server.hits if hit["route"] == "cdn avatar")
+        started = time.perf_counter()
+        for _ in range(joins):
+            harness.member_join(guild["id"])
+        await harness.drain(timeout=600)
+        elapsed = time.perf_counter() - started
+        checks = sum(1 for hit in harness.server.hits if hit["route"] == "cdn avatar") - checks_before
+
+        sent = [call for call in harness.calls if call["route"] == "/channels/{channel_id}/messages"]
+        if len(sent) != joins:
+            raise RuntimeError(f"Only {len(sent)} of {joins} welcome messages were sent")
+        print(f"  {checks} image requests for {joins} joins")
+
+    finish_times = [call["started"] + call["duration"] - started for call in sent]
+    return [throughput("greetings.custom_image.throughput", joins, elapsed, "joins/s"),
+            Result("greetings.custom_image.requests_per_join", checks / joins, "req", False)] + \
+        latency_results("greetings.custom_image.welcome_delay", finish_times, unit="ms", percentiles=(0.50, 0.95))
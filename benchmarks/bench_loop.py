@@ -0,0 +1,110 @@
+import asyncio
+import multiprocessing
+import time
+
+from discord_harness import DiscordHarness
+from suite import benchmark, latency_results, percentile, throughput
+from utils import runtime
+
+"""
+
+    The default asyncio loop and executor against the tuned runtime
+    (utils/runtime.py: uvloop when installed, plus the named executors).
+
+    events: MESSAGE_CREATE payloads fed through the gateway parsers to an
+            on_message listener, one per loop iteration, as the websocket
+            would deliver them.
+    db_under_image_burst: short blocking "queries" submitted while a burst
+            of longer "renders" is queued. On the default loop both share
+            the one default executor; tuned, they go to the db and image
+            pools. Both sleep rather than compute, like MySQL waits and PIL
+            with the GIL released, so the result is queueing, not CPU.
+
+    Each variant runs in a fresh process, since the loop policy is global.
+
+"""
+
+QUERY_SECONDS = 0.002
+RENDER_SECONDS = 0.03
+
+
+async def event_throughput(events):
+    async with DiscordHarness(enforce_limits=False) as harness:
+        guild = harness.world.add_guild(members=10)
+        await harness.connect()
+        channel = next(c for c in guild["channels"] if c["type"] == 0)
+        author = guild["members"][1]["user"]
+        payload = harness.world.message(int(channel["id"]), {"content": "hello"}, author=author)
+        seen = 0
+        done = asyncio.Event()
+
+        async def on_message(message):
+            nonlocal seen
+            seen += 1
+            if seen == events:
+                done.set()
+
+        harness.bot.add_listener(on_message)
+        started = time.perf_counter()
+        for _ in range(events):
+            harness.gateway.dispatch_soon("MESSAGE_CREATE", payload)
+        await asyncio.wait_for(done.wait(), 120)
+        return time.perf_counter() - started
+
+
+async def db_under_image_burst(tuned, renders, queries):
+    if tuned:
+        def submit(pool, func):
+            return runtime.run_in(pool, func)
+    else:
+        def submit(pool, func):
+            return asyncio.to_thread(func)
+
+    async def query():
+        started = time.perf_counter()
+        await submit("db", lambda: time.sleep(QUERY_SECONDS))
+        return time.perf_counter() - started
+
+    burst = [asyncio.ensure_future(submit("image", lambda: time.sleep(RENDER_SECONDS))) for _ in range(renders)]
+    await asyncio.sleep(0)
+    samples = []
+    for _ in range(queries):
+        samples.append(await query())
+    await asyncio.gather(*burst)
+    return samples
+
+
+async def measure(tuned, events, renders, queries):
+    elapsed = await event_throughput(events)
+    samples = await db_under_image_burst(tuned, renders, queries)
+    return elapsed, samples, type(asyncio.get_running_loop()).__module__.split(".")[0]
+
+
+def variant_process(tuned, events, renders, queries, results):
+    if tuned:
+        runtime.install_event_loop()
+    results.put(asyncio.run(measure(tuned, events, renders, queries)))
+
+
+@benchmark("loop.runtime")
+async def loop_runtime(options):
+    events = 50000 if options.full else 20000
+    renders = 200 if options.full else 100
+    queries = 50 if options.full else 20
+    if runtime.uvloop is None:
+        print("  uvloop is not installed, so tuned runs on the asyncio loop with the named executors only")
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for variant, tuned in (("default", False), ("tuned", True)):
+        queue = context.Queue()
+        process = context.Process(target=variant_process, args=(tuned, events, renders, queries, queue))
+        process.start()
+        elapsed, samples, loop_name = await asyncio.to_thread(queue.get, True, 600)
+        await asyncio.to_thread(process.join)
+
+        print(f"  {variant} ({loop_name}): {events / elapsed:.0f} events/s, "
+              f"query p99 during a {renders} render burst {percentile(samples, 0.99) * 1000:.1f}ms")
+        results.append(throughput(f"loop.runtime.{variant}.events", events, elapsed, "events/s"))
+        results.extend(latency_results(f"loop.runtime.{variant}.db_under_image_burst", samples, unit="ms"))
+    return results
@@ -0,0 +1,61 @@
+import asyncio
+import gc
+import multiprocessing
+
+from discord_harness import DiscordHarness
+from suite import Result, benchmark
+from utils import metrics
+
+"""
+
+    Resident memory of the member cache per 10k members, for each
+    membercache profile (CACHE_PROFILE).
+
+    Each profile runs in a fresh process so allocator state from one never
+    flatters the other. The fake world is built first, then RSS is sampled
+    before and after the bot connects and has chunked (full) or skipped
+    (lean) every member, so the difference is the bot's own caches.
+
+"""
+
+
+async def measure(profile, guilds, members):
+    async with DiscordHarness(enforce_limits=False, cache_profile=profile) as harness:
+        for _ in range(guilds):
+            harness.world.add_guild(members=members)
+        gc.collect()
+        before = metrics.resident_memory()
+
+        await harness.connect(timeout=120)
+        await harness.drain()
+        gc.collect()
+        after = metrics.resident_memory()
+        cached = sum(len(guild.members) for guild in harness.bot.guilds)
+        return after - before, cached
+
+
+def profile_process(profile, guilds, members, results):
+    results.put(asyncio.run(measure(profile, guilds, members)))
+
+
+@benchmark("memory.member_cache")
+async def member_cache(options):
+    if metrics.resident_memory() is None:
+        print("  skipped, RSS is not available on this platform")
+        return []
+
+    guilds = 5 if options.full else 2
+    members = 10000
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for profile in ("full", "lean"):
+        queue = context.Queue()
+        process = context.Process(target=profile_process, args=(profile, guilds, members, queue))
+        process.start()
+        grown, cached = await asyncio.to_thread(queue.get, True, 600)
+        await asyncio.to_thread(process.join)
+
+        per_10k = grown / (guilds * members / 10000) / 2**20
+        print(f"  {profile}: {per_10k:.1f} MiB RSS per 10k members, {cached} members cached")
+        results.append(Result(f"memory.member_cache.{profile}.rss_per_10k_mib", per_10k, "MiB", False))
+    return results
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+
+from discord_harness import DiscordHarness
+from stub_server import start_stub_server, stub_environment
+from suite import benchmark, throughput
+
+"""
+
+    New episode notification fan-out (AnimeCog.check_airing) at 1k/10k/100k subscribers.
+
+    The cog runs unmodified against the fake Discord with rate limits off, so
+    the number is the bot's own cost per notification. Its DatabaseManager is
+    swapped for FanoutDatabase, which answers the calls check_airing makes
+    from memory; --db-latency adds a simulated round trip to each of them.
+
+"""
+
+
+class FanoutDatabase:
+    """In-memory answers for the DatabaseManager calls made by check_airing and prefetch_catalog"""
+
+    def __init__(self, episode, subscriber_ids, guild_settings, latency=0.0):
+        self.episode = episode
+        self.subscribers = [{"user_id": user_id, "anime_id": episode["anime_id"]} for user_id in subscriber_ids]
+        self.guild_settings = guild_settings
+        self.latency = latency
+        self.queries = 0
+        self.notifications = 0
+
+    async def roundtrip(self):
+        self.queries += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def execute_query(self, query, params=None, fetch=False, many=False):
+        await self.roundtrip()
+        return [] if fetch else None
+
+    async def setup_database(self):
+        pass
+
+    async def bulk_cache_anime(self, anime_list):
+        pass
+
+    async def bulk_update_airing_schedule(self, schedules):
+        pass
+
+    async def get_recently_aired(self, hours_ago=1):
+        await self.roundtrip()
+        return [self.episode]
+
+    async def get_anime_subscribers(self, anime_id):
+        await self.roundtrip()
+        return self.subscribers
+
+    async def get_user_settings(self, user_id):
+        await self.roundtrip()
+        return {"user_id": user_id, "notification_enabled": True, "preferred_title_format": "romaji"}
+
+    async def add_notification(self, user_id, anime_id, episode, successful=True):
+        await self.roundtrip()
+        self.notifications += successful
+
+    async def get_guild_settings(self, guild_id):
+        await self.roundtrip()
+        return self.guild_settings.get(guild_id, {"guild_id": guild_id, "notification_channel_id": None, "public_notifications": False})
+
+
+async def fanout(subscribers, db_latency):
+    stub, stub_runner, stub_url = await start_stub_server()
+    # AniListAPI reads its base URL on construction, so prefetch_catalog hits the stub
+    previous_env = {name: os.environ.get(name) for name in stub_environment(stub_url)}
+    os.environ.update(stub_environment(stub_url))
+    try:
+        async with DiscordHarness(enforce_limits=False) as harness:
+            guild = harness.world.add_guild(members=min(subscribers, 1000))
+            subscriber_ids = [int(member["user"]["id"]) for member in guild["members"][1:]]
+            while len(subscriber_ids) < subscribers:
+                subscriber_ids.append(int(harness.world.add_user()["id"]))
+
+            harness.load_extension("cogs.Events.anime")
+            cog = harness.bot.get_cog("AnimeCog")
+            cog.check_airing.cancel()
+
+            notification_channel = next(c for c in guild["channels"] if c["type"] == 0)
+            cog.db = FanoutDatabase(
+                {
+                    "anime_id": 150000, "episode": 7, "title_romaji": "Shiki no Monogatari", "title_english": "Tale of Seasons",
+                    "site_url": "https://anilist.co/anime/150000", "cover_image_url": None,
+                },
+                subscriber_ids,
+                {int(guild["id"]): {"public_notifications": True, "notification_channel_id": int(notification_channel["id"])}},
+                latency=db_latency,
+            )
+            await harness.connect()
+
+            started = time.perf_counter()
+            await cog.check_airing()
+            elapsed = time.perf_counter() - started
+
+            if cog.db.notifications != subscribers:
+                raise RuntimeError(f"Only {cog.db.notifications} of {subscribers} notifications were sent")
+            return elapsed
+    finally:
+        for name, value in previous_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        await stub_runner.cleanup()
+
+
+@benchmark("notifications.fanout")
+async def notification_fanout(options):
+    sizes = [1000, 10000, 100000] if options.full else [1000, 10000]
+    results = []
+    for subscribers in sizes:
+        elapsed = await fanout(subscribers, options.db_latency / 1000)
+        label = f"{subscribers // 1000}k"
+        results.append(throughput(f"notifications.fanout_{label}.throughput", subscribers, elapsed, "msg/s"))
+        print(f"  {subscribers} subscribers notified in {elapsed:.2f}s")
+    return results
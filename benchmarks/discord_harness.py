@@ -0,0 +1,1035 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+
+import nextcord
+from aiohttp import web
+from nextcord.ext import commands
+from nextcord.http import Route
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from utils import jsoncodec
+from utils import membercache
+
+"""
+
+    In-process stand-in for Discord, so cogs can be benchmarked on a plain box.
+
+    The bot keeps its real nextcord HTTPClient and ConnectionState. Every REST
+    route is answered by a loopback aiohttp server (Route.BASE points at it)
+    that keeps in-memory guilds, members, channels, roles and DM channels,
+    sends Discord style X-RateLimit headers and 429s per bucket, and echoes
+    gateway events (CHANNEL_CREATE, GUILD_MEMBER_UPDATE, ...) for mutations.
+    Gateway payloads are fed straight into the state parsers, exactly as the
+    websocket would.
+
+        async with DiscordHarness() as harness:
+            guild = harness.world.add_guild(members=10000)
+            harness.load_extension("cogs.Events.greetings")
+            await harness.connect()
+            harness.member_join(guild["id"])
+            await harness.drain()
+            harness.print_summary()
+
+    Cogs run unmodified. Cogs that keep sqlite files or read assets/ do so
+    relative to the working directory, so the harness runs in a scratch
+    directory by default. MySQL backed cogs still need a reachable database.
+
+    python benchmarks/discord_harness.py --members 10000 --joins 25
+
+"""
+
+API_PREFIX = "/api/v10"
+
+# (limit, window seconds) per route, approximating Discord's published and observed buckets
+ROUTE_LIMITS = {
+    ("POST", "/channels/{channel_id}/messages"): (5, 5.0),
+    ("PATCH", "/channels/{channel_id}/messages/{message_id}"): (5, 5.0),
+    ("DELETE", "/channels/{channel_id}/messages/{message_id}"): (5, 1.0),
+    ("PATCH", "/channels/{channel_id}"): (2, 600.0),
+    ("POST", "/guilds/{guild_id}/channels"): (5, 10.0),
+    ("POST", "/users/@me/channels"): (5, 5.0),
+    ("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}"): (10, 10.0),
+    ("DELETE", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}"): (10, 10.0),
+    ("POST", "/guilds/{guild_id}/roles"): (250, 172800.0),
+}
+DEFAULT_ROUTE_LIMIT = (50, 1.0)
+GLOBAL_LIMIT = 50
+
+# Still sends headers so nextcord doesn't fall back to one request per route at a time
+UNLIMITED_ROUTE = (1000000, 1.0)
+
+# Interaction responses don't count towards the global limit
+GLOBAL_EXEMPT_PREFIXES = ("/interactions/", "/webhooks/")
+
+ADMINISTRATOR = 1 << 3
+EVERYONE_PERMISSIONS = 1071698660929
+
+
+def iso_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FakeDiscord:
+    """In-memory guilds, users, channels, roles, members and messages, as raw API payloads"""
+
+    def __init__(self, seed=0):
+        self._ids = itertools.count(1100000000000000000)
+        self.rng = random.Random(seed)
+        self.users = {}
+        self.application_id = self.snowflake()
+        self.bot_user = self.add_user("Benchmark Bot", bot=True, user_id=self.application_id)
+        self.guilds = {}
+        self.channels = {}
+        self.channel_guilds = {}
+        self.dm_channels = {}
+        self.members = {}
+        self.messages = {}
+        self.commands = {}
+
+    def snowflake(self):
+        return next(self._ids)
+
+    def add_user(self, name=None, bot=False, user_id=None):
+        user_id = user_id or self.snowflake()
+        user = {
+            "id": str(user_id),
+            "username": name or f"user{user_id % 1000000}",
+            "global_name": None,
+            "discriminator": "0",
+            "avatar": "%032x" % self.rng.getrandbits(128),
+            "bot": bot,
+        }
+        self.users[user_id] = user
+        return user
+
+    def add_guild(self, name="Benchmark Guild", members=0, text_channels=("general",), voice_channels=("Lounge",)):
+        guild_id = self.snowflake()
+        guild = {
+            "id": str(guild_id),
+            "name": name,
+            "owner_id": self.bot_user["id"],
+            "unavailable": False,
+            "large": False,
+            "member_count": 0,
+            "roles": [
+                {"id": str(guild_id), "name": "@everyone", "permissions": str(EVERYONE_PERMISSIONS), "position": 0},
+                {"id": str(self.snowflake()), "name": "Bot", "permissions": str(ADMINISTRATOR), "position": 1, "managed": True},
+            ],
+            "channels": [],
+            "members": [],
+            "voice_states": [],
+            "threads": [],
+            "emojis": [],
+            "stickers": [],
+            "features": [],
+            "premium_tier": 0,
+        }
+        self.guilds[guild_id] = guild
+
+        category = self.add_channel(guild_id, "Channels", 4)
+        for channel_name in text_channels:
+            self.add_channel(guild_id, channel_name, 0, parent_id=category["id"])
+        for channel_name in voice_channels:
+            self.add_channel(guild_id, channel_name, 2, parent_id=category["id"])
+
+        self.add_member(guild_id, self.bot_user, roles=[guild["roles"][1]["id"]])
+        for _ in range(members):
+            self.add_member(guild_id)
+        return guild
+
+    def add_channel(self, guild_id, name, channel_type, parent_id=None, **extra):
+        guild = self.guilds[guild_id]
+        channel = {
+            "id": str(self.snowflake()),
+            "type": channel_type,
+            "guild_id": str(guild_id),
+            "name": name,
+            "position": len(guild["channels"]),
+            "permission_overwrites": [],
+            "parent_id": parent_id,
+            "nsfw": False,
+            "topic": None,
+            "rate_limit_per_user": 0,
+            "last_message_id": None,
+        }
+        if channel_type == 2:
+            channel.update(bitrate=64000, user_limit=0, rtc_region=None)
+        channel.update(extra)
+        guild["channels"].append(channel)
+        self.channels[int(channel["id"])] = channel
+        self.channel_guilds[int(channel["id"])] = guild_id
+        return channel
+
+    def remove_channel(self, channel_id):
+        channel = self.channels.pop(channel_id, None)
+        guild_id = self.channel_guilds.pop(channel_id, None)
+        if channel is not None and guild_id is not None:
+            self.guilds[guild_id]["channels"].remove(channel)
+        return channel
+
+    def add_member(self, guild_id, user=None, roles=None):
+        """Add a member to the initial GUILD_CREATE payload"""
+        member = self.new_member(guild_id, user, roles)
+        guild = self.guilds[guild_id]
+        guild["members"].append(member)
+        guild["member_count"] += 1
+        return member
+
+    def new_member(self, guild_id, user=None, roles=None):
+        user = user or self.add_user()
+        member = {
+            "user": user,
+            "roles": list(roles or []),
+            "joined_at": iso_now(),
+            "nick": None,
+            "deaf": False,
+            "mute": False,
+            "pending": False,
+            "flags": 0,
+        }
+        self.members[(guild_id, int(user["id"]))] = member
+        return member
+
+    def remove_member(self, guild_id, user_id):
+        member = self.members.pop((guild_id, user_id), None)
+        if member is not None:
+            guild = self.guilds[guild_id]
+            if member in guild["members"]:
+                guild["members"].remove(member)
+            guild["member_count"] -= 1
+        return member
+
+    def dm_channel(self, user_id):
+        channel = self.dm_channels.get(user_id)
+        if channel is None:
+            channel = {"id": str(self.snowflake()), "type": 1, "recipients": [self.users[user_id]], "last_message_id": None}
+            self.dm_channels[user_id] = channel
+            self.channels[int(channel["id"])] = channel
+        return channel
+
+    def message(self, channel_id, body, attachments=(), author=None):
+        message_id = self.snowflake()
+        message = {
+            "id": str(message_id),
+            "channel_id": str(channel_id),
+            "author": author or self.bot_user,
+            "content": body.get("content") or "",
+            "timestamp": iso_now(),
+            "edited_timestamp": None,
+            "tts": bool(body.get("tts")),
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [
+                {
+                    "id": str(self.snowflake()),
+                    "filename": filename,
+                    "size": size,
+                    "url": f"https://cdn.discordapp.com/attachments/{channel_id}/{message_id}/{filename}",
+                    "proxy_url": f"https://media.discordapp.net/attachments/{channel_id}/{message_id}/{filename}",
+                }
+                for filename, size in attachments
+            ],
+            "embeds": body.get("embeds") or [],
+            "components": body.get("components") or [],
+            "pinned": False,
+            "type": 0,
+            "flags": body.get("flags") or 0,
+        }
+        guild_id = self.channel_guilds.get(channel_id)
+        if guild_id is not None:
+            message["guild_id"] = str(guild_id)
+        self.messages[message_id] = message
+        return message
+
+
+class FakeGateway:
+    """Takes the place of DiscordWebSocket; events go straight into the state parsers"""
+
+    def __init__(self, world, state, latency=0.04):
+        self.world = world
+        self.state = state
+        self.latency = latency
+        self.shard_id = None
+        self.open = True
+        self.events = {}
+        self.presences = []
+        self.voice_requests = []
+
+    def dispatch(self, event, data):
+        self.events[event] = self.events.get(event, 0) + 1
+        self.state.parsers[event](data)
+
+    def dispatch_soon(self, event, data):
+        """Deliver an event on the next loop iteration, like one arriving after the REST response"""
+        asyncio.get_running_loop().call_soon(self.dispatch, event, data)
+
+    def is_ratelimited(self):
+        return False
+
+    async def change_presence(self, *, activity=None, status=None, since=0.0):
+        self.presences.append((activity, status))
+
+    async def request_chunks(self, guild_id, query=None, *, limit=0, user_ids=None, presences=False, nonce=None):
+        members = self.world.guilds[guild_id]["members"]
+        if user_ids:
+            wanted = {str(user_id) for user_id in user_ids}
+            members = [member for member in members if member["user"]["id"] in wanted]
+        elif query:
+            members = [member for member in members if member["user"]["username"].startswith(query)]
+        if limit:
+            members = members[:limit]
+
+        chunks = [members[i:i + 1000] for i in range(0, len(members), 1000)] or [[]]
+        for index, chunk in enumerate(chunks):
+            self.dispatch_soon("GUILD_MEMBERS_CHUNK", {
+                "guild_id": str(guild_id),
+                "members": chunk,
+                "chunk_index": index,
+                "chunk_count": len(chunks),
+                "nonce": nonce,
+            })
+
+    async def voice_state(self, guild_id, channel_id, self_mute=False, self_deaf=False):
+        self.voice_requests.append((guild_id, channel_id))
+
+    async def close(self, code=1000):
+        self.open = False
+
+
+class FakeRestServer:
+    """Loopback Discord REST API and CDN backed by a FakeDiscord"""
+
+    def __init__(self, world, latency=0.0, jitter=0.0, route_limits=None, global_limit=GLOBAL_LIMIT, enforce_limits=True):
+        self.world = world
+        self.enforce_limits = enforce_limits
+        self.gateway = None
+        self.latency = latency
+        self.jitter = jitter
+        self.route_limits = dict(ROUTE_LIMITS)
+        self.route_limits.update(route_limits or {})
+        self.global_limit = global_limit
+        self.buckets = {}
+        self.hits = []
+        self.unhandled = set()
+        self._avatar_png = {}
+        self.routes = []
+        for method, template, handler in self.route_table():
+            pattern = re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", template)
+            self.routes.append((method, template, re.compile(f"^{pattern}$"), handler))
+
+    def route_table(self):
+        return [
+            ("GET", "/users/@me", self.get_current_user),
+            ("GET", "/users/{user_id}", self.get_user),
+            ("POST", "/users/@me/channels", self.create_dm),
+            ("GET", "/gateway/bot", self.get_gateway_bot),
+            ("GET", "/channels/{channel_id}", self.get_channel),
+            ("PATCH", "/channels/{channel_id}", self.edit_channel),
+            ("DELETE", "/channels/{channel_id}", self.delete_channel),
+            ("PUT", "/channels/{channel_id}/permissions/{target}", self.edit_permissions),
+            ("DELETE", "/channels/{channel_id}/permissions/{target}", self.delete_permissions),
+            ("POST", "/channels/{channel_id}/messages", self.send_message),
+            ("GET", "/channels/{channel_id}/messages/{message_id}", self.get_message),
+            ("PATCH", "/channels/{channel_id}/messages/{message_id}", self.edit_message),
+            ("DELETE", "/channels/{channel_id}/messages/{message_id}", self.delete_message),
+            ("GET", "/guilds/{guild_id}/channels", self.get_guild_channels),
+            ("POST", "/guilds/{guild_id}/channels", self.create_channel),
+            ("GET", "/guilds/{guild_id}/members/{user_id}", self.get_member),
+            ("PATCH", "/guilds/{guild_id}/members/{user_id}", self.edit_member),
+            ("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", self.add_role),
+            ("DELETE", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", self.remove_role),
+            ("GET", "/guilds/{guild_id}/roles", self.get_roles),
+            ("POST", "/guilds/{guild_id}/roles", self.create_role),
+            ("PATCH", "/guilds/{guild_id}/roles", self.move_roles),
+            ("PATCH", "/guilds/{guild_id}/roles/{role_id}", self.edit_role),
+            ("DELETE", "/guilds/{guild_id}/roles/{role_id}", self.delete_role),
+            ("GET", "/applications/{application_id}/commands", self.get_commands),
+            ("PUT", "/applications/{application_id}/commands", self.bulk_commands),
+            ("POST", "/applications/{application_id}/commands", self.create_command),
+            ("PATCH", "/applications/{application_id}/commands/{command_id}", self.edit_command),
+            ("DELETE", "/applications/{application_id}/commands/{command_id}", self.delete_command),
+            ("GET", "/applications/{application_id}/guilds/{guild_id}/commands", self.get_commands),
+            ("PUT", "/applications/{application_id}/guilds/{guild_id}/commands", self.bulk_commands),
+            ("POST", "/applications/{application_id}/guilds/{guild_id}/commands", self.create_command),
+            ("PATCH", "/applications/{application_id}/guilds/{guild_id}/commands/{command_id}", self.edit_command),
+            ("DELETE", "/applications/{application_id}/guilds/{guild_id}/commands/{command_id}", self.delete_command),
+            ("POST", "/interactions/{interaction_id}/{interaction_token}/callback", self.no_content),
+            ("POST", "/webhooks/{application_id}/{interaction_token}", self.send_followup),
+            ("PATCH", "/webhooks/{application_id}/{interaction_token}/messages/{message_id}", self.edit_followup),
+            ("DELETE", "/webhooks/{application_id}/{interaction_token}/messages/{message_id}", self.no_content),
+        ]
+
+    def build_app(self):
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_route("*", API_PREFIX + "/{tail:.*}", self.handle)
+        app.router.add_get("/cdn/avatars/{user_id}/{filename}", self.handle_avatar)
+        app.router.add_get("/cdn/embed/avatars/{filename}", self.handle_avatar)
+        return app
+
+    # plumbing
+
+    def match(self, method, path):
+        for route_method, template, pattern, handler in self.routes:
+            if route_method != method:
+                continue
+            found = pattern.match(path)
+            if found:
+                return template, found.groupdict(), handler
+        return None, None, None
+
+    def take(self, key, limit, window):
+        """Count one request against a fixed window bucket; returns (allowed, remaining, reset_after)"""
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None or now >= bucket[1]:
+            bucket = [0, now + window]
+            self.buckets[key] = bucket
+        reset_after = bucket[1] - now
+        if bucket[0] >= limit:
+            return False, 0, reset_after
+        bucket[0] += 1
+        return True, limit - bucket[0], reset_after
+
+    def rate_limit(self, method, template, params, path):
+        """Returns (headers, 429 body or None)"""
+        headers = {"Via": "1.1 google"}
+        if self.enforce_limits and self.global_limit and not path.startswith(GLOBAL_EXEMPT_PREFIXES):
+            allowed, _, reset_after = self.take("global", self.global_limit, 1.0)
+            if not allowed:
+                headers.update({
+                    "X-RateLimit-Global": "true",
+                    "X-RateLimit-Scope": "global",
+                    "Retry-After": f"{reset_after:.3f}",
+                })
+                return headers, {"message": "You are being rate limited.", "retry_after": reset_after, "global": True}
+
+        if self.enforce_limits:
+            limit, window = self.route_limits.get((method, template), DEFAULT_ROUTE_LIMIT)
+        else:
+            limit, window = UNLIMITED_ROUTE
+        bucket_hash = hashlib.sha1(f"{method} {template}".encode()).hexdigest()[:16]
+        major = params.get("channel_id") or params.get("guild_id") or params.get("interaction_token") or ""
+        allowed, remaining, reset_after = self.take((bucket_hash, major), limit, window)
+        headers.update({
+            "X-RateLimit-Bucket": bucket_hash,
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+        })
+        if not allowed:
+            headers.update({"X-RateLimit-Scope": "user", "Retry-After": f"{reset_after:.3f}"})
+            return headers, {"message": "You are being rate limited.", "retry_after": reset_after, "global": False}
+        return headers, None
+
+    async def read_body(self, request):
+        """JSON body and (filename, size) of every uploaded file"""
+        if not request.can_read_body:
+            return {}, [], 0
+        if request.content_type.startswith("multipart/"):
+            body, files, size = {}, [], 0
+            reader = await request.multipart()
+            async for part in reader:
+                data = await part.read()
+                size += len(data)
+                if part.name == "payload_json":
+                    body = jsoncodec.loads(data)
+                elif part.filename:
+                    files.append((part.filename, len(data)))
+            return body, files, size
+        raw = await request.read()
+        return (jsoncodec.loads(raw) if raw else {}), [], len(raw)
+
+    async def handle(self, request):
+        started = time.perf_counter()
+        path = "/" + request.match_info["tail"]
+        method = request.method
+        template, params, handler = self.match(method, path)
+        body, files, size = await self.read_body(request)
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if handler is None:
+            if (method, path) not in self.unhandled:
+                self.unhandled.add((method, path))
+                print(f"Fake Discord has no handler for {method} {path}")
+            status, payload, headers = 404, {"message": "404: Not Found", "code": 0}, {"Via": "1.1 google"}
+            template = path
+        else:
+            headers, limited = self.rate_limit(method, template, params, path)
+            if limited is not None:
+                status, payload = 429, limited
+            else:
+                status, payload = handler(params, body, files)
+
+        self.hits.append({
+            "method": method,
+            "route": template,
+            "status": status,
+            "bytes": size,
+            "files": len(files),
+            "duration": time.perf_counter() - started,
+        })
+        if status == 204:
+            return web.Response(status=204, headers=headers)
+        # nextcord only decodes a bare "application/json", without a charset
+        headers["Content-Type"] = "application/json"
+        return web.Response(body=jsoncodec.dumps(payload).encode(), status=status, headers=headers)
+
+    async def handle_avatar(self, request):
+        """A generated PNG for any avatar; honours ?size= like the real CDN"""
+        size = min(int(request.query.get("size", 1024)), 4096)
+        png = self._avatar_png.get(size)
+        if png is None:
+            buffer = BytesIO()
+            Image.new("RGBA", (size, size), (88, 101, 242, 255)).save(buffer, "PNG")
+            png = self._avatar_png[size] = buffer.getvalue()
+        self.hits.append({"method": "GET", "route": "cdn avatar", "status": 200, "bytes": 0, "files": 0, "duration": 0.0})
+        return web.Response(body=png, content_type="image/png")
+
+    def echo(self, event, data):
+        if self.gateway is not None:
+            self.gateway.dispatch_soon(event, data)
+
+    @staticmethod
+    def not_found(message, code):
+        return 404, {"message": message, "code": code}
+
+    def guild_of(self, params):
+        return self.world.guilds.get(int(params["guild_id"]))
+
+    # users and DMs
+
+    def get_current_user(self, params, body, files):
+        return 200, self.world.bot_user
+
+    def get_user(self, params, body, files):
+        user = self.world.users.get(int(params["user_id"]))
+        return (200, user) if user else self.not_found("Unknown User", 10013)
+
+    def create_dm(self, params, body, files):
+        user_id = int(body["recipient_id"])
+        if user_id not in self.world.users:
+            return self.not_found("Unknown User", 10013)
+        return 200, self.world.dm_channel(user_id)
+
+    def get_gateway_bot(self, params, body, files):
+        return 200, {
+            "url": "wss://gateway.discord.invalid",
+            "shards": 1,
+            "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1},
+        }
+
+    # channels and messages
+
+    def get_channel(self, params, body, files):
+        channel = self.world.channels.get(int(params["channel_id"]))
+        return (200, channel) if channel else self.not_found("Unknown Channel", 10003)
+
+    def edit_channel(self, params, body, files):
+        channel = self.world.channels.get(int(params["channel_id"]))
+        if channel is None:
+            return self.not_found("Unknown Channel", 10003)
+        channel.update({key: value for key, value in body.items() if key in channel or key in ("user_limit", "bitrate")})
+        self.echo("CHANNEL_UPDATE", channel)
+        return 200, channel
+
+    def delete_channel(self, params, body, files):
+        channel = self.world.remove_channel(int(params["channel_id"]))
+        if channel is None:
+            return self.not_found("Unknown Channel", 10003)
+        self.echo("CHANNEL_DELETE", channel)
+        return 200, channel
+
+    def edit_permissions(self, params, body, files):
+        channel = self.world.channels.get(int(params["channel_id"]))
+        if channel is None:
+            return self.not_found("Unknown Channel", 10003)
+        overwrites = [o for o in channel["permission_overwrites"] if o["id"] != params["target"]]
+        overwrites.append({"id": params["target"], "type": body.get("type", 0), "allow": str(body.get("allow", 0)), "deny": str(body.get("deny", 0))})
+        channel["permission_overwrites"] = overwrites
+        self.echo("CHANNEL_UPDATE", channel)
+        return 204, None
+
+    def delete_permissions(self, params, body, files):
+        channel = self.world.channels.get(int(params["channel_id"]))
+        if channel is None:
+            return self.not_found("Unknown Channel", 10003)
+        channel["permission_overwrites"] = [o for o in channel["permission_overwrites"] if o["id"] != params["target"]]
+        self.echo("CHANNEL_UPDATE", channel)
+        return 204, None
+
+    def send_message(self, params, body, files):
+        channel_id = int(params["channel_id"])
+        channel = self.world.channels.get(channel_id)
+        if channel is None:
+            return self.not_found("Unknown Channel", 10003)
+        message = self.world.message(channel_id, body, files)
+        channel["last_message_id"] = message["id"]
+        return 200, message
+
+    def get_message(self, params, body, files):
+        message = self.world.messages.get(int(params["message_id"]))
+        return (200, message) if message else self.not_found("Unknown Message", 10008)
+
+    def edit_message(self, params, body, files):
+        message = self.world.messages.get(int(params["message_id"]))
+        if message is None:
+            return self.not_found("Unknown Message", 10008)
+        for key in ("content", "embeds", "components", "flags"):
+            if key in body:
+                message[key] = body[key] if body[key] is not None else ([] if key != "content" else "")
+        message["edited_timestamp"] = iso_now()
+        return 200, message
+
+    def delete_message(self, params, body, files):
+        if self.world.messages.pop(int(params["message_id"]), None) is None:
+            return self.not_found("Unknown Message", 10008)
+        return 204, None
+
+    def get_guild_channels(self, params, body, files):
+        guild = self.guild_of(params)
+        return (200, guild["channels"]) if guild else self.not_found("Unknown Guild", 10004)
+
+    def create_channel(self, params, body, files):
+        guild_id = int(params["guild_id"])
+        if guild_id not in self.world.guilds:
+            return self.not_found("Unknown Guild", 10004)
+        extra = {key: body[key] for key in ("user_limit", "bitrate", "topic", "nsfw", "rate_limit_per_user") if body.get(key) is not None}
+        channel = self.world.add_channel(
+            guild_id, body["name"], body.get("type", 0), parent_id=body.get("parent_id"),
+            permission_overwrites=[
+                {"id": str(o["id"]), "type": o.get("type", 0), "allow": str(o.get("allow", 0)), "deny": str(o.get("deny", 0))}
+                for o in body.get("permission_overwrites") or []
+            ],
+            **extra
+        )
+        self.echo("CHANNEL_CREATE", channel)
+        return 200, channel
+
+    # members and roles
+
+    def get_member(self, params, body, files):
+        member = self.world.members.get((int(params["guild_id"]), int(params["user_id"])))
+        return (200, member) if member else self.not_found("Unknown Member", 10007)
+
+    def member_update(self, guild_id, member):
+        self.echo("GUILD_MEMBER_UPDATE", dict(member, guild_id=str(guild_id)))
+
+    def edit_member(self, params, body, files):
+        guild_id = int(params["guild_id"])
+        user_id = int(params["user_id"])
+        member = self.world.members.get((guild_id, user_id))
+        if member is None:
+            return self.not_found("Unknown Member", 10007)
+        for key in ("nick", "roles", "mute", "deaf", "communication_disabled_until"):
+            if key in body:
+                member[key] = body[key]
+        if "channel_id" in body:
+            # A move or disconnect comes back as a voice state update
+            self.echo("VOICE_STATE_UPDATE", voice_state_payload(guild_id, member, body["channel_id"]))
+        self.member_update(guild_id, member)
+        return 200, member
+
+    def add_role(self, params, body, files):
+        guild_id = int(params["guild_id"])
+        member = self.world.members.get((guild_id, int(params["user_id"])))
+        if member is None:
+            return self.not_found("Unknown Member", 10007)
+        if params["role_id"] not in member["roles"]:
+            member["roles"].append(params["role_id"])
+        self.member_update(guild_id, member)
+        return 204, None
+
+    def remove_role(self, params, body, files):
+        guild_id = int(params["guild_id"])
+        member = self.world.members.get((guild_id, int(params["user_id"])))
+        if member is None:
+            return self.not_found("Unknown Member", 10007)
+        if params["role_id"] in member["roles"]:
+            member["roles"].remove(params["role_id"])
+        self.member_update(guild_id, member)
+        return 204, None
+
+    def get_roles(self, params, body, files):
+        guild = self.guild_of(params)
+        return (200, guild["roles"]) if guild else self.not_found("Unknown Guild", 10004)
+
+    def create_role(self, params, body, files):
+        guild = self.guild_of(params)
+        if guild is None:
+            return self.not_found("Unknown Guild", 10004)
+        role = {
+            "id": str(self.world.snowflake()),
+            "name": body.get("name", "new role"),
+            "permissions": str(body.get("permissions", 0)),
+            "color": body.get("color", 0),
+            "hoist": body.get("hoist", False),
+            "mentionable": body.get("mentionable", False),
+            "position": 1,
+        }
+        guild["roles"].append(role)
+        self.echo("GUILD_ROLE_CREATE", {"guild_id": guild["id"], "role": role})
+        return 200, role
+
+    def move_roles(self, params, body, files):
+        guild = self.guild_of(params)
+        if guild is None:
+            return self.not_found("Unknown Guild", 10004)
+        positions = {str(entry["id"]): entry["position"] for entry in body or []}
+        for role in guild["roles"]:
+            if role["id"] in positions:
+                role["position"] = positions[role["id"]]
+                self.echo("GUILD_ROLE_UPDATE", {"guild_id": guild["id"], "role": role})
+        return 200, guild["roles"]
+
+    def edit_role(self, params, body, files):
+        guild = self.guild_of(params)
+        role = next((r for r in guild["roles"] if r["id"] == params["role_id"]), None) if guild else None
+        if role is None:
+            return self.not_found("Unknown Role", 10011)
+        role.update({key: value for key, value in body.items() if value is not None})
+        self.echo("GUILD_ROLE_UPDATE", {"guild_id": guild["id"], "role": role})
+        return 200, role
+
+    def delete_role(self, params, body, files):
+        guild = self.guild_of(params)
+        role = next((r for r in guild["roles"] if r["id"] == params["role_id"]), None) if guild else None
+        if role is None:
+            return self.not_found("Unknown Role", 10011)
+        guild["roles"].remove(role)
+        self.echo("GUILD_ROLE_DELETE", {"guild_id": guild["id"], "role_id": role["id"]})
+        return 204, None
+
+    # application commands and interactions
+
+    def command_scope(self, params):
+        return self.world.commands.setdefault(params.get("guild_id"), {})
+
+    def store_command(self, params, body, command_id=None):
+        command = dict(body)
+        command.update(
+            id=str(command_id or self.world.snowflake()),
+            application_id=str(self.world.application_id),
+            version=str(self.world.snowflake()),
+            type=body.get("type", 1),
+            description=body.get("description", ""),
+        )
+        if params.get("guild_id"):
+            command["guild_id"] = params["guild_id"]
+        self.command_scope(params)[command["id"]] = command
+        return command
+
+    def get_commands(self, params, body, files):
+        return 200, list(self.command_scope(params).values())
+
+    def bulk_commands(self, params, body, files):
+        scope = self.command_scope(params)
+        by_name = {(c["name"], c["type"]): c["id"] for c in scope.values()}
+        scope.clear()
+        return 200, [self.store_command(params, c, by_name.get((c["name"], c.get("type", 1)))) for c in body]
+
+    def create_command(self, params, body, files):
+        existing = next((c for c in self.command_scope(params).values() if c["name"] == body["name"] and c["type"] == body.get("type", 1)), None)
+        return 200, self.store_command(params, body, existing["id"] if existing else None)
+
+    def edit_command(self, params, body, files):
+        command = self.command_scope(params).get(params["command_id"])
+        if command is None:
+            return self.not_found("Unknown application command", 10063)
+        return 200, self.store_command(params, dict(command, **body), command["id"])
+
+    def delete_command(self, params, body, files):
+        self.command_scope(params).pop(params["command_id"], None)
+        return 204, None
+
+    def no_content(self, params, body, files):
+        return 204, None
+
+    def send_followup(self, params, body, files):
+        channel_id = int(body.get("channel_id") or 0)
+        return 200, self.world.message(channel_id, body, files)
+
+    def edit_followup(self, params, body, files):
+        message = self.world.messages.get(int(params["message_id"])) if params["message_id"].isdigit() else None
+        if message is None:
+            return 200, self.world.message(0, body, files)
+        return self.edit_message(params, body, files)
+
+
+def voice_state_payload(guild_id, member, channel_id):
+    return {
+        "guild_id": str(guild_id),
+        "channel_id": str(channel_id) if channel_id else None,
+        "user_id": member["user"]["id"],
+        "member": member,
+        "session_id": "benchmark",
+        "deaf": False,
+        "mute": False,
+        "self_deaf": False,
+        "self_mute": False,
+        "self_stream": False,
+        "self_video": False,
+        "suppress": False,
+        "request_to_speak_timestamp": None,
+    }
+
+
+def default_intents():
+    """The intents main.py connects with"""
+    return membercache.cache_profile()["intents"]
+
+
+class DiscordHarness:
+
+    def __init__(self, bot=None, world=None, latency=0.0, jitter=0.0, route_limits=None,
+                 global_limit=GLOBAL_LIMIT, enforce_limits=True, gateway_latency=0.04, workdir=None, cache_profile=None):
+        """
+        Args:
+            bot (commands.Bot): Bot to drive, built like main.py's when omitted
+            world (FakeDiscord): Guilds and users to serve
+            latency (float): Seconds added to every REST response
+            jitter (float): Extra random seconds, up to this much, per response
+            route_limits (dict): {(method, route template): (limit, window)} overrides of ROUTE_LIMITS
+            global_limit (int): Requests per second across all routes, 0 disables
+            enforce_limits (bool): False measures the bot alone, without Discord's buckets
+            gateway_latency (float): Heartbeat latency reported by bot.latency
+            workdir (str): Directory the cogs run in; a scratch directory when omitted
+            cache_profile (str): membercache profile of the bot built when bot is omitted, CACHE_PROFILE by default
+        """
+        self.world = world or FakeDiscord()
+        self.server = FakeRestServer(self.world, latency, jitter, route_limits, global_limit, enforce_limits)
+        self.bot = bot
+        self.gateway = None
+        self.gateway_latency = gateway_latency
+        self.workdir = workdir
+        self.cache_profile = cache_profile
+        self.calls = []
+        self.runner = None
+        self.extensions = []
+        self._restore = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self):
+        """Serve the fake API, point nextcord at it and log the bot in"""
+        self.runner = web.AppRunner(self.server.build_app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+        previous_cwd = os.getcwd()
+        self._restore = (Route.BASE, nextcord.Asset.BASE, previous_cwd)
+        Route.BASE = base_url + API_PREFIX
+        nextcord.Asset.BASE = base_url + "/cdn"
+
+        if self.workdir is None:
+            self.workdir = tempfile.mkdtemp(prefix="discord-harness-")
+            assets = os.path.join(BASE_DIR, "assets")
+            if os.path.isdir(assets):
+                os.symlink(assets, os.path.join(self.workdir, "assets"))
+        os.chdir(self.workdir)
+
+        if self.bot is None:
+            self.bot = commands.Bot(command_prefix="$", guild_ready_timeout=0.1, **membercache.cache_profile(self.cache_profile))
+        if not self.server.enforce_limits:
+            # nextcord also caps itself at Discord's 50 requests/s; lift that too so only the bot is measured
+            self.bot.http._max_global_requests = UNLIMITED_ROUTE[0]
+        self.time_requests(self.bot.http)
+        await self.bot.login("benchmark-token")
+
+        self.gateway = FakeGateway(self.world, self.bot._connection, self.gateway_latency)
+        self.server.gateway = self.gateway
+        self.bot.ws = self.gateway
+
+    def time_requests(self, http):
+        """Record each REST call as the cog sees it, including time queued behind rate limits"""
+        request = http.request
+
+        async def timed_request(route, **kwargs):
+            started = time.perf_counter()
+            error = None
+            try:
+                return await request(route, **kwargs)
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                self.calls.append({
+                    "method": route.method,
+                    "route": route.path,
+                    "started": started,
+                    "duration": time.perf_counter() - started,
+                    "error": error,
+                })
+
+        http.request = timed_request
+
+    def load_extension(self, name):
+        self.bot.load_extension(name)
+        self.extensions.append(name)
+
+    async def connect(self, timeout=30):
+        """Send READY and a GUILD_CREATE per guild, then wait for on_ready"""
+        self.gateway.dispatch("READY", {
+            "v": 10,
+            "user": self.world.bot_user,
+            "guilds": [{"id": guild["id"], "unavailable": True} for guild in self.world.guilds.values()],
+            "session_id": "benchmark",
+            "resume_gateway_url": "wss://gateway.discord.invalid",
+            "application": {"id": str(self.world.application_id), "flags": 0},
+        })
+        for guild in self.world.guilds.values():
+            self.gateway.dispatch("GUILD_CREATE", guild)
+        await asyncio.wait_for(self.bot.wait_until_ready(), timeout)
+
+    async def drain(self, timeout=60):
+        """Wait until every dispatched event handler has finished"""
+        deadline = time.monotonic() + timeout
+        current = asyncio.current_task()
+        while time.monotonic() < deadline:
+            pending = [
+                task for task in asyncio.all_tasks()
+                if task is not current and not task.done() and task.get_name().startswith("nextcord: ")
+            ]
+            if not pending:
+                return
+            await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()))
+        print(f"Event handlers still running after {timeout}s")
+
+    async def close(self):
+        for name in reversed(self.extensions):
+            try:
+                self.bot.unload_extension(name)
+            except Exception as e:
+                print(f"Failed to unload {name}: {e}")
+        if self.bot is not None:
+            await self.bot.close()
+            await asyncio.sleep(0)
+        if self.runner is not None:
+            await self.runner.cleanup()
+        if self._restore is not None:
+            Route.BASE, nextcord.Asset.BASE, cwd = self._restore
+            os.chdir(cwd)
+            self._restore = None
+
+    # gateway events
+
+    def member_join(self, guild_id, user=None):
+        guild_id = int(guild_id)
+        member = self.world.new_member(guild_id, user)
+        guild = self.world.guilds[guild_id]
+        guild["members"].append(member)
+        guild["member_count"] += 1
+        self.gateway.dispatch("GUILD_MEMBER_ADD", dict(member, guild_id=str(guild_id)))
+        return member
+
+    def member_remove(self, guild_id, user_id):
+        guild_id = int(guild_id)
+        member = self.world.remove_member(guild_id, int(user_id))
+        if member is not None:
+            self.gateway.dispatch("GUILD_MEMBER_REMOVE", {"guild_id": str(guild_id), "user": member["user"]})
+        return member
+
+    def voice_update(self, guild_id, user_id, channel_id):
+        """Move a member into a voice channel, or out of voice with channel_id None"""
+        guild_id = int(guild_id)
+        member = self.world.members[(guild_id, int(user_id))]
+        self.gateway.dispatch("VOICE_STATE_UPDATE", voice_state_payload(guild_id, member, channel_id))
+
+    # results
+
+    def summary(self):
+        """Per route: calls, errors, 429s seen by the server and client side latency percentiles"""
+        routes = {}
+        for call in self.calls:
+            entry = routes.setdefault((call["method"], call["route"]), {"calls": 0, "errors": 0, "rate_limited": 0, "durations": []})
+            entry["calls"] += 1
+            entry["errors"] += call["error"] is not None
+            entry["durations"].append(call["duration"])
+        for hit in self.server.hits:
+            if hit["status"] == 429 and (hit["method"], hit["route"]) in routes:
+                routes[(hit["method"], hit["route"])]["rate_limited"] += 1
+
+        result = {}
+        for (method, route), entry in sorted(routes.items()):
+            durations = entry.pop("durations")
+            entry.update(
+                p50_ms=percentile(durations, 0.50) * 1000,
+                p95_ms=percentile(durations, 0.95) * 1000,
+                max_ms=max(durations) * 1000,
+            )
+            result[f"{method} {route}"] = entry
+        return result
+
+    def print_summary(self):
+        print(f"{'route':<64} {'calls':>6} {'err':>4} {'429':>4} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for route, entry in self.summary().items():
+            print(
+                f"{route:<64} {entry['calls']:>6} {entry['errors']:>4} {entry['rate_limited']:>4} "
+                f"{entry['p50_ms']:>9.1f} {entry['p95_ms']:>9.1f} {entry['max_ms']:>9.1f}"
+            )
+        events = ", ".join(f"{name} {count}" for name, count in sorted(self.gateway.events.items()))
+        print(f"gateway events: {events}")
+
+
+async def run_greeting_burst(members, joins, latency):
+    """Join a burst of members into one guild with greetings configured and time the welcome path"""
+    async with DiscordHarness(latency=latency) as harness:
+        guild = harness.world.add_guild(members=members)
+        harness.load_extension("cogs.Events.greetings")
+        await harness.connect()
+
+        welcome_channel = next(c for c in guild["channels"] if c["type"] == 0)
+        harness.bot.get_cog("MemberEvents")._save_channel(guild["id"], welcome_channel["id"])
+
+        started = time.perf_counter()
+        for _ in range(joins):
+            harness.member_join(guild["id"])
+        await harness.drain(timeout=600)
+        elapsed = time.perf_counter() - started
+
+        print(f"{joins} joins into a {members} member guild handled in {elapsed:.2f}s ({joins / elapsed:.1f} joins/s)")
+        harness.print_summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive cogs against an in-process fake Discord")
+    parser.add_argument("--members", type=int, default=10000, help="Members in the guild before the burst")
+    parser.add_argument("--joins", type=int, default=25, help="Members joining in the burst")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every REST response")
+    args = parser.parse_args()
+    asyncio.run(run_greeting_burst(args.members, args.joins, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import glob
+import json
+import os
+import random
+import re
+
+"""
+
+    Fixture corpus for the stub server.
+
+    Recorded responses live in benchmarks/fixtures/*.json (written by
+    `stub_server.py --record`). seed_fixtures() adds generated responses
+    matched on operation shape, so every client code path has an answer
+    even before anything was recorded.
+
+"""
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Fantasy", "Romance", "Sci-Fi", "Slice of Life", "Mystery", "Sports"]
+
+
+def normalize_query(query):
+    """Collapse whitespace so formatting differences don't change the key"""
+    return re.sub(r"\s+", " ", query or "").strip()
+
+
+def canonical_variables(variables):
+    return json.dumps(variables or {}, sort_keys=True, separators=(",", ":"))
+
+
+def query_shape(query):
+    """
+    Root selection path of a GraphQL query, e.g. "Page.media", "Page.airingSchedules" or "Media"
+
+    Used as the loosest match so fixtures survive field profile changes.
+    """
+    body = normalize_query(query)
+    body = body[body.index("{") + 1:] if "{" in body else body
+    # Drop argument lists so only field names and braces remain
+    body = re.sub(r"\([^()]*\)", "", body)
+    names = re.findall(r"[A-Za-z_]\w*|[{}]", body)
+
+    path = []
+    depth = 0
+    for token in names:
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+        elif depth == len(path) and token != "pageInfo":
+            path.append(token)
+            if token != "Page":
+                break
+    return ".".join(path)
+
+
+def synthetic_media(anime_id, rng, season="FALL", year=2026):
+    """One Media object carrying every field of the detail profile plus tags"""
+    return {
+        "id": anime_id,
+        "title": {"romaji": f"Shiki no Monogatari {anime_id}", "english": f"Tale of Seasons {anime_id}"},
+        "season": season,
+        "seasonYear": year,
+        "episodes": rng.choice([12, 13, 24, None]),
+        "genres": rng.sample(GENRES, 3),
+        "coverImage": {"large": f"https://s4.anilist.co/file/anilistcdn/media/anime/cover/medium/bx{anime_id}.jpg"},
+        "siteUrl": f"https://anilist.co/anime/{anime_id}",
+        "description": "An ordinary student is pulled into a world of spirits. " * rng.randint(4, 12),
+        "format": "TV",
+        "status": "RELEASING",
+        "nextAiringEpisode": {"episode": rng.randint(1, 12), "airingAt": 1792000000 + (anime_id % 1000) * 3600},
+        "studios": {"nodes": [{"name": "Studio Example"}]},
+        "relations": {"edges": [
+            {"relationType": "PREQUEL", "node": {
+                "id": anime_id - 10000, "title": {"romaji": f"Shiki no Monogatari {anime_id} (Prequel)"},
+                "format": "TV", "type": "ANIME", "status": "FINISHED", "seasonYear": year - 1, "season": season
+            }}
+            for _ in range(rng.randint(0, 4))
+        ]},
+        "tags": [{"name": f"Tag {rng.randint(1, 400)}", "rank": rng.randint(20, 100)} for _ in range(rng.randint(5, 20))],
+    }
+
+
+def synthetic_season_page(count=50, seed=0, has_next_page=True):
+    """A Page(media(season:, seasonYear:)) response with detail fields and tags"""
+    rng = random.Random(seed)
+    media = [synthetic_media(150000 + seed * count + i, rng) for i in range(count)]
+    return {"data": {"Page": {"pageInfo": {"hasNextPage": has_next_page}, "media": media}}}
+
+
+def synthetic_airing_page(count=50, start=1792000000, seed=0):
+    rng = random.Random(seed)
+    schedules = []
+    for i in range(count):
+        media = synthetic_media(150000 + i, rng)
+        schedules.append({
+            "id": 900000 + i,
+            "airingAt": start + i * 1800,
+            "episode": rng.randint(1, 12),
+            "media": {key: media[key] for key in ("id", "title", "coverImage", "siteUrl")},
+        })
+    return {"data": {"Page": {"pageInfo": {"hasNextPage": False}, "airingSchedules": schedules}}}
+
+
+def synthetic_mangadex_search(count=5):
+    return {"result": "ok", "data": [
+        {"id": f"00000000-0000-0000-0000-00000000000{i}", "type": "manga", "attributes": {"title": {"en": f"Manga {i}"}}}
+        for i in range(count)
+    ]}
+
+
+def synthetic_mangadex_manga():
+    return {"result": "ok", "data": {
+        "id": "00000000-0000-0000-0000-000000000000",
+        "type": "manga",
+        "attributes": {
+            "title": {"en": "Manga 0"},
+            "description": {"en": "A synthetic manga used by the stub server."},
+            "status": "ongoing",
+        },
+        "relationships": [
+            {"type": "cover_art", "attributes": {"fileName": "cover.jpg"}},
+            {"type": "author", "attributes": {"name": "Author Example"}},
+        ],
+    }}
+
+
+def synthetic_nitter_rss(username):
+    return (
+        f"<rss><channel><title>{username}</title>"
+        f"<item><link>https://nitter.net/{username}/status/1</link></item>"
+        f"</channel></rss>"
+    )
+
+
+def seed_fixtures():
+    """Shape-matched fixtures for every query the bot sends"""
+    detail = synthetic_media(150000, random.Random(0))
+    return [
+        {"service": "anilist", "shape": "Page.media", "body": synthetic_season_page(has_next_page=False)},
+        {"service": "anilist", "shape": "Page.airingSchedules", "body": synthetic_airing_page()},
+        {"service": "anilist", "shape": "Media", "body": {"data": {"Media": detail}}},
+        {"service": "anilist", "shape": "Page.staff", "body": {"data": {"Page": {"staff": [
+            {"id": i, "name": {"full": f"Voice Actor {i}"}, "image": {"large": None}} for i in range(20)
+        ]}}}},
+        {"service": "mangadex", "method": "GET", "path": "/manga", "body": synthetic_mangadex_search()},
+        {"service": "mangadex", "method": "GET", "path": "/manga/*", "body": synthetic_mangadex_manga()},
+    ]
+
+
+def load_recorded(directory=FIXTURES_DIR):
+    """Every fixture recorded into the fixtures directory"""
+    entries = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            entries.extend(json.load(f))
+    return entries
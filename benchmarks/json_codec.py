@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from utils import jsoncodec
+from fixtures import synthetic_season_page
+
+"""
+
+    Decode/encode cost per request for the stdlib json module and the active jsoncodec backend.
+
+    python benchmarks/json_codec.py [--payload recorded_response.json ...]
+
+    Without --payload a season catalog page shaped like the detail profile is generated.
+
+"""
+
+
+def best_of(func, arg, number, repeat=5):
+    """Best average seconds per call over several timing runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(arg)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON codec micro-benchmark")
+    parser.add_argument("--payload", action="append", default=[], help="Recorded AniList response body")
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    payloads = []
+    for path in args.payload:
+        with open(path, "rb") as f:
+            payloads.append((os.path.basename(path), f.read()))
+    if not payloads:
+        payloads.append(("synthetic season page", json.dumps(synthetic_season_page()).encode()))
+
+    print(f"jsoncodec backend: {jsoncodec.BACKEND}")
+    for name, raw in payloads:
+        decoded = json.loads(raw)
+        decode_std = best_of(json.loads, raw, args.number)
+        decode_codec = best_of(jsoncodec.loads, raw, args.number)
+        encode_std = best_of(json.dumps, decoded, args.number)
+        encode_codec = best_of(jsoncodec.dumps, decoded, args.number)
+
+        print(f"\n{name} ({len(raw) / 1024:.1f} KiB)")
+        print(f"  decode  json {decode_std * 1e6:9.1f} us   {jsoncodec.BACKEND} {decode_codec * 1e6:9.1f} us   saved {(decode_std - decode_codec) * 1e6:9.1f} us/request")
+        print(f"  encode  json {encode_std * 1e6:9.1f} us   {jsoncodec.BACKEND} {encode_codec * 1e6:9.1f} us   saved {(encode_std - encode_codec) * 1e6:9.1f} us/request")
+
+    # DatabaseManager encodes genres for every cached anime
+    genres = ["Action", "Adventure", "Fantasy"]
+    genres_std = best_of(json.dumps, genres, args.number * 50)
+    genres_codec = best_of(jsoncodec.dumps, genres, args.number * 50)
+    print("\ngenres column")
+    print(f"  encode  json {genres_std * 1e6:9.2f} us   {jsoncodec.BACKEND} {genres_codec * 1e6:9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
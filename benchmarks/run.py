@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import glob
+import importlib
+import json
+import os
+import platform
+import sys
+import traceback
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+if BENCH_DIR not in sys.path:
+    sys.path.insert(0, BENCH_DIR)
+
+from suite import BENCHMARKS
+from utils import jsoncodec
+
+"""
+
+    Runs every bench_*.py benchmark, writes the results as JSON and compares
+    them with a stored baseline.
+
+    python benchmarks/run.py                     # quick sizes, compare with baseline.json
+    python benchmarks/run.py --full              # adds the 100k subscriber fan-out
+    python benchmarks/run.py --only notifications --only anilist
+    python benchmarks/run.py --update-baseline   # accept the current numbers
+
+    Exits with status 1 when any metric is worse than its baseline by more
+    than the tolerance (--tolerance, or "tolerance" on the baseline entry).
+    Baselines are machine specific; regenerate one on the box that runs it.
+
+"""
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "latest.json")
+
+
+def discover():
+    """Import every bench_*.py module; returns {module: reason} for those that can't run here"""
+    unavailable = {}
+    for path in sorted(glob.glob(os.path.join(BENCH_DIR, "bench_*.py"))):
+        module = os.path.splitext(os.path.basename(path))[0]
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            unavailable[module] = str(e)
+    return unavailable
+
+
+async def run_benchmarks(options):
+    results = {}
+    failures = {}
+    for name, func in BENCHMARKS.items():
+        if options.only and not any(name.startswith(prefix) for prefix in options.only):
+            continue
+        print(f"Running {name}...")
+        try:
+            for result in await func(options):
+                results[result.name] = {
+                    "value": result.value,
+                    "unit": result.unit,
+                    "higher_is_better": result.higher_is_better,
+                }
+        except Exception as e:
+            print(f"Benchmark {name} failed: {e}")
+            traceback.print_exc()
+            failures[name] = str(e)
+    return results, failures
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of (name, baseline value, current value, change, regressed)"""
+    rows = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            rows.append((name, None, current["value"], None, False))
+            continue
+
+        base_value = reference["value"]
+        if base_value == 0:
+            change = 0.0 if current["value"] == 0 else float("inf")
+        else:
+            change = current["value"] / base_value - 1
+        # Positive change is always an improvement from here on
+        if not current["higher_is_better"]:
+            change = -change
+        allowed = reference.get("tolerance", tolerance)
+        rows.append((name, base_value, current["value"], change, change < -allowed))
+    return rows
+
+
+def print_comparison(rows, results):
+    print(f"\n{'benchmark':<52} {'baseline':>12} {'current':>12} {'unit':>7} {'change':>8}")
+    for name, base_value, value, change, regressed in rows:
+        unit = results[name]["unit"]
+        base_text = f"{base_value:12.2f}" if base_value is not None else f"{'-':>12}"
+        change_text = f"{change * 100:+7.1f}%" if change is not None else f"{'new':>8}"
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<52} {base_text} {value:12.2f} {unit:>7} {change_text}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare against a baseline")
+    parser.add_argument("--only", action="append", default=[], help="Run benchmarks whose name starts with this")
+    parser.add_argument("--full", action="store_true", help="Include the slow sizes, e.g. 100k subscribers")
+    parser.add_argument("--mysql", action="store_true", help="Run the DatabaseManager benchmarks against DB_* (use a scratch database)")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Milliseconds per in-memory database call")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed fractional slowdown before failing")
+    parser.add_argument("--update-baseline", action="store_true")
+    options = parser.parse_args()
+
+    unavailable = discover()
+    for module, reason in unavailable.items():
+        print(f"Skipping {module}: {reason}")
+
+    results, failures = asyncio.run(run_benchmarks(options))
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "json_backend": jsoncodec.BACKEND,
+        "results": results,
+        "failures": failures,
+        "skipped": unavailable,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+    with open(options.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {options.output}")
+
+    if options.update_baseline:
+        baseline = {}
+        if os.path.exists(options.baseline):
+            with open(options.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+        # Keep hand-set tolerances and metrics that weren't part of this run
+        for name, result in results.items():
+            if "tolerance" in baseline.get(name, {}):
+                result = dict(result, tolerance=baseline[name]["tolerance"])
+            baseline[name] = result
+        with open(options.baseline, "w", encoding="utf-8") as f:
+            json.dump(dict(report, results=dict(sorted(baseline.items()))), f, indent=2)
+        print(f"Updated baseline {options.baseline}")
+        return
+
+    if not os.path.exists(options.baseline):
+        print(f"No baseline at {options.baseline}, run with --update-baseline to create one")
+        sys.exit(1 if failures else 0)
+
+    with open(options.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    rows = compare(results, baseline, options.tolerance)
+    print_comparison(rows, results)
+
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions or failures:
+        print(f"\n{len(regressions)} regressions, {len(failures)} failed benchmarks")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+import aiohttp
+from aiohttp import web
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if os.path.dirname(BASE_DIR) not in sys.path:
+    sys.path.insert(0, os.path.dirname(BASE_DIR))
+
+from utils import jsoncodec
+from fixtures import (
+    FIXTURES_DIR, canonical_variables, load_recorded, normalize_query,
+    query_shape, seed_fixtures, synthetic_nitter_rss
+)
+
+"""
+
+    Local stand-in for AniList, MangaDex and Nitter so the real clients can be
+    driven at high request rates without network access.
+
+    python benchmarks/stub_server.py --port 8765 --latency 40 --jitter 20 --rate-limit-every 90
+
+    Then point the bot (or a benchmark) at it:
+        ANILIST_API_URL=http://127.0.0.1:8765/anilist
+        MANGADEX_API_URL=http://127.0.0.1:8765/mangadex
+        NITTER_URL=http://127.0.0.1:8765/nitter
+
+    GraphQL requests are matched on normalized query + variables, then on the
+    query alone, then on the root field shape ("Page.media", "Media", ...).
+    --record proxies misses to the real APIs and saves them into fixtures/.
+    Faults can be changed while running with POST /__stub/config, and
+    GET /__stub/stats returns request, match and fault counters.
+
+"""
+
+UPSTREAMS = {
+    "anilist": "https://graphql.anilist.co",
+    "mangadex": "https://api.mangadex.org",
+}
+
+DEFAULT_CONFIG = {
+    "latency_ms": 0,
+    "jitter_ms": 0,
+    # Every Nth request is answered with a 429, 0 disables
+    "rate_limit_every": 0,
+    "rate_limit_probability": 0.0,
+    "retry_after": 2,
+    "error_rate": 0.0,
+    "error_status": 503,
+}
+
+
+class FixtureIndex:
+
+    def __init__(self, entries):
+        self.exact = {}
+        self.by_query = {}
+        self.by_shape = {}
+        self.rest = {}
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry):
+        body = entry["body"]
+        if entry["service"] == "anilist":
+            if "query" in entry:
+                query = normalize_query(entry["query"])
+                self.exact[(query, canonical_variables(entry.get("variables")))] = body
+                self.by_query.setdefault(query, body)
+            shape = entry.get("shape") or query_shape(entry.get("query", ""))
+            self.by_shape.setdefault(shape, body)
+        else:
+            self.rest[(entry["service"], entry.get("method", "GET"), entry["path"])] = body
+
+    def match_graphql(self, query, variables):
+        """Returns (body, level) with level one of exact, query, shape or None"""
+        query = normalize_query(query)
+        body = self.exact.get((query, canonical_variables(variables)))
+        if body is not None:
+            return body, "exact"
+        body = self.by_query.get(query)
+        if body is not None:
+            return body, "query"
+        body = self.by_shape.get(query_shape(query))
+        if body is not None:
+            return body, "shape"
+        return None, None
+
+    def match_rest(self, service, method, path):
+        body = self.rest.get((service, method, path))
+        if body is not None:
+            return body, "exact"
+        # "/manga/*" answers any single id below /manga
+        parent = path.rsplit("/", 1)[0]
+        body = self.rest.get((service, method, f"{parent}/*"))
+        if body is not None:
+            return body, "shape"
+        return None, None
+
+
+class StubServer:
+
+    def __init__(self, entries=None, config=None, record=False, seed=None):
+        self.index = FixtureIndex(entries if entries is not None else load_recorded() + seed_fixtures())
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.record = record
+        self.recorded = []
+        self.rng = random.Random(seed)
+        self.session = None
+        self.stats = {"requests": 0, "by_service": {}, "matches": {}, "misses": 0, "rate_limited": 0, "errors": 0}
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_post("/anilist", self.handle_anilist)
+        app.router.add_get("/mangadex/{tail:.*}", self.handle_mangadex)
+        app.router.add_get("/nitter/{username}/rss", self.handle_nitter)
+        app.router.add_post("/__stub/config", self.handle_config)
+        app.router.add_get("/__stub/stats", self.handle_stats)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def inject_faults(self, service):
+        """Apply latency and maybe return a fault response instead of the fixture"""
+        self.stats["requests"] += 1
+        self.stats["by_service"][service] = self.stats["by_service"].get(service, 0) + 1
+        config = self.config
+
+        delay = config["latency_ms"] + self.rng.uniform(0, config["jitter_ms"])
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        every = config["rate_limit_every"]
+        if (every and self.stats["requests"] % every == 0) or self.rng.random() < config["rate_limit_probability"]:
+            self.stats["rate_limited"] += 1
+            return web.json_response(
+                {"errors": [{"message": "Too Many Requests.", "status": 429}]},
+                status=429, headers={"Retry-After": str(config["retry_after"])}, dumps=jsoncodec.dumps
+            )
+
+        if self.rng.random() < config["error_rate"]:
+            self.stats["errors"] += 1
+            return web.json_response(
+                {"errors": [{"message": "Injected upstream error"}]}, status=config["error_status"], dumps=jsoncodec.dumps
+            )
+        return None
+
+    def count_match(self, level):
+        if level is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["matches"][level] = self.stats["matches"].get(level, 0) + 1
+
+    async def handle_anilist(self, request):
+        fault = await self.inject_faults("anilist")
+        if fault is not None:
+            return fault
+
+        payload = await request.json(loads=jsoncodec.loads)
+        query = payload.get("query", "")
+        variables = payload.get("variables") or {}
+        body, level = self.index.match_graphql(query, variables)
+
+        if body is None and self.record:
+            body = await self.fetch_upstream("POST", UPSTREAMS["anilist"], json_body=payload)
+            if body is not None:
+                level = "recorded"
+                self.save_entry({"service": "anilist", "query": query, "variables": variables, "body": body})
+
+        self.count_match(level)
+        if body is None:
+            return web.json_response(
+                {"errors": [{"message": f"No fixture for {query_shape(query) or 'query'}"}]}, status=404, dumps=jsoncodec.dumps
+            )
+        return web.json_response(body, dumps=jsoncodec.dumps)
+
+    async def handle_mangadex(self, request):
+        fault = await self.inject_faults("mangadex")
+        if fault is not None:
+            return fault
+
+        path = "/" + request.match_info["tail"]
+        body, level = self.index.match_rest("mangadex", "GET", path)
+
+        if body is None and self.record:
+            body = await self.fetch_upstream("GET", UPSTREAMS["mangadex"] + path, params=request.query)
+            if body is not None:
+                level = "recorded"
+                self.save_entry({"service": "mangadex", "method": "GET", "path": path, "body": body})
+
+        self.count_match(level)
+        if body is None:
+            return web.json_response({"result": "error", "errors": [{"detail": f"No fixture for {path}"}]}, status=404)
+        return web.json_response(body, dumps=jsoncodec.dumps)
+
+    async def handle_nitter(self, request):
+        fault = await self.inject_faults("nitter")
+        if fault is not None:
+            return fault
+        self.count_match("shape")
+        return web.Response(text=synthetic_nitter_rss(request.match_info["username"]), content_type="application/rss+xml")
+
+    async def handle_config(self, request):
+        changes = await request.json(loads=jsoncodec.loads)
+        unknown = set(changes) - set(DEFAULT_CONFIG)
+        if unknown:
+            return web.json_response({"error": f"Unknown settings: {', '.join(sorted(unknown))}"}, status=400)
+        self.config.update(changes)
+        return web.json_response(self.config)
+
+    async def handle_stats(self, request):
+        return web.json_response(dict(self.stats, config=self.config))
+
+    async def fetch_upstream(self, method, url, json_body=None, params=None):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(json_serialize=jsoncodec.dumps)
+        try:
+            async with self.session.request(method, url, json=json_body, params=params) as response:
+                if response.status != 200:
+                    print(f"Upstream {url} answered {response.status}, not recording")
+                    return None
+                return await response.json(loads=jsoncodec.loads)
+        except Exception as e:
+            print(f"Error recording from {url}: {e}")
+            return None
+
+    def save_entry(self, entry):
+        self.index.add(entry)
+        self.recorded.append(entry)
+
+    def flush_recorded(self):
+        """Append everything recorded this run to fixtures/recorded-<service>.json"""
+        if not self.recorded:
+            return
+        os.makedirs(FIXTURES_DIR, exist_ok=True)
+        by_service = {}
+        for entry in self.recorded:
+            by_service.setdefault(entry["service"], []).append(entry)
+
+        for service, entries in by_service.items():
+            path = os.path.join(FIXTURES_DIR, f"recorded-{service}.json")
+            existing = []
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    existing = json.load(f)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(existing + entries, f, ensure_ascii=False, indent=1)
+            print(f"Recorded {len(entries)} {service} fixtures to {path}")
+        self.recorded = []
+
+    async def on_cleanup(self, app):
+        self.flush_recorded()
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+
+async def start_stub_server(host="127.0.0.1", port=0, **kwargs):
+    """
+    Start a StubServer inside the current event loop
+
+    Returns:
+        tuple: (StubServer, web.AppRunner, base url); call runner.cleanup() to stop it
+    """
+    stub = StubServer(**kwargs)
+    runner = web.AppRunner(stub.build_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return stub, runner, f"http://{host}:{bound_port}"
+
+
+def stub_environment(base_url):
+    """Environment variables that point the bot's HTTP clients at a running stub"""
+    return {
+        "ANILIST_API_URL": f"{base_url}/anilist",
+        "MANGADEX_API_URL": f"{base_url}/mangadex",
+        "NITTER_URL": f"{base_url}/nitter",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AniList/MangaDex/Nitter stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0, help="Base latency in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Extra random latency up to this many ms")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with a 429")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=2, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--record", action="store_true", help="Proxy misses to the real APIs and save them as fixtures")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for jitter and probabilistic faults")
+    args = parser.parse_args()
+
+    stub = StubServer(
+        config={
+            "latency_ms": args.latency,
+            "jitter_ms": args.jitter,
+            "rate_limit_every": args.rate_limit_every,
+            "rate_limit_probability": args.rate_limit_probability,
+            "retry_after": args.retry_after,
+            "error_rate": args.error_rate,
+            "error_status": args.error_status,
+        },
+        record=args.record,
+        seed=args.seed,
+    )
+    base_url = f"http://{args.host}:{args.port}"
+    for name, value in stub_environment(base_url).items():
+        print(f"{name}={value}")
+    web.run_app(stub.build_app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+from collections import namedtuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+"""
+
+    Registry for the bench_*.py modules that run.py collects.
+
+    A benchmark is an async function taking the parsed run.py options and
+    returning a list of Result tuples. Names are dotted, area first, so
+    `run.py --only greetings` picks every greeting benchmark.
+
+"""
+
+Result = namedtuple("Result", ["name", "value", "unit", "higher_is_better"])
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register an async benchmark under the given name"""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def throughput(name, count, seconds, unit="ops/s"):
+    return Result(name, count / seconds if seconds else 0.0, unit, True)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def latency_results(name, samples, unit="us", percentiles=(0.50, 0.99)):
+    """p50/p99 (by default) of samples in seconds, lower is better"""
+    scale = {"us": 1e6, "ms": 1e3, "s": 1.0}[unit]
+    return [
+        Result(f"{name}.p{int(fraction * 100)}_{unit}", percentile(samples, fraction) * scale, unit, False)
+        for fraction in percentiles
+    ]
+
+
+class Timer:
+    """with Timer() as t: ...; t.elapsed is in seconds"""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
@@ -1,16 +1,22 @@
 import nextcord
-from nextcord.ext import commands
+from nextcord.ext import commands, tasks
 import asyncio
 import random
 import datetime
 from typing import List, Dict, Any, Optional
+from utils.genres import parse_genres, complete_genres
+from utils.anilist import MEDIA_FIELDS
+from utils.catalog import media_from_cache_row
+from utils import metrics
+from utils import runtime
 
 class AnimeSelectView(nextcord.ui.View):
     """View with a select menu for choosing an anime from recommendations"""
-    def __init__(self, anime_list, db, timeout=180):
+    def __init__(self, anime_list, db, anilist=None, timeout=180):
         super().__init__(timeout=timeout)
         self.anime_list = anime_list
         self.db = db
+        self.anilist = anilist
         
         # Create select menu
         select_options = []
@@ -67,7 +73,12 @@ class AnimeSelect(nextcord.ui.Select):
             
             # If we couldn't get the AnimeCog, get details directly
             if not anime_cog:
-                # Get detailed anime info 
+                # The menu only carries list fields, so fetch the card for the one that was opened
+                if self.parent_view.anilist:
+                    details = await self.parent_view.anilist.get_media(selected_id, profile="card")
+                    if details:
+                        selected_anime = details
+                
                 # Cache anime data in database
                 await self.db.cache_anime(selected_anime)
                 
@@ -125,47 +136,7 @@ class AnimeSelect(nextcord.ui.Select):
                 anilist_query = '''
                 query ($id: Int) {
                   Media(id: $id, type: ANIME) {
-                    id
-                    title {
-                      romaji
-                      english
-                    }
-                    description
-                    coverImage {
-                      large
-                    }
-                    format
-                    episodes
-                    status
-                    seasonYear
-                    season
-                    nextAiringEpisode {
-                      episode
-                      airingAt
-                    }
-                    studios(isMain: true) {
-                      nodes {
-                        name
-                      }
-                    }
-                    genres
-                    siteUrl
-                    relations {
-                      edges {
-                        relationType
-                        node {
-                          id
-                          title {
-                            romaji
-                          }
-                          format
-                          type
-                          status
-                          seasonYear
-                          season
-                        }
-                      }
-                    }
+                ''' + MEDIA_FIELDS["detail"] + '''
                   }
                 }
                 '''
@@ -173,14 +144,20 @@ class AnimeSelect(nextcord.ui.Select):
                 # Get detailed info using anime cog's query method
                 result = await anime_cog.query_anilist(anilist_query, {'id': selected_id})
                 
+                stale = False
                 if 'errors' in result:
-                    await interaction.followup.send(f"Error: {result['errors'][0]['message']}")
-                    return
+                    # Degraded mode: show the cached copy while AniList is failing
+                    cached = await anime_cog.db.get_cached_anime(selected_id)
+                    if not cached:
+                        await interaction.followup.send(f"Error: {result['errors'][0]['message']}")
+                        return
+                    anime = media_from_cache_row(cached)
+                    stale = True
+                else:
+                    anime = result['data']['Media']
                     
-                anime = result['data']['Media']
-                
-                # Cache anime data in database
-                await anime_cog.db.cache_anime(anime)
+                    # Cache anime data in database
+                    await anime_cog.db.cache_anime(anime)
                 
                 # Create embed using the same code as in anime search
                 embed = nextcord.Embed(title=anime['title']['romaji'], url=anime['siteUrl'], color=0x00A8FF)
@@ -223,7 +200,10 @@ class AnimeSelect(nextcord.ui.Select):
                 if anime['coverImage']['large']:
                     embed.set_thumbnail(url=anime['coverImage']['large'])
                     
-                embed.set_footer(text=f"Data from AniList • ID: {anime['id']}")
+                if stale:
+                    embed.set_footer(text=f"Cached data, AniList is unavailable • ID: {anime['id']}")
+                else:
+                    embed.set_footer(text=f"Data from AniList • ID: {anime['id']}")
                 
                 # Check for related seasons
                 related_seasons = []
@@ -270,22 +250,45 @@ class AniListCog(commands.Cog):
         self.bot = bot
         # Get database and AniList API from existing cogs
         from utils.db import DatabaseManager
-        self.db = DatabaseManager(bot)
+        self.db = DatabaseManager(bot, name="anilist")
         
         # Get AniList API from utils
         from utils.anilist import AniListAPI
         self.anilist = AniListAPI()
         
-        # Complete list of genres used by AniList
-        self.common_genres = [
-            "Action", "Adventure", "Comedy", "Drama", "Ecchi", "Fantasy", 
-            "Horror", "Mahou Shoujo", "Mecha", "Music", "Mystery", "Psychological", 
-            "Romance", "Sci-Fi", "Slice of Life", "Sports", "Supernatural", 
-            "Thriller", "Hentai", "Isekai", "Josei", "Kids", "Seinen", 
-            "Shoujo", "Shounen", "Yaoi", "Yuri", "Parody", "Demons", 
-            "Game", "Historical", "Martial Arts", "Military", "School",
-            "Space", "Vampire", "Cars", "Dementia", "Harem", "Magic"
-        ]
+        # Recommendation candidates shared by every user asking for the same years and genres
+        from utils.pools import CandidatePoolStore
+        self.recommendation_pools = CandidatePoolStore(self.fetch_recommendation_candidates)
+        
+        # Genre/tag vectors of everything in anime_cache, rebuilt by refresh_similarity_index
+        self.similarity = None
+        self.refresh_similarity_index.start()
+    
+    def cog_unload(self):
+        self.refresh_similarity_index.cancel()
+        asyncio.create_task(self.anilist.cleanup())
+    
+    @tasks.loop(hours=1)
+    @metrics.timed_loop("refresh_similarity_index")
+    async def refresh_similarity_index(self):
+        """Rebuild the similar anime index from the local anime_cache"""
+        try:
+            from utils.similarity import SimilarityIndex
+            
+            rows = await self.db.get_similarity_rows()
+            if not rows:
+                return
+            
+            # Building the matrix is CPU bound, keep it off the event loop
+            self.similarity = await runtime.run_in("image", SimilarityIndex.from_cache_rows, rows)
+            print(f"Built similar anime index over {len(self.similarity)} titles")
+        except Exception as e:
+            print(f"Error in refresh_similarity_index task: {e}")
+    
+    @refresh_similarity_index.before_loop
+    async def before_refresh_similarity_index(self):
+        """Wait for bot to be ready before starting task"""
+        await self.bot.wait_until_ready()
     
     @nextcord.slash_command(name="anilist", description="AniList related commands")
     async def anilist(self, interaction: nextcord.Interaction):
@@ -337,70 +340,30 @@ class AniListCog(commands.Cog):
             # This makes the bot "future-proof" - it will work even as years advance
             # AniList data includes announced future seasons
             
-            # Parse genres
-            genre_list = []
-            if genres:
-                # Split by comma and strip whitespace
-                genre_list = [g.strip() for g in genres.split(',')]
-                
-                # Clean up genre names to match AniList's format exactly
-                # First, capitalize each word in multi-word genres
-                genre_list = [g.title() for g in genre_list]
-                
-                # Handle special cases to match AniList conventions exactly
-                genre_mapping = {
-                    "Sci-fi": "Sci-Fi",
-                    "Scifi": "Sci-Fi",
-                    "Science Fiction": "Sci-Fi",
-                    "Slice Of Life": "Slice of Life",
-                    "Mahou Shoujo": "Mahou Shoujo",
-                    "Magical Girl": "Mahou Shoujo",
-                    "Shounen": "Shounen",
-                    "Shonen": "Shounen",
-                    "Shoujo": "Shoujo",
-                    "Shojo": "Shoujo",
-                    "Seinen": "Seinen",
-                    "Josei": "Josei"
-                }
-                
-                # Apply mapping for special cases
-                genre_list = [genre_mapping.get(g, g) for g in genre_list]
-                
-                # Validate that all genres are in the allowed list
-                valid_genres = []
-                for genre in genre_list:
-                    if genre in self.common_genres:
-                        valid_genres.append(genre)
-                    else:
-                        # Try to find a close match
-                        found = False
-                        for valid_genre in self.common_genres:
-                            if valid_genre.lower() == genre.lower():
-                                valid_genres.append(valid_genre)
-                                found = True
-                                break
-                        
-                        if not found and interaction:
-                            print(f"Warning: Genre '{genre}' not found in AniList genres, skipping")
-                
-                genre_list = valid_genres
+            # Parse genres into AniList's spelling, rejecting anything unknown before querying
+            genre_list, invalid_genres = parse_genres(genres)
+            if invalid_genres:
+                problems = []
+                for name, suggestions in invalid_genres:
+                    hint = f" Did you mean {' or '.join(suggestions)}?" if suggestions else ""
+                    problems.append(f"• `{name}` is not an AniList genre.{hint}")
+                await interaction.followup.send("\n".join(problems), ephemeral=True)
+                return
+            
+            # Randomly select 5 anime (or less if there are fewer results) from the shared pool
+            selected_anime = await self.recommendation_pools.sample(year_min, year_max, genre_list, 5)
+            stale = False
             
-            # Query AniList for anime matching the criteria
-            result = await self.query_recommendations(year_min, year_max, genre_list)
+            if not selected_anime:
+                # Degraded mode: draw from anime_cache when AniList can't fill the pool
+                cached = await self.db.get_cached_anime_between(year_min, year_max, genre_list, limit=5)
+                selected_anime = [media_from_cache_row(row) for row in cached]
+                stale = bool(selected_anime)
             
-            if not result or not result.get('data') or not result['data'].get('Page') or not result['data']['Page'].get('media') or len(result['data']['Page']['media']) == 0:
+            if not selected_anime:
                 await interaction.followup.send("No anime found matching your criteria. Try different years or genres.", ephemeral=True)
                 return
             
-            # Get the list of anime
-            anime_list = result['data']['Page']['media']
-            
-            # Randomly select 5 anime (or less if there are fewer results)
-            if len(anime_list) > 5:
-                selected_anime = random.sample(anime_list, 5)
-            else:
-                selected_anime = anime_list
-            
             # Create the recommendations embed
             embed = nextcord.Embed(
                 title="Anime Recommendations",
@@ -439,7 +402,10 @@ class AniListCog(commands.Cog):
                 )
             
             # Add a note about the selection menu
-            embed.set_footer(text="Use the menu below to get more details about any of these anime")
+            if stale:
+                embed.set_footer(text="Cached data, AniList is unavailable • Use the menu below for more details")
+            else:
+                embed.set_footer(text="Use the menu below to get more details about any of these anime")
             
             # If any anime has a cover image, use the first one as the thumbnail
             for anime in selected_anime:
@@ -448,7 +414,7 @@ class AniListCog(commands.Cog):
                     break
             
             # Create and send the view with select menu
-            view = AnimeSelectView(selected_anime, self.db)
+            view = AnimeSelectView(selected_anime, self.db, self.anilist)
             response = await interaction.followup.send(embed=embed, view=view)
             
             # Store the message for view reference
@@ -459,8 +425,116 @@ class AniListCog(commands.Cog):
             print(f"Error in anime recommendations: {e}")
             await interaction.followup.send("An error occurred while fetching anime recommendations. Please try again later.", ephemeral=True)
     
-    async def query_recommendations(self, year_min, year_max, genres=None):
+    @anilist.subcommand(
+        name="similar",
+        description="Find anime similar to a title by genres and tags"
+    )
+    async def similar(
+        self,
+        interaction: nextcord.Interaction,
+        title: str = nextcord.SlashOption(
+            name="title",
+            description="Anime to find similar titles for",
+            required=True
+        )
+    ):
+        """Rank cached anime by genre/tag similarity to the given title"""
+        await interaction.response.defer()
+        
+        try:
+            index = self.similarity
+            if index is None or not len(index):
+                await interaction.followup.send("The similar anime index is still being built. Please try again in a few minutes.", ephemeral=True)
+                return
+            
+            anime_id = index.find(title)
+            
+            if anime_id is not None:
+                base_title = index.entries[index.rows[anime_id]]['title']['romaji']
+                results = index.similar_to(anime_id, 5)
+            else:
+                # Unknown titles need one lookup for their genres and tags
+                anime_list = await self.anilist.search_anime(title, profile="list", per_page=1)
+                if not anime_list:
+                    await interaction.followup.send("No anime found with that title. Try a different search term.", ephemeral=True)
+                    return
+                
+                anime_id = anime_list[0]['id']
+                details = await self.anilist.get_anime_details(anime_id)
+                if not details:
+                    await interaction.followup.send("An error occurred while fetching anime details. Please try again later.", ephemeral=True)
+                    return
+                
+                await self.db.cache_anime(details)
+                await self.db.update_anime_tags(anime_id, details.get('tags') or [])
+                
+                base_title = details['title']['romaji']
+                vector = index.vectorize(details.get('genres') or [], details.get('tags') or [])
+                results = index.most_similar(vector, 5, exclude=anime_id)
+            
+            if not results:
+                await interaction.followup.send(f"Couldn't find anything similar to {base_title}.", ephemeral=True)
+                return
+            
+            embed = nextcord.Embed(
+                title=f"Anime Similar to {base_title}",
+                description="Ranked by shared genres and tags",
+                color=0x00A8FF
+            )
+            
+            for i, (anime, score) in enumerate(results, 1):
+                title_display = anime['title']['romaji']
+                english_title = anime['title'].get('english')
+                if english_title and english_title != title_display:
+                    title_display += f" / {english_title}"
+                
+                embed.add_field(
+                    name=f"{i}. {title_display}",
+                    value=(
+                        f"**Match:** {round(score * 100)}%\n"
+                        f"**Year:** {anime.get('seasonYear') or 'Unknown'}\n"
+                        f"**Genres:** {', '.join(anime['genres'][:3]) + ('...' if len(anime['genres']) > 3 else '')}"
+                    ),
+                    inline=False
+                )
+            
+            embed.set_footer(text="Use the menu below to get more details about any of these anime")
+            
+            for anime, _ in results:
+                if anime.get('coverImage', {}).get('large'):
+                    embed.set_thumbnail(url=anime['coverImage']['large'])
+                    break
+            
+            view = AnimeSelectView([anime for anime, _ in results], self.db, self.anilist)
+            response = await interaction.followup.send(embed=embed, view=view)
+            
+            if hasattr(response, 'id'):
+                view.message = response
+            
+        except Exception as e:
+            print(f"Error in similar anime command: {e}")
+            await interaction.followup.send("An error occurred while finding similar anime. Please try again later.", ephemeral=True)
+    
+    @recommend.on_autocomplete("genres")
+    async def recommend_genres_autocomplete(self, interaction: nextcord.Interaction, genres: str):
+        """Suggest AniList genres for the last entry of the comma-separated list"""
+        await interaction.response.send_autocomplete(complete_genres(genres))
+    
+    async def fetch_recommendation_candidates(self, year_min, year_max, genres=None):
+        """Fetch one page of candidates for the recommendation pool"""
+        result = await self.query_recommendations(year_min, year_max, genres)
+        anime_list = ((result or {}).get('data') or {}).get('Page', {}).get('media')
+        
+        # Narrow filters may not reach the random page, so fall back to the first one
+        if not anime_list:
+            result = await self.query_recommendations(year_min, year_max, genres, page=1)
+            anime_list = ((result or {}).get('data') or {}).get('Page', {}).get('media')
+        
+        return anime_list or []
+    
+    async def query_recommendations(self, year_min, year_max, genres=None, page=None):
         """Query AniList API for anime recommendations"""
+        # Only 5 of these are ever shown, and details are fetched once one is opened
         query = """
         query ($page: Int, $perPage: Int, $yearMin: Int, $yearMax: Int, $genres: [String]) {
           Page(page: $page, perPage: $perPage) {
@@ -473,53 +547,15 @@ class AniListCog(commands.Cog):
               genre_in: $genres,
               countryOfOrigin: "JP"
             ) {
-              id
-              title {
-                romaji
-                english
-              }
-              description
-              seasonYear
-              season
-              episodes
-              status
-              genres
-              coverImage {
-                large
-              }
-              studios {
-                nodes {
-                  name
-                }
-              }
-              nextAiringEpisode {
-                airingAt
-                episode
-              }
-              siteUrl
-              relations {
-                edges {
-                  relationType
-                  node {
-                    id
-                    title {
-                      romaji
-                    }
-                    format
-                    type
-                    status
-                    seasonYear
-                    season
-                  }
-                }
-              }
+        """ + MEDIA_FIELDS["list"] + """
             }
           }
         }
         """
         
         # Randomly select a page between 1-5 for variety
-        page = random.randint(1, 5)
+        if page is None:
+            page = random.randint(1, 5)
         
         variables = {
             "page": page,
@@ -1,10 +1,16 @@
 import nextcord
 from nextcord.ext import commands, tasks
 from nextcord import SlashOption, Interaction
-import aiohttp
 import asyncio
 from datetime import datetime, timedelta
 import time
+from utils.catalog import get_season, get_next_season, media_from_cache_row, airing_from_cache_row
+from utils.anilist import MEDIA_FIELDS
+from utils import membercache
+from utils import metrics
+from utils import sharding
+
+NOTIFICATIONS_PENDING = metrics.gauge("bot_notifications_pending", "Subscriber DMs left in the running check_airing pass")
 
 class AnimeSubscribeView(nextcord.ui.View):
     def __init__(self, anime_id, anime_title, user_id, db):
@@ -201,8 +207,12 @@ class AnimeCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         from utils.db import DatabaseManager
-        self.db = DatabaseManager(bot)
-        self.session = None
+        self.db = DatabaseManager(bot, name="anime")
+        
+        from utils.anilist import AniListAPI
+        from utils.catalog import AnimeCatalog
+        self.anilist = AniListAPI()
+        self.catalog = AnimeCatalog()
         
         self.check_airing.start()
         
@@ -211,58 +221,20 @@ class AnimeCog(commands.Cog):
     async def setup(self):
         await self.bot.wait_until_ready()
         await self.db.setup_database()
+        # Tables have to exist before the first bulk upsert, and only the leader writes them
+        await sharding.wait_for_election(self.bot)
+        self.prefetch_catalog.start()
         
     def cog_unload(self):
         self.check_airing.cancel()
-        if self.session and not self.session.closed:
-            asyncio.create_task(self.session.close())
-            
-    async def get_session(self):
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        return self.session
+        self.prefetch_catalog.cancel()
+        asyncio.create_task(self.anilist.cleanup())
             
     async def query_anilist(self, query, variables=None):
-        if variables is None:
-            variables = {}
-            
-        session = await self.get_session()
-        url = 'https://graphql.anilist.co'
-        
+        """Query AniList through the shared client, which handles retries and the circuit breaker"""
         await asyncio.sleep(0.5)
         
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            try:
-                async with session.post(url, json={'query': query, 'variables': variables},
-                                     headers={"Content-Type": "application/json", "Accept": "application/json"}) as response:
-                    if response.status == 429:  
-                        retry_after = int(response.headers.get('Retry-After', 60))
-                        print(f"Rate limited by AniList API, retrying after {retry_after} seconds (attempt {retry_count + 1}/{max_retries})")
-                        await asyncio.sleep(retry_after)
-                        retry_count += 1
-                        continue
-                        
-                    if not response.ok:
-                        print(f"AniList API error: Status {response.status}, {await response.text()}")
-                        if retry_count < max_retries - 1:
-                            retry_count += 1
-                            await asyncio.sleep(2 ** retry_count)
-                            continue
-                        return {"errors": [{"message": f"API responded with status {response.status}"}]}
-                    
-                    return await response.json()
-            except Exception as e:
-                print(f"Error querying AniList API: {e}")
-                if retry_count < max_retries - 1:
-                    retry_count += 1
-                    await asyncio.sleep(2 ** retry_count)
-                    continue
-                return {"errors": [{"message": str(e)}]}
-        
-        return {"errors": [{"message": "Max retries exceeded"}]}
+        return await self.anilist._make_request(query, variables)
 
     @nextcord.slash_command(name="anime", description="Anime commands")
     async def anime(self, interaction: nextcord.Interaction):
@@ -273,63 +245,35 @@ class AnimeCog(commands.Cog):
         try:
             await interaction.response.defer()
             
+            # In-season titles are answered from the prefetched catalog
+            anime_list = self.catalog.search(query)
+            from_catalog = bool(anime_list)
+            stale = False
+            
+            # Only the first match is shown, so don't pay for nine more with relations
             anilist_query = '''
             query ($search: String) {
-                Page(page: 1, perPage: 10) {
+                Page(page: 1, perPage: 1) {
                     media(search: $search, type: ANIME, sort: POPULARITY_DESC) {
-                        id
-                        title {
-                            romaji
-                            english
-                        }
-                        description
-                        coverImage {
-                            large
-                        }
-                        format
-                        episodes
-                        status
-                        seasonYear
-                        season
-                        nextAiringEpisode {
-                            episode
-                            airingAt
-                        }
-                        studios(isMain: true) {
-                            nodes {
-                                name
-                            }
-                        }
-                        genres
-                        siteUrl
-                        relations {
-                            edges {
-                                relationType
-                                node {
-                                    id
-                                    title {
-                                        romaji
-                                    }
-                                    format
-                                    type
-                                    status
-                                    seasonYear
-                                    season
-                                }
-                            }
-                        }
+            ''' + MEDIA_FIELDS["detail"] + '''
                     }
                 }
             }
             '''
             
-            result = await self.query_anilist(anilist_query, {'search': query})
-            
-            if 'errors' in result:
-                await interaction.followup.send(f"Error: {result['errors'][0]['message']}")
-                return
+            if not from_catalog:
+                result = await self.query_anilist(anilist_query, {'search': query})
                 
-            anime_list = result['data']['Page']['media']
+                if 'errors' in result:
+                    # Degraded mode: answer from anime_cache while AniList is failing
+                    cached = await self.db.search_cached_anime(query)
+                    if not cached:
+                        await interaction.followup.send(f"Error: {result['errors'][0]['message']}")
+                        return
+                    anime_list = [media_from_cache_row(row) for row in cached]
+                    stale = True
+                else:
+                    anime_list = result['data']['Page']['media']
             
             if not anime_list:
                 await interaction.followup.send("No results found. Try a different search term.")
@@ -337,7 +281,8 @@ class AnimeCog(commands.Cog):
                 
             anime = anime_list[0]
             
-            await self.db.cache_anime(anime)
+            if not from_catalog and not stale:
+                await self.db.cache_anime(anime)
             
             embed = nextcord.Embed(title=anime['title']['romaji'], url=anime['siteUrl'], color=0x00A8FF)
             
@@ -378,7 +323,10 @@ class AnimeCog(commands.Cog):
             if anime['coverImage']['large']:
                 embed.set_thumbnail(url=anime['coverImage']['large'])
                 
-            embed.set_footer(text=f"Data from AniList • ID: {anime['id']}")
+            if stale:
+                embed.set_footer(text=f"Cached data, AniList is unavailable • ID: {anime['id']}")
+            else:
+                embed.set_footer(text=f"Data from AniList • ID: {anime['id']}")
             
             related_seasons = []
             
@@ -484,19 +432,30 @@ class AnimeCog(commands.Cog):
             }
             '''
             
-            variables = {'start': start_time, 'end': end_time}
-            result = await self.query_anilist(anilist_query, variables)
+            from_catalog = self.catalog.covers_airing(start_time, end_time)
+            stale = False
             
-            if 'errors' in result:
-                error_msg = result['errors'][0]['message'] if result['errors'] else "Unknown error"
-                await interaction.followup.send(f"Error retrieving anime data: {error_msg}")
-                return
-           
-            if 'data' not in result or 'Page' not in result['data'] or 'airingSchedules' not in result['data']['Page']:
-                await interaction.followup.send("Error: Received unexpected data format from anime API. Please try again later.")
-                return
+            if from_catalog:
+                airing_shows = self.catalog.get_airing(start_time, end_time)
+            else:
+                variables = {'start': start_time, 'end': end_time}
+                result = await self.query_anilist(anilist_query, variables)
                 
-            airing_shows = result['data']['Page']['airingSchedules']
+                if 'errors' in result:
+                    # Degraded mode: fall back to whatever airing_schedule already knows
+                    cached = await self.db.get_upcoming_episodes(start_time, end_time)
+                    if not cached:
+                        error_msg = result['errors'][0]['message'] if result['errors'] else "Unknown error"
+                        await interaction.followup.send(f"Error retrieving anime data: {error_msg}")
+                        return
+                    airing_shows = [airing_from_cache_row(row) for row in cached]
+                    stale = True
+                else:
+                    if 'data' not in result or 'Page' not in result['data'] or 'airingSchedules' not in result['data']['Page']:
+                        await interaction.followup.send("Error: Received unexpected data format from anime API. Please try again later.")
+                        return
+                        
+                    airing_shows = result['data']['Page']['airingSchedules']
             
             if not airing_shows:
                 await interaction.followup.send(f"No anime scheduled to air on {day_name}.")
@@ -521,6 +480,9 @@ class AnimeCog(commands.Cog):
                 content += f"**{title}**\n"
                 content += f"Episode {next_ep} at {time_str}\n\n"
                 
+                if from_catalog or stale:
+                    continue
+                
                 self.bot.loop.create_task(self.db.cache_anime({
                     'id': media['id'],
                     'title': media['title'],
@@ -544,7 +506,10 @@ class AnimeCog(commands.Cog):
                 embed.description = f"{embed.description}\n\n{truncated_content}\n\n*...and more episodes not shown*"
             
             date_str = target_date.strftime("%B %d, %Y")
-            embed.set_footer(text=f"{day_name}, {date_str} • Data from AniList")
+            if stale:
+                embed.set_footer(text=f"{day_name}, {date_str} • Cached data, AniList is unavailable")
+            else:
+                embed.set_footer(text=f"{day_name}, {date_str} • Data from AniList")
             
             await interaction.followup.send(embed=embed)
             
@@ -715,6 +680,7 @@ class AnimeCog(commands.Cog):
         await interaction.followup.send(embed=embed, ephemeral=True)
 
     @tasks.loop(minutes=15)
+    @metrics.timed_loop("check_airing")
     async def check_airing(self):
         try:
             aired_episodes = await self.db.get_recently_aired(hours_ago=1)
@@ -750,30 +716,34 @@ class AnimeCog(commands.Cog):
                 
                 embed.set_footer(text="You received this because you're subscribed to this anime.")
                 
-                for sub in subscribers:
-                    user_id = sub['user_id']
+                # DMs go out once per bot; the guild posts below are per shard
+                if sharding.is_elected(self.bot):
+                    for sent, sub in enumerate(subscribers):
+                        NOTIFICATIONS_PENDING.set(len(subscribers) - sent)
+                        user_id = sub['user_id']
                     
-                    settings = await self.db.get_user_settings(user_id)
-                    if not settings.get('notification_enabled', True):
-                        continue
+                        settings = await self.db.get_user_settings(user_id)
+                        if not settings.get('notification_enabled', True):
+                            continue
                         
-                    already_sent = await self.check_notification_sent(user_id, anime_id, episode)
-                    if already_sent:
-                        continue
+                        already_sent = await self.check_notification_sent(user_id, anime_id, episode)
+                        if already_sent:
+                            continue
                     
-                    title_format = settings.get('preferred_title_format', 'romaji')
-                    notification_embed = embed.copy()
+                        title_format = settings.get('preferred_title_format', 'romaji')
+                        notification_embed = embed.copy()
                     
-                    if title_format == 'english' and title_english:
-                        notification_embed.description = f"Episode {episode} of {title_english} just aired!"
+                        if title_format == 'english' and title_english:
+                            notification_embed.description = f"Episode {episode} of {title_english} just aired!"
                     
-                    try:
-                        user = await self.bot.fetch_user(user_id)
-                        await user.send(embed=notification_embed)
-                        await self.db.add_notification(user_id, anime_id, episode, successful=True)
-                    except Exception as e:
-                        print(f"Failed to DM user {user_id}: {e}")
-                        await self.db.add_notification(user_id, anime_id, episode, successful=False)
+                        try:
+                            user = await self.bot.fetch_user(user_id)
+                            await user.send(embed=notification_embed)
+                            await self.db.add_notification(user_id, anime_id, episode, successful=True)
+                        except Exception as e:
+                            print(f"Failed to DM user {user_id}: {e}")
+                            await self.db.add_notification(user_id, anime_id, episode, successful=False)
+                    NOTIFICATIONS_PENDING.set(0)
                 
                 for guild in self.bot.guilds:
                     settings = await self.db.get_guild_settings(guild.id)
@@ -781,14 +751,13 @@ class AnimeCog(commands.Cog):
                     if not settings.get('public_notifications', False) or not settings.get('notification_channel_id'):
                         continue
                         
-                    has_subscribers = False
-                    for sub in subscribers:
-                        member = guild.get_member(sub['user_id'])
-                        if member:
-                            has_subscribers = True
-                            break
-                            
-                    if not has_subscribers:
+                    # Asks the gateway for uncached subscribers, stopping at the first one found;
+                    # a guild whose query fails is skipped this pass rather than ending it
+                    try:
+                        if not await membercache.find_members(guild, [sub['user_id'] for sub in subscribers], first=True):
+                            continue
+                    except Exception as e:
+                        print(f"Could not look up subscribers in guild {guild.id}: {e}")
                         continue
                         
                     channel = guild.get_channel(settings['notification_channel_id'])
@@ -801,8 +770,57 @@ class AnimeCog(commands.Cog):
                             print(f"Failed to send public notification to guild {guild.id}: {e}")
                     
         except Exception as e:
+            NOTIFICATIONS_PENDING.set(0)
             print(f"Error in check_airing task: {e}")
             
+    @tasks.loop(hours=6)
+    @metrics.timed_loop("prefetch_catalog")
+    async def prefetch_catalog(self):
+        """Pull the current and next season plus the coming week's schedule into the local store"""
+        try:
+            # Every process fills its own catalog, one keeps the shared tables current
+            write_store = sharding.is_elected(self.bot)
+            season, year = get_season()
+            
+            for season, year in [(season, year), get_next_season(season, year)]:
+                media_list = await self.anilist.get_season_catalog(season, year)
+                if not media_list:
+                    print(f"Could not prefetch {season.title()} {year} catalog")
+                    continue
+                    
+                self.catalog.add_media(media_list)
+                if write_store:
+                    await self.db.bulk_cache_anime(media_list)
+                print(f"Prefetched {len(media_list)} anime for {season.title()} {year}")
+            
+            # Cover every day /anime airing can ask for, with a day of slack between refreshes
+            start_time = int(datetime.combine(datetime.now().date(), datetime.min.time()).timestamp())
+            end_time = start_time + 8 * 86400
+            
+            schedules = await self.anilist.get_airing_window(start_time, end_time)
+            if schedules is None:
+                print("Could not prefetch airing schedule")
+                return
+                
+            # Schedule media only carries titles and images; catalog titles are already stored in full,
+            # and bulk_cache_anime keeps the columns schedule media lacks for the others
+            partial_media = {}
+            for airing in schedules:
+                media = airing['media']
+                if media['id'] not in self.catalog.media:
+                    partial_media[media['id']] = media
+                    
+            if write_store:
+                await self.db.bulk_cache_anime(list(partial_media.values()))
+                await self.db.bulk_update_airing_schedule(
+                    [(airing['media']['id'], airing['episode'], airing['airingAt']) for airing in schedules]
+                )
+            self.catalog.set_airing(schedules, start_time, end_time)
+            print(f"Prefetched {len(schedules)} airing episodes")
+            
+        except Exception as e:
+            print(f"Error in prefetch_catalog task: {e}")
+            
     async def check_notification_sent(self, user_id, anime_id, episode):
         """Check if a notification was already sent to a user"""
         query = """
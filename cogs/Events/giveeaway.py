@@ -6,6 +6,7 @@ from typing import Optional, List
 from nextcord import Interaction, Embed, ButtonStyle, Member, TextChannel
 from nextcord.ext import commands, tasks
 from nextcord.ui import View, Button
+from utils import metrics
 
 def convert_time(duration: str) -> Optional[int]:
     """Convert a duration string to seconds (e.g., '5m' -> 300)"""
@@ -233,6 +234,7 @@ class GiveawayManager:
         self.load_active_giveaways.cancel()
         
     @tasks.loop(minutes=15)
+    @metrics.timed_loop("load_active_giveaways")
     async def load_active_giveaways(self):
         """Check active giveaways periodically to ensure they're still running"""
         
@@ -2,12 +2,23 @@ import nextcord
 from nextcord.ext import commands
 from nextcord import File, Embed, SlashOption, Interaction, ui, ButtonStyle
 from io import BytesIO
+from collections import deque
 import aiohttp
-from PIL import Image
+import asyncio
 import json
 import os
 import sqlite3
 import pathlib
+import time
+from utils import metrics
+from utils import rendering
+from utils.avatars import AvatarCache
+from utils.urlcheck import ImageURLValidator
+from utils import runtime
+
+GREETING_JOINS = metrics.counter("bot_greeting_joins_total", "Joins welcomed, one message each or batched", ("mode",))
+# Mentions listed in a batched welcome before it says "and N more"
+BATCH_MENTIONS = 40
 
 class GreetingModal(ui.Modal):
     def __init__(self, title, message_type, callback_func, default_text=""):
@@ -39,7 +50,7 @@ class GreetingModal(ui.Modal):
 class MemberEvents(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(trace_configs=[metrics.http_trace("discord_cdn")])
         
         # Ensure data directory exists
         data_dir = pathlib.Path("data")
@@ -48,10 +59,46 @@ class MemberEvents(commands.Cog):
         self.db_file = "data/greetings.db"
         self._setup_database()
         self._load_settings()
+        self.renderer = rendering.BannerRenderer()
+        self.avatars = AvatarCache(self.session)
+        self.image_urls = ImageURLValidator(self.session)
+        
+        # Past burst_threshold joins in burst_window seconds a guild's welcomes are batched,
+        # one combined message every burst_interval seconds until the joins slow down
+        self.burst_threshold = int(os.getenv("GREETING_BURST_THRESHOLD", "5"))
+        self.burst_window = float(os.getenv("GREETING_BURST_WINDOW", "10"))
+        self.burst_interval = float(os.getenv("GREETING_BURST_INTERVAL", "5"))
+        self.recent_joins = {}  # guild id: deque of join times
+        self.join_batches = {}  # guild id: members waiting for the next flush
+        self.flush_tasks = {}  # guild id: task flushing its batches
+
+    async def cog_setup(self):
+        """Run by the cog loader alongside every other cog's setup"""
+        # Check the saved custom images up front so the first joins don't go without them
+        for messages in self.greeting_messages.values():
+            for config in messages.values():
+                if config["image_url"] and config["image_url"].strip():
+                    self.image_urls.refresh(config["image_url"].strip())
+        await self.renderer.start()
 
     def cog_unload(self):
+        for task in self.flush_tasks.values():
+            task.cancel()
+        # Joins still waiting for a flush are welcomed now instead of dropped
+        pending = [members for members in self.join_batches.values() if members]
+        self.join_batches.clear()
+        if pending:
+            print(f"Sending {sum(len(members) for members in pending)} batched welcomes before unloading")
+        self.bot.loop.create_task(self._close(pending))
+
+    async def _close(self, pending):
+        """Send the leftover batches, then release the session and render pool they need"""
+        for members in pending:
+            GREETING_JOINS.inc(len(members), mode="batched")
+            await self.send_batch_welcome(members[0].guild, members)
         if self.session and not self.session.closed:
-            self.bot.loop.create_task(self.session.close())
+            await self.session.close()
+        self.renderer.shutdown()
 
     def _setup_database(self):
         conn = sqlite3.connect(self.db_file)
@@ -174,7 +221,7 @@ class MemberEvents(commands.Cog):
             return
         
         guild_id = interaction.guild.id
-        self._save_channel(guild_id, channel.id)
+        await runtime.run_in("io", self._save_channel, guild_id, channel.id)
         
         await interaction.response.send_message(
             f"Welcome and goodbye messages will now be sent to {channel.mention}!", 
@@ -248,20 +295,62 @@ class MemberEvents(commands.Cog):
 
     async def save_greeting_message(self, interaction, message_type, message, image_url):
         guild_id = interaction.guild.id
-        self._save_message(guild_id, message_type, message, image_url)
-        
-        await interaction.response.send_message(
-            f"Your {message_type} message has been saved! Use `/greetings test type:{message_type}` to test it.",
-            ephemeral=True
-        )
+        # The image check can take a few seconds, longer than an interaction may go unanswered
+        await interaction.response.defer(ephemeral=True)
+        await runtime.run_in("io", self._save_message, guild_id, message_type, message, image_url)
+        
+        reply = f"Your {message_type} message has been saved! Use `/greetings test type:{message_type}` to test it."
+        if image_url and image_url.strip():
+            valid, reason = await self.image_urls.check(image_url.strip())
+            if not valid:
+                reply += f"\n⚠️ The image URL didn't load ({reason}), so the generated banner is used until it does."
+        await interaction.followup.send(reply, ephemeral=True)
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
+        guild = member.guild
+        if str(guild.id) not in self.greeting_channels:
+            return
+        if self._in_burst(guild.id, joined=True) or guild.id in self.flush_tasks:
+            self.join_batches.setdefault(guild.id, []).append(member)
+            if guild.id not in self.flush_tasks:
+                print(f"Join burst in {guild.name}, batching welcomes every {self.burst_interval:g}s")
+                self.flush_tasks[guild.id] = asyncio.create_task(self._flush_joins(guild))
+            return
+        GREETING_JOINS.inc(mode="single")
         await self.send_welcome_message(member)
+
+    def _in_burst(self, guild_id, joined=False):
+        """Whether guild_id had more than burst_threshold joins in the last burst_window seconds"""
+        now = time.monotonic()
+        joins = self.recent_joins.setdefault(guild_id, deque())
+        if joined:
+            joins.append(now)
+        while joins and now - joins[0] > self.burst_window:
+            joins.popleft()
+        if not joins:
+            del self.recent_joins[guild_id]
+        return len(joins) > self.burst_threshold
+
+    async def _flush_joins(self, guild):
+        try:
+            while True:
+                await asyncio.sleep(self.burst_interval)
+                members = self.join_batches.pop(guild.id, [])
+                if members:
+                    GREETING_JOINS.inc(len(members), mode="batched")
+                    await self.send_batch_welcome(guild, members)
+                # Joins that arrived while that was sending wait for the next round
+                if not self.join_batches.get(guild.id) and not self._in_burst(guild.id):
+                    break
+        finally:
+            self.flush_tasks.pop(guild.id, None)
             
     @commands.Cog.listener()
-    async def on_member_remove(self, member):
-        await self.send_goodbye_message(member)
+    async def on_raw_member_remove(self, payload):
+        # on_member_remove only fires for cached members, which the lean cache profile mostly doesn't keep
+        if payload.guild is not None:
+            await self.send_goodbye_message(payload.user, payload.guild)
     
     async def send_welcome_message(self, member):
         guild = member.guild
@@ -297,21 +386,14 @@ class MemberEvents(commands.Cog):
             embed.set_footer(text=f"You are our {member_count}th member!")
             embed.set_thumbnail(url=member.display_avatar.url)
             
-            # Check if a custom image URL is provided and valid
-            valid_img = False
-            if image_url and image_url.strip():
-                try:
-                    # Validate image URL by attempting to fetch it
-                    async with self.session.head(image_url, timeout=5) as resp:
-                        if resp.status == 200:
-                            embed.set_image(url=image_url)
-                            valid_img = True
-                except:
-                    valid_img = False
+            # Use the custom image if its last check found it; that check never runs on this path
+            valid_img = bool(image_url and image_url.strip()) and self.image_urls.is_valid(image_url.strip())
+            if valid_img:
+                embed.set_image(url=image_url.strip())
             
-            if not valid_img:
-                # Fall back to generated image if custom URL is invalid
-                welcome_image = await self.create_welcome_image(member)
+            # Fall back to generated image if custom URL is invalid
+            welcome_image = None if valid_img else await self.create_welcome_image(member)
+            if welcome_image is not None:
                 embed.set_image(url="attachment://greeting_banner.png")
                 
                 await channel.send(
@@ -319,13 +401,54 @@ class MemberEvents(commands.Cog):
                     file=File(welcome_image, filename="greeting_banner.png")
                 )
             else:
+                # A custom image, or the render pool was full and the avatar thumbnail has to do
                 await channel.send(embed=embed)
             
         except Exception as e:
             print(f"Error sending welcome message: {e}")
     
-    async def send_goodbye_message(self, member):
-        guild = member.guild
+    async def send_batch_welcome(self, guild, members):
+        """One welcome for a batch of joins, listing their mentions over a row of their avatars"""
+        channel = guild.get_channel(int(self.greeting_channels.get(str(guild.id), 0)))
+        if channel is None:
+            return
+            
+        try:
+            msg_config = self._get_message(str(guild.id), "welcome")
+            image_url = msg_config["image_url"]
+            
+            mentions = ", ".join(member.mention for member in members[:BATCH_MENTIONS])
+            if len(members) > BATCH_MENTIONS:
+                mentions += f" and {len(members) - BATCH_MENTIONS} more"
+            message = msg_config["message"].replace("{user}", mentions).replace("{server}", guild.name)
+            
+            embed = Embed(
+                title=f"Welcome to {guild.name}",
+                description=message[:4096],
+                color=nextcord.Color.red()
+            )
+            embed.set_footer(text=f"{len(members)} new members · We now have {guild.member_count} members")
+            
+            valid_img = bool(image_url and image_url.strip()) and self.image_urls.is_valid(image_url.strip())
+            banner = None
+            if valid_img:
+                embed.set_image(url=image_url.strip())
+            elif not self.renderer.saturated():
+                # However big the batch, one render and at most GROUP_AVATARS avatar downloads
+                tiles = await asyncio.gather(*(self.avatars.get(member.display_avatar)
+                                               for member in members[:rendering.GROUP_AVATARS]))
+                banner = await self.renderer.render_group("welcome", list(tiles))
+            
+            if banner is not None:
+                embed.set_image(url="attachment://greeting_banner.png")
+                await channel.send(embed=embed, file=File(BytesIO(banner), filename="greeting_banner.png"))
+            else:
+                await channel.send(embed=embed)
+        except Exception as e:
+            print(f"Error sending batched welcome message: {e}")
+
+    async def send_goodbye_message(self, member, guild=None):
+        guild = guild or member.guild
         guild_id = str(guild.id)
         
         if guild_id not in self.greeting_channels:
@@ -356,21 +479,14 @@ class MemberEvents(commands.Cog):
             embed.set_footer(text=f"We now have {member_count} members")
             embed.set_thumbnail(url=member.display_avatar.url)
             
-            # Check if a custom image URL is provided and valid
-            valid_img = False
-            if image_url and image_url.strip():
-                try:
-                    # Validate image URL by attempting to fetch it
-                    async with self.session.head(image_url, timeout=5) as resp:
-                        if resp.status == 200:
-                            embed.set_image(url=image_url)
-                            valid_img = True
-                except:
-                    valid_img = False
+            # Use the custom image if its last check found it; that check never runs on this path
+            valid_img = bool(image_url and image_url.strip()) and self.image_urls.is_valid(image_url.strip())
+            if valid_img:
+                embed.set_image(url=image_url.strip())
             
-            if not valid_img:
-                # Fall back to generated image if custom URL is invalid
-                goodbye_image = await self.create_goodbye_image(member)
+            # Fall back to generated image if custom URL is invalid
+            goodbye_image = None if valid_img else await self.create_goodbye_image(member)
+            if goodbye_image is not None:
                 embed.set_image(url="attachment://greeting_banner.png")
                 
                 await channel.send(
@@ -378,140 +494,32 @@ class MemberEvents(commands.Cog):
                     file=File(goodbye_image, filename="greeting_banner.png")
                 )
             else:
+                # A custom image, or the render pool was full and the avatar thumbnail has to do
                 await channel.send(embed=embed)
             
         except Exception as e:
             print(f"Error sending goodbye message: {e}")
 
     async def create_welcome_image(self, member):
-        try:
-            background_image_path = "assets/welcome_banner.jpg"
-            if not os.path.exists(background_image_path):
-                return await self.create_default_greeting_image(member, "welcome")
-                
-            return await self.create_greeting_image(member, background_image_path)
-        except Exception as e:
-            print(f"Error creating welcome image: {e}")
-            return await self.create_default_greeting_image(member, "welcome")
+        return await self.create_banner(member, "welcome")
 
     async def create_goodbye_image(self, member):
-        try:
-            background_image_path = "assets/goodbye_banner.jpg"
-            if not os.path.exists(background_image_path):
-                return await self.create_default_greeting_image(member, "goodbye")
-                
-            return await self.create_greeting_image(member, background_image_path)
-        except Exception as e:
-            print(f"Error creating goodbye image: {e}")
-            return await self.create_default_greeting_image(member, "goodbye")
-
-    async def create_greeting_image(self, member, background_path):
-        try:
-            img = Image.open(background_path)
-            img = img.resize((600, 200))  
-
-            # Get user's profile pic
-            avatar_url = member.display_avatar.url
-            avatar = await self.get_avatar_image(avatar_url)
-
-            # Make the avatar circular
-            mask = Image.new("L", avatar.size, 0)
-            from PIL import ImageDraw
-            draw = ImageDraw.Draw(mask)
-            draw.ellipse((0, 0, avatar.size[0], avatar.size[1]), fill=255)
-            avatar.putalpha(mask)
-
-            # Position the avatar in the center
-            bg_width, bg_height = img.size
-            avatar_width, avatar_height = avatar.size
-            avatar_position = ((bg_width - avatar_width) // 2, (bg_height - avatar_height) // 2)
-
-            # Put the avatar on top
-            transparent = Image.new("RGBA", img.size, (0, 0, 0, 0))
-            transparent.paste(avatar, avatar_position, avatar)
-            
-            # Make sure background supports transparency
-            if img.mode != "RGBA":
-                img = img.convert("RGBA")
-                
-            # Merge the images
-            final_img = Image.alpha_composite(img, transparent)
-            byte_io = BytesIO()
-            final_img.save(byte_io, "PNG")
-            byte_io.seek(0)
-            
-            return byte_io
-        except Exception as e:
-            print(f"Error in create_greeting_image: {e}")
-            return await self.create_default_greeting_image(member, "greeting")
-
-    async def create_default_greeting_image(self, member, message_type):
-        try:
-            if message_type == "welcome":
-                bg_color = (67, 181, 129)  # Discord green
-            else:
-                bg_color = (240, 71, 71)  # Discord red
-            
-            background = Image.new("RGBA", (600, 200), bg_color)
-            
-            # Get user's profile pic
-            avatar_url = member.display_avatar.url
-            avatar = await self.get_avatar_image(avatar_url)
+        return await self.create_banner(member, "goodbye")
 
-            # Make the avatar circular
-            mask = Image.new("L", avatar.size, 0)
-            from PIL import ImageDraw
-            draw = ImageDraw.Draw(mask)
-            draw.ellipse((0, 0, avatar.size[0], avatar.size[1]), fill=255)
-            avatar.putalpha(mask)
+    async def create_banner(self, member, template_id):
+        """
+        Render a greeting banner for member in the render pool
 
-            # Position the avatar in the center
-            bg_width, bg_height = background.size
-            avatar_width, avatar_height = avatar.size
-            avatar_position = ((bg_width - avatar_width) // 2, (bg_height - avatar_height) // 2)
-
-            # Put the avatar on the background
-            background.paste(avatar, avatar_position, avatar)
-            
-            # Save the image
-            byte_io = BytesIO()
-            background.save(byte_io, "PNG")
-            byte_io.seek(0)
-            
-            return byte_io
-        except Exception as e:
-            print(f"Error in default greeting image: {e}")
-            # Last-ditch fallback - just a gray box
-            fallback = Image.new("RGB", (600, 200), (47, 49, 54))  # Discord dark theme color
-            byte_io = BytesIO()
-            fallback.save(byte_io, "PNG")
-            byte_io.seek(0)
-            return byte_io
-
-    async def get_avatar_image(self, url):
-        try:
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    avatar_data = await response.read()
-                    avatar_img = Image.open(BytesIO(avatar_data))
-                    
-                    # Make it a good size
-                    avatar_size = 100
-                    avatar_img = avatar_img.resize((avatar_size, avatar_size))
-                    
-                    # Make sure it supports transparency
-                    if avatar_img.mode != "RGBA":
-                        avatar_img = avatar_img.convert("RGBA")
-                        
-                    return avatar_img
-                else:
-                    default = Image.new("RGBA", (100, 100), (128, 128, 128, 255))
-                    return default
-        except Exception as e:
-            print(f"Error getting avatar image: {e}")
-            # Use a placeholder if anything goes wrong
-            default = Image.new("RGBA", (100, 100), (128, 128, 128, 255))
-            return default
+        Returns:
+            BytesIO|None: The PNG, or None when the pool is saturated or the render failed
+        """
+        if self.renderer.saturated():
+            # Don't download an avatar for a banner that would be shed anyway
+            rendering.RENDERS.inc(template=template_id, result="shed")
+            return None
+        avatar_tile = await self.avatars.get(member.display_avatar)
+        png = await self.renderer.render(template_id, avatar_tile)
+        return BytesIO(png) if png is not None else None
 
 def setup(bot):
     bot.add_cog(MemberEvents(bot))
\ No newline at end of file
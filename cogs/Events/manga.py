@@ -2,14 +2,17 @@ import nextcord
 from nextcord.ext import commands
 from nextcord import SlashOption, Interaction
 import aiohttp
+import os
 from typing import List, Dict, Any, Optional
+from utils import jsoncodec
+from utils import metrics
 
 
 class MangaDex(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.base_url = "https://api.mangadex.org"
+        self.base_url = os.getenv("MANGADEX_API_URL", "https://api.mangadex.org")
     
     @nextcord.slash_command(
         name="manga",
@@ -56,7 +59,7 @@ class MangaDex(commands.Cog):
     
     async def search_manga(self, title: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Search for manga by title"""
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[metrics.http_trace("mangadex")]) as session:
             params = {
                 "title": title,
                 "limit": limit,
@@ -67,12 +70,12 @@ class MangaDex(commands.Cog):
                 if response.status != 200:
                     return []
                 
-                data = await response.json()
+                data = await response.json(loads=jsoncodec.loads)
                 return data.get("data", [])
     
     async def get_manga_details(self, manga_id: str) -> Dict[str, Any]:
         
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[metrics.http_trace("mangadex")]) as session:
             
             params = {
                 "includes[]": ["cover_art", "author", "artist"] 
@@ -82,7 +85,7 @@ class MangaDex(commands.Cog):
                 if response.status != 200:
                     return {}
                 
-                return await response.json()
+                return await response.json(loads=jsoncodec.loads)
     
     async def get_cover_filename(self, manga_id: str, relationships: List[Dict[str, Any]]) -> Optional[str]:
         """Extract the cover filename from relationships"""
@@ -4,11 +4,15 @@ from nextcord import Interaction, SlashOption, ChannelType
 import aiohttp
 import asyncio
 import sqlite3
+import os
 import xml.etree.ElementTree as ET
+from utils import metrics
+from utils import sharding
 
 class XCom(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.nitter_url = os.getenv("NITTER_URL", "https://nitter.net")
         self.conn = sqlite3.connect("xcom.db")
         self.cursor = self.conn.cursor()
         self.cursor.execute("""
@@ -46,8 +50,8 @@ class XCom(commands.Cog):
         await interaction.response.send_message(f"✅ Now tracking @{user} tweets in {channel.mention}", ephemeral=True)
 
     async def fetch_latest_tweet_link(self, username: str):
-        url = f"https://nitter.net/{username}/rss"
-        async with aiohttp.ClientSession() as session:
+        url = f"{self.nitter_url}/{username}/rss"
+        async with aiohttp.ClientSession(trace_configs=[metrics.http_trace("nitter")]) as session:
             try:
                 async with session.get(url, timeout=10) as resp:
                     if resp.status != 200:
@@ -68,15 +72,22 @@ class XCom(commands.Cog):
         return None
 
     @tasks.loop(minutes=2)
+    @metrics.timed_loop("check_tweets")
     async def check_tweets(self):
+        # One process polls for the whole bot
+        if not sharding.is_elected(self.bot):
+            return
         self.cursor.execute("SELECT * FROM xcom")
         rows = self.cursor.fetchall()
         for guild_id, username, channel_id, last_link in rows:
             new_link = await self.fetch_latest_tweet_link(username)
             if new_link and new_link != last_link:
-                channel = self.bot.get_channel(channel_id)
-                if channel:
+                # The guild may live on another process's shard, and sending only needs the ID
+                channel = self.bot.get_partial_messageable(channel_id)
+                try:
                     await channel.send(f"📢 New tweet from **@{username}**:\n{new_link}")
+                except nextcord.HTTPException as e:
+                    print(f"Failed to post tweet to channel {channel_id}: {e}")
                 self.cursor.execute("UPDATE xcom SET last_tweet_link = ? WHERE guild_id = ?", (new_link, guild_id))
                 self.conn.commit()
 
@@ -4,6 +4,8 @@ import asyncio
 import random
 import aiohttp
 from typing import List, Dict, Any
+from utils import jsoncodec
+from utils import metrics
 
 class VoiceActorSelect(nextcord.ui.Select):
     def __init__(self, correct_id, options, callback):
@@ -38,7 +40,7 @@ class VoiceActorGuess(commands.Cog):
     async def get_session(self):
         """Get or create aiohttp session"""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            self.session = aiohttp.ClientSession(json_serialize=jsoncodec.dumps, trace_configs=[metrics.http_trace("anilist")])
         return self.session
     
     @commands.Cog.listener()
@@ -68,12 +70,12 @@ class VoiceActorGuess(commands.Cog):
             anime_data = None
             
             async with session.post(
-                'https://graphql.anilist.co',
+                self.anilist.base_url,
                 json={"query": anime_query},
                 headers={'Content-Type': 'application/json', 'Accept': 'application/json'}
             ) as response:
                 if response.status == 200:
-                    anime_data = await response.json()
+                    anime_data = await response.json(loads=jsoncodec.loads)
             
             if not anime_data or 'data' not in anime_data or 'Page' not in anime_data['data']:
                 print("Failed to get anime data")
@@ -123,12 +125,12 @@ class VoiceActorGuess(commands.Cog):
             
             character_data = None
             async with session.post(
-                'https://graphql.anilist.co',
+                self.anilist.base_url,
                 json={"query": character_query, "variables": {"mediaId": anime['id']}},
                 headers={'Content-Type': 'application/json', 'Accept': 'application/json'}
             ) as response:
                 if response.status == 200:
-                    character_data = await response.json()
+                    character_data = await response.json(loads=jsoncodec.loads)
                 else:
                     error_text = await response.text()
                     print(f"Error getting characters: {response.status}")
@@ -201,12 +203,12 @@ class VoiceActorGuess(commands.Cog):
             staff_data = None
             
             async with session.post(
-                'https://graphql.anilist.co',
+                self.anilist.base_url,
                 json={"query": staff_query},
                 headers={'Content-Type': 'application/json', 'Accept': 'application/json'}
             ) as response:
                 if response.status == 200:
-                    staff_data = await response.json()
+                    staff_data = await response.json(loads=jsoncodec.loads)
                 else:
                     error_text = await response.text()
                     print(f"Error getting staff: {response.status}")
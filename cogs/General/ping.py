@@ -1,6 +1,11 @@
 import nextcord
 from nextcord.ext import commands
 import time
+from utils import metrics
+from utils import runtime
+from utils import sharding
+from utils.anilist import ANILIST_BREAKER, RATE_LIMIT, RATE_REMAINING
+from utils.loopmonitor import describe
 
 
 class Ping(commands.Cog):
@@ -12,10 +17,91 @@ class Ping(commands.Cog):
     async def ping(self, ctx):
         latency = round(self.bot.latency * 1000)
         uptime = time.time() - self.start_time 
+        description = f"Latency: {latency}ms\nUptime: {round(uptime, 2)}s"
+
+        monitor = getattr(self.bot, "loop_monitor", None)
+        if monitor is not None:
+            lag = monitor.snapshot()
+            description += f"\nLoop lag: p50 {lag['p50_ms']:.1f}ms, p99 {lag['p99_ms']:.1f}ms, max {lag['max_ms']:.0f}ms"
+            block = lag["last_block"]
+            if block is not None:
+                ago = round(time.time() - block["at"])
+                description += f"\nLast block: {block['lag_ms']:.0f}ms in {describe(block)}, {ago}s ago"
+
         embed = nextcord.Embed(title="🏓 Pong!", 
-                               description=f"Latency: {latency}ms\nUptime: {round(uptime, 2)}s",
+                               description=description,
                                 color=nextcord.Color.red())
         await ctx.send(embed=embed)
 
+    @nextcord.slash_command(name="diag", description="Show the bot's internal performance snapshot",
+                            default_member_permissions=nextcord.Permissions(administrator=True))
+    async def diag(self, interaction: nextcord.Interaction):
+        # Pool and memory gauges are only refreshed on collection
+        metrics.REGISTRY.collect()
+        embed = nextcord.Embed(title="🩺 Diagnostics", color=nextcord.Color.red())
+
+        monitor = getattr(self.bot, "loop_monitor", None)
+        if monitor is not None:
+            lag = monitor.snapshot()
+            value = f"p50 {lag['p50_ms']:.1f}ms · p99 {lag['p99_ms']:.1f}ms · max {lag['max_ms']:.0f}ms\nBlocks: {lag['blocks']}"
+            if lag["last_block"] is not None:
+                value += f" (last: {describe(lag['last_block'])})"
+            embed.add_field(name="Event loop", value=value, inline=False)
+
+        members = sum(len(guild.members) for guild in self.bot.guilds)
+        rss = metrics.resident_memory()
+        embed.add_field(
+            name="Process",
+            value=(f"Gateway: {round(self.bot.latency * 1000)}ms\n"
+                   f"RSS: {f'{rss / 2**20:.0f} MiB' if rss is not None else 'n/a'}\n"
+                   f"Guilds: {len(self.bot.guilds)} · Cached members: {members} · Users: {len(self.bot.users)}"),
+            inline=False
+        )
+
+        if sharding.is_sharded(self.bot):
+            lines = []
+            for shard_id in sharding.local_shards(self.bot):
+                shard = str(shard_id)
+                reconnects = max(0, sharding.SHARD_CONNECTIONS.get(shard=shard, event="connect") - 1)
+                lines.append(f"#{shard_id}: {sharding.SHARD_LATENCY.get(shard=shard) * 1000:.0f}ms · "
+                             f"{sharding.SHARD_GUILDS.get(shard=shard)} guilds · "
+                             f"{sharding.SHARD_EVENTS.get(shard=shard)} events · {reconnects} reconnects")
+            embed.add_field(name=f"Shards ({sharding.shard_count(self.bot)} total)", value="\n".join(lines)[:1024], inline=False)
+
+        pools = []
+        for labels, size in metrics.DB_POOL_SIZE.items():
+            pool = labels["pool"]
+            acquire = metrics.DB_ACQUIRE.labels(pool=pool)
+            pools.append(f"{pool}: {metrics.DB_POOL_IN_USE.get(pool=pool)}/{size} in use · "
+                         f"wait p99 {acquire.quantile(0.99) * 1000:.1f}ms · errors {metrics.DB_ERRORS.get(pool=pool, stage='connect')}")
+        embed.add_field(name="Database pools", value="\n".join(pools) or "No pools connected", inline=False)
+
+        executors = []
+        for name in runtime.EXECUTOR_THREADS:
+            wait = runtime.EXECUTOR_WAIT.labels(executor=name)
+            executors.append(f"{name}: {runtime.EXECUTOR_PENDING.get(executor=name)} pending / {runtime.executor_threads(name)} threads · "
+                             f"wait p99 {wait.quantile(0.99) * 1000:.1f}ms")
+        embed.add_field(name=f"Executors ({runtime.loop_name} loop)", value="\n".join(executors), inline=False)
+
+        anilist = f"Circuit: {ANILIST_BREAKER.state}"
+        if RATE_LIMIT.get():
+            anilist += f" · Budget: {RATE_REMAINING.get()}/{RATE_LIMIT.get()} per minute"
+        for cache in ("catalog", "airing_window", "recommend_pool"):
+            ratio = metrics.cache_hit_ratio(cache)
+            if ratio is not None:
+                anilist += f"\n{cache} hit rate: {ratio:.0%}"
+        embed.add_field(name="AniList", value=anilist, inline=False)
+
+        loops = []
+        for labels, duration in sorted(metrics.LOOP_LAST_DURATION.items(), key=lambda item: item[0]["loop"]):
+            ago = round(time.time() - metrics.LOOP_LAST_RUN.get(**labels))
+            loops.append(f"{labels['loop']}: {duration * 1000:.0f}ms, {ago}s ago")
+        embed.add_field(name="Background tasks", value="\n".join(loops) or "No runs yet", inline=False)
+
+        pending = metrics.REGISTRY.metrics.get("bot_notifications_pending")
+        embed.add_field(name="Pending notifications", value=str(pending.get() if pending else 0), inline=False)
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 def setup(bot):  
     bot.add_cog(Ping(bot))
\ No newline at end of file
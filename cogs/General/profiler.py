@@ -0,0 +1,61 @@
+import nextcord
+from nextcord.ext import commands, application_checks
+from nextcord import Interaction, SlashOption
+import os
+import traceback
+from utils.profiler import profile_running, run_profile
+
+
+class Profiler(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @nextcord.slash_command(name="profile", description="Sample the bot's threads and send back a flamegraph-ready profile",
+                            default_member_permissions=nextcord.Permissions(administrator=True))
+    @application_checks.is_owner()
+    async def profile(
+        self,
+        interaction: Interaction,
+        seconds: int = SlashOption(description="How long to sample", min_value=1, max_value=300, default=30),
+        memory: bool = SlashOption(description="Also diff tracemalloc snapshots (slows allocations while running)", default=False)
+    ):
+        if profile_running():
+            await interaction.response.send_message("A profile is already running.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        result = await run_profile(seconds, trace_memory=memory)
+
+        hot = "\n".join(f"`{count:>5}` {thread}: {frame}" for (thread, frame), count in result["top"]) or "No samples"
+        embed = nextcord.Embed(
+            title="📊 Profile",
+            description=f"{result['samples']} samples over {result['seconds']:.1f}s\n\n**Hottest frames**\n{hot}"[:4096],
+            color=nextcord.Color.red()
+        )
+        embed.set_footer(text=f"Saved to {result['collapsed']}")
+
+        # Discord caps attachments; the files stay on disk either way
+        paths = [path for path in (result["collapsed"], result["memory"]) if path and os.path.getsize(path) < 8 * 1024 * 1024]
+        await interaction.followup.send(embed=embed, files=[nextcord.File(path) for path in paths], ephemeral=True)
+
+    @profile.error
+    async def profile_error(self, interaction: Interaction, error):
+        if isinstance(error, application_checks.ApplicationNotOwner):
+            await interaction.response.send_message("Only the bot owner can profile the bot.", ephemeral=True)
+            return
+
+        # This handler replaces the default one, which would have logged it
+        print(f"Error in /profile: {error}")
+        print("".join(traceback.format_exception(type(error), error, error.__traceback__)))
+        message = f"Profiling failed: {getattr(error, 'original', error)}"
+        try:
+            # Past the defer, the owner is left on "thinking…" until this answers
+            if interaction.response.is_done():
+                await interaction.followup.send(message, ephemeral=True)
+            else:
+                await interaction.response.send_message(message, ephemeral=True)
+        except nextcord.HTTPException as e:
+            print(f"Could not report the /profile error: {e}")
+
+def setup(bot):
+    bot.add_cog(Profiler(bot))
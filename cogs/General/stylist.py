@@ -2,10 +2,16 @@ import nextcord
 from nextcord.ext import commands, tasks
 from nextcord.ui import View, Button, Modal, TextInput, Select, button
 from nextcord import Interaction, SlashOption, Permissions, Role, Member, Guild
-import aiomysql
 import re
 import asyncio
+import time
 from typing import List, Optional, Dict, Any
+from utils import membercache
+from utils import metrics
+from utils.lazy import LazyModule
+
+aiomysql = LazyModule("aiomysql")
+
 # I'm literally wayy too fuckin lazy to actually set this up right, so I just hard coded it in
 DB_HOST = "x"
 DB_PORT = 123
@@ -71,7 +77,25 @@ class StylistCog(commands.Cog, name="Stylist"):
         self.bot = bot
         self.db_pool = None
         self._db_pool_ready = asyncio.Event()
-        self.bot.loop.create_task(self._initialize_db_pool())
+
+    async def cog_setup(self):
+        """Run by the cog loader alongside every other cog's setup"""
+        await self._initialize_db_pool()
+        self.bot.loop.create_task(self._cache_role_owners())
+
+    async def _cache_role_owners(self):
+        """on_member_update only fires for cached members, so make sure everyone with a stylist role is"""
+        await self.bot.wait_until_ready()
+        if not self.db_pool:
+            return
+        rows = await self._execute_query("SELECT user_id, guild_id FROM stylist_user_custom_roles", fetch_all=True) or []
+        owners = {}
+        for row in rows:
+            owners.setdefault(row['guild_id'], []).append(row['user_id'])
+        for guild_id, user_ids in owners.items():
+            guild = self.bot.get_guild(guild_id)
+            if guild:
+                await membercache.find_members(guild, user_ids)
 
     async def _initialize_db_pool(self):
         try:
@@ -81,11 +105,14 @@ class StylistCog(commands.Cog, name="Stylist"):
                 db=DB_NAME, loop=self.bot.loop,
                 autocommit=True
             )
-            self._db_pool_ready.set()
+            metrics.track_pool("stylist", self.db_pool)
             print("StylistCog: Database connection pool created successfully.")
         except Exception as e:
             print(f"StylistCog: Error creating database connection pool: {e}")
             self.db_pool = None 
+        finally:
+            # Waiters check db_pool themselves, so release them on failure too
+            self._db_pool_ready.set()
 
     async def cog_before_invoke(self, ctx: commands.Context):
         await self._db_pool_ready.wait()
@@ -108,7 +135,9 @@ class StylistCog(commands.Cog, name="Stylist"):
         if not self.db_pool:
             raise ConnectionError("Database pool is not initialized.")
         
+        started = time.perf_counter()
         async with self.db_pool.acquire() as conn:
+            metrics.DB_ACQUIRE.observe(time.perf_counter() - started, pool="stylist")
             async with conn.cursor(aiomysql.DictCursor if fetch_one or fetch_all else aiomysql.Cursor) as cur:
                 await cur.execute(query, args)
                 if last_row_id:
@@ -238,8 +267,8 @@ class StylistCog(commands.Cog, name="Stylist"):
         if not interaction.guild or not interaction.user: 
             return False
         
-        member = interaction.guild.get_member(interaction.user.id) 
-        if not member: 
+        member = interaction.user
+        if not isinstance(member, Member): 
             return False 
 
         if interaction.guild.owner_id == member.id:
@@ -380,9 +409,9 @@ class StylistCog(commands.Cog, name="Stylist"):
 
             await self.create_user_custom_role(interaction.user.id, interaction.guild.id, discord_role.id, role_name, hex_color)
             
-            member = interaction.guild.get_member(interaction.user.id)
-            if member:
-                await member.add_roles(discord_role, reason="Stylist role created and assigned.")
+            await interaction.user.add_roles(discord_role, reason="Stylist role created and assigned.")
+            # Keep the new owner cached so on_member_update sees them lose permission
+            await membercache.find_members(interaction.guild, [interaction.user.id])
             
             await interaction.followup.send(f"Successfully created and equipped your custom role: {discord_role.mention}!", ephemeral=True)
 
@@ -442,8 +471,7 @@ class StylistCog(commands.Cog, name="Stylist"):
             description=f"Role: {discord_role.mention}\nName: `{role_name}`\nColor: `{hex_color}`",
             color=discord_role.color
         )
-        member = interaction.guild.get_member(interaction.user.id)
-        is_wearing = discord_role in member.roles if member else False
+        is_wearing = discord_role in interaction.user.roles
 
         view = StylistEditView(self, interaction, discord_role, role_name, hex_color, is_wearing)
         await interaction.followup.send(embed=embed, view=view, ephemeral=True)
@@ -739,7 +767,8 @@ class StylistEditView(View):
                 await self.original_command_interaction.edit_original_message(content="An error occurred while recoloring.", embed=None, view=None)
 
     async def toggle_wear_button(self, interaction: Interaction): # interaction here is for the button click
-        member = interaction.guild.get_member(self.user_id)
+        members = await membercache.find_members(interaction.guild, [self.user_id])
+        member = members[0] if members else None
         if not member:
             await interaction.response.send_message("Could not find you as a member in this server.", ephemeral=True)
             return
@@ -7,6 +7,7 @@ import time
 import os
 from datetime import datetime, timedelta
 import traceback
+from utils import metrics
 
 # Custom UI Elements
 class ChannelNameModal(nextcord.ui.Modal):
@@ -49,12 +50,12 @@ class UserLimitModal(nextcord.ui.Modal):
             await interaction.response.send_message("Please enter a valid number.", ephemeral=True)
 
 class VoiceChannelSetupView(nextcord.ui.View):
-    def __init__(self, cog, user_id):
+    def __init__(self, cog, user_id, user_name=None):
         super().__init__(timeout=300)  # 5 minute timeout
         self.cog = cog
         self.user_id = user_id
         self.config = {
-            "name": f"{self.cog.get_user_name(user_id)}'s Channel",
+            "name": f"{user_name or self.cog.get_user_name(user_id)}'s Channel",
             "user_limit": 0,
             "private": False,
             "require_mic": False
@@ -392,10 +393,11 @@ class VoiceChannelEditView(nextcord.ui.View):
         )
 
 class AdminSettingsView(nextcord.ui.View):
-    def __init__(self, cog, user_id):
+    def __init__(self, cog, user_id, guild_id=None):
         super().__init__(timeout=300)  # 5 minute timeout
         self.cog = cog
         self.user_id = user_id
+        self.guild_id = guild_id
         self.message = None
         
         # Default settings
@@ -412,14 +414,15 @@ class AdminSettingsView(nextcord.ui.View):
     async def load_settings(self):
         """Load current settings from the database"""
         try:
-            guild_id = None
+            guild_id = self.guild_id
             
-            # Find the user in a guild to get guild_id
-            for guild in self.cog.bot.guilds:
-                member = guild.get_member(self.user_id)
-                if member:
-                    guild_id = guild.id
-                    break
+            # Find the user in a guild to get guild_id, for callers that didn't say
+            if guild_id is None:
+                for guild in self.cog.bot.guilds:
+                    member = guild.get_member(self.user_id)
+                    if member:
+                        guild_id = guild.id
+                        break
             
             if not guild_id:
                 return
@@ -819,6 +822,7 @@ class VoiceChannelsCog(commands.Cog):
             del self.empty_channels[channel_id]
     
     @tasks.loop(seconds=5)
+    @metrics.timed_loop("check_empty_channels")
     async def check_empty_channels(self):
         """Check for and delete empty voice channels"""
         now = time.time()
@@ -942,7 +946,7 @@ class VoiceChannelsCog(commands.Cog):
             return
         
         # Create and send the setup view
-        view = VoiceChannelSetupView(self, interaction.user.id)
+        view = VoiceChannelSetupView(self, interaction.user.id, interaction.user.display_name)
         embed = view.create_setup_embed()
         
         # Send the setup message
@@ -988,7 +992,7 @@ class VoiceChannelsCog(commands.Cog):
             return
         
         # Create and send the admin view
-        view = AdminSettingsView(self, interaction.user.id)
+        view = AdminSettingsView(self, interaction.user.id, interaction.guild.id)
         
         # Wait a moment for settings to load
         await asyncio.sleep(0.5)
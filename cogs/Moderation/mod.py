@@ -5,8 +5,11 @@ import asyncio
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 import os
-import mysql.connector
-from mysql.connector import pooling
+from utils import metrics
+from utils import runtime
+from utils.lazy import LazyModule
+
+pooling = LazyModule("mysql.connector.pooling")
 
 """
 Ultra-simplified moderation cog with just lock and unlock commands
@@ -26,13 +29,15 @@ class ModCog(commands.Cog):
             'raise_on_warnings': True
         }
         
-        
-        self.connect_db()
+        # Opened by cog_setup on a worker thread instead of blocking the loop here
+        self.pool = None
         
         
         self.unlock_tasks = {}
-        
-        
+    
+    async def cog_setup(self):
+        """Run by the cog loader alongside every other cog's setup"""
+        await runtime.run_in("db", self.connect_db)
         self.bot.loop.create_task(self.create_tables())
     
     def connect_db(self):
@@ -43,6 +48,7 @@ class ModCog(commands.Cog):
                 pool_size=5,
                 **self.db_config
             )
+            metrics.track_pool("mod", self.pool)
             print(f"✅ Connected to MySQL pool for mod functionality")
         except Exception as e:
             print(f"❌ Database connection pool error: {e}")
@@ -58,8 +64,10 @@ class ModCog(commands.Cog):
                 return None
         
         try:
-            return self.pool.get_connection()
+            with metrics.DB_ACQUIRE.time(pool="mod"):
+                return self.pool.get_connection()
         except Exception as e:
+            metrics.DB_ERRORS.inc(pool="mod", stage="connect")
             print(f"Error getting database connection: {e}")
             return None
     
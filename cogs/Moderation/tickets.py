@@ -4,9 +4,12 @@ from nextcord import slash_command, Interaction, SlashOption, Embed, ButtonStyle
 import asyncio
 import os
 from datetime import datetime
-import mysql.connector
-from mysql.connector import pooling
 from dotenv import load_dotenv
+from utils import metrics
+from utils import runtime
+from utils.lazy import LazyModule
+
+mysql_connector = LazyModule("mysql.connector")
 
 # Load environment variables
 load_dotenv()
@@ -23,14 +26,17 @@ class DatabaseManager:
             'database': os.getenv('TICKET_DB_NAME', 'anime_tickets'),
             'raise_on_warnings': True
         }
-        
-        # Create connection pool
+        self.pool = None
+    
+    def connect(self):
+        """Create the connection pool; blocking, so the cog runs it on a worker thread"""
         try:
-            self.pool = mysql.connector.pooling.MySQLConnectionPool(
+            self.pool = mysql_connector.pooling.MySQLConnectionPool(
                 pool_name="anime_ticket_pool",
                 pool_size=10,
                 **self.db_config
             )
+            metrics.track_pool("tickets", self.pool)
             print(f"✅ Connected to MySQL pool for {self.db_config['database']}")
         except Exception as e:
             print(f"❌ Ticket database connection pool error: {e}")
@@ -39,11 +45,13 @@ class DatabaseManager:
     def get_connection(self):
         """Get a connection from the pool"""
         try:
-            if self.pool:
-                return self.pool.get_connection()
-            else:
-                return mysql.connector.connect(**self.db_config)
+            with metrics.DB_ACQUIRE.time(pool="tickets"):
+                if self.pool:
+                    return self.pool.get_connection()
+                else:
+                    return mysql_connector.connect(**self.db_config)
         except Exception as e:
+            metrics.DB_ERRORS.inc(pool="tickets", stage="connect")
             print(f"Database connection error: {e}")
             return None
     
@@ -194,6 +202,10 @@ class TicketCog(commands.Cog):
         self.db = DatabaseManager(bot)
         self.bot.loop.create_task(self.setup_cog())
 
+    async def cog_setup(self):
+        """Run by the cog loader alongside every other cog's setup"""
+        await runtime.run_in("db", self.db.connect)
+
     async def setup_cog(self):
         await self.bot.wait_until_ready()
         print("Starting Ticket Cog setup...")
@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from dotenv import load_dotenv
+
+"""
+
+    Runs the bot as a cluster of processes, each owning a contiguous range
+    of shards, so rendering and JSON decoding spread over several cores.
+
+    python launcher.py --workers 4                 # Discord's recommended shard count
+    python launcher.py --workers 4 --shards 16
+
+    Every worker is main.py with SHARD_COUNT, SHARD_IDS and CLUSTER_ID set
+    and its own METRICS_PORT (base port + cluster id). Workers elect a
+    leader through a lock (MySQL GET_LOCK on the DB_* database, or flock on
+    LEADER_LOCK_FILE) that runs the once-per-bot jobs. A worker that exits
+    is restarted with backoff; SIGINT or SIGTERM stops them all.
+
+"""
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Discord allows one IDENTIFY per 5 seconds per bot unless it grants more concurrency
+IDENTIFY_INTERVAL = 5.0
+
+
+def recommended_shards(token):
+    request = urllib.request.Request(
+        os.getenv("DISCORD_API_URL", "https://discord.com/api/v10") + "/gateway/bot",
+        headers={"Authorization": f"Bot {token}", "User-Agent": "DiscordBot (launcher, 1.0)"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())["shards"]
+
+
+def shard_ranges(shard_count, workers):
+    """Split shard ids 0..shard_count-1 into contiguous ranges, one per worker, sizes differing by at most one"""
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    ranges = []
+    start = 0
+    for worker in range(workers):
+        end = start + size + (worker < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class Worker:
+
+    def __init__(self, cluster_id, shard_ids, shard_count, metrics_port):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.metrics_port = metrics_port
+        self.process = None
+        self.restarts = 0
+        self.started_at = 0.0
+
+    def environment(self):
+        env = dict(os.environ)
+        env.update({
+            "SHARD_COUNT": str(self.shard_count),
+            "SHARD_IDS": ",".join(map(str, self.shard_ids)),
+            "CLUSTER_ID": str(self.cluster_id),
+            "METRICS_PORT": str(self.metrics_port + self.cluster_id if self.metrics_port else 0),
+        })
+        return env
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.process = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "main.py")], cwd=BASE_DIR, env=self.environment())
+        print(f"🚀 Cluster {self.cluster_id} (shards {self.shard_ids[0]}-{self.shard_ids[-1]}) started as pid {self.process.pid}")
+
+    def backoff(self):
+        # A worker that ran for a while before dying starts over from a short delay
+        if time.monotonic() - self.started_at > 300:
+            self.restarts = 0
+        self.restarts += 1
+        return min(60, 2 ** self.restarts)
+
+
+def stop_all(workers, timeout=30):
+    for worker in workers:
+        if worker.process is not None and worker.process.poll() is None:
+            worker.process.terminate()
+    deadline = time.monotonic() + timeout
+    for worker in workers:
+        if worker.process is None:
+            continue
+        try:
+            worker.process.wait(max(0.1, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            worker.process.kill()
+
+
+def run(workers):
+    stopping = False
+
+    def on_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    for index, worker in enumerate(workers):
+        if stopping:
+            break
+        worker.start()
+        # Stagger so the clusters' IDENTIFYs don't share the same 5 second window
+        if index < len(workers) - 1:
+            deadline = time.monotonic() + len(worker.shard_ids) * IDENTIFY_INTERVAL
+            while not stopping and time.monotonic() < deadline:
+                time.sleep(0.5)
+
+    restart_at = {}
+    while not stopping:
+        time.sleep(1)
+        for worker in workers:
+            if worker.cluster_id in restart_at:
+                if time.monotonic() >= restart_at[worker.cluster_id]:
+                    del restart_at[worker.cluster_id]
+                    worker.start()
+                continue
+            code = worker.process.poll()
+            if code is not None:
+                delay = worker.backoff()
+                print(f"Cluster {worker.cluster_id} exited with {code}, restarting in {delay}s")
+                restart_at[worker.cluster_id] = time.monotonic() + delay
+
+    print("Stopping clusters...")
+    stop_all(workers)
+
+
+def main():
+    load_dotenv(os.path.join(BASE_DIR, "tkn.env"))
+    parser = argparse.ArgumentParser(description="Run the bot as several processes, each owning a range of shards")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("CLUSTER_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--shards", default=os.getenv("SHARD_COUNT", "auto"), help="Total shard count, or auto for Discord's recommendation")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("METRICS_PORT", "9108")), help="First worker's port, 0 disables metrics")
+    options = parser.parse_args()
+
+    shard_count = recommended_shards(os.getenv("BOT_TOKEN")) if options.shards == "auto" else int(options.shards)
+    ranges = shard_ranges(shard_count, options.workers)
+    print(f"Running {shard_count} shards in {len(ranges)} clusters")
+    run([Worker(cluster_id, shard_ids, shard_count, options.metrics_port) for cluster_id, shard_ids in enumerate(ranges)])
+
+
+if __name__ == "__main__":
+    main()
@@ -4,25 +4,72 @@ from nextcord.ext import commands, tasks
 import os
 import sys
 from dotenv import load_dotenv
+import time
 import traceback
+from utils.loopmonitor import LoopMonitor
+from utils import metrics
+from utils import profiler
+from utils.cogloader import CogLoader
+from utils.commandsync import CommandSyncManager
+from utils import sharding
+from utils import membercache
+from utils.leader import leader_lock_from_env
+from utils import runtime
 
+STARTED_AT = time.perf_counter()
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 COGS_DIR = os.path.join(BASE_DIR, "cogs")
-#Logging and checks ts
-load_dotenv(os.path.join(BASE_DIR, "tkn.env"))
-token = os.getenv("BOT_TOKEN")
-print(f"Token loaded: {'SUCCESS' if token else 'FAILED'}")
-print(f"Working directory: {os.getcwd()}")
-print(f"Base directory: {BASE_DIR}")
-print(f"Cogs directory: {COGS_DIR}")
-print(f"Cogs directory exists: {os.path.exists(COGS_DIR)}")
-
-intents = nextcord.Intents.default()
-intents.members = True
-intents.message_content = True
-intents.voice_states = True  
-intents.presences = True  
-bot = commands.Bot(command_prefix="$", intents=intents)
+
+def build_bot():
+    """
+    Install the loop and construct the configured bot
+
+    Only runs with main.py as the script: render pool workers (utils/rendering.py)
+    import this module too, and must not build a bot of their own.
+    """
+    # nextcord creates its loop when the bot is constructed, so uvloop has to be installed first
+    runtime.install_event_loop()
+    print(f"Runtime: {runtime.describe()}")
+
+    # CACHE_PROFILE=lean (default) drops presences and caches only voice members; full caches everyone
+    cache = membercache.cache_profile()
+    print(f"Cache profile: {os.getenv('CACHE_PROFILE', membercache.DEFAULT_PROFILE)}")
+    # SHARD_COUNT=auto or a number (plus optional SHARD_IDS=0,1) switches to AutoShardedBot
+    shards = sharding.shard_config()
+    if shards is None:
+        bot = commands.Bot(command_prefix="$", **cache)
+    else:
+        bot = commands.AutoShardedBot(command_prefix="$", **cache, **shards)
+        print(f"Sharding: count={shards['shard_count'] or 'auto'}, ids={shards.get('shard_ids') or 'all'}")
+    sharding.instrument_shards(bot)
+    membercache.instrument_bot(bot)
+    # launcher.py sets CLUSTER_ID; the processes of a cluster elect one to run the once-per-bot jobs
+    if os.getenv("CLUSTER_ID") is not None:
+        bot.leader = leader_lock_from_env("anime_bot_leader")
+        print(f"Cluster {os.getenv('CLUSTER_ID')}")
+    # Lag above this many ms counts as a blocked loop and logs the offending stack
+    bot.loop_monitor = LoopMonitor(threshold=int(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "250")) / 1000)
+    metrics.instrument_bot(bot)
+    # Hash of the last synced command tree per scope; delete the file to force a full resync
+    bot.command_sync = CommandSyncManager(
+        bot,
+        os.getenv("COMMAND_SYNC_STATE", os.path.join(BASE_DIR, "command_sync.json")),
+        global_threshold=int(os.getenv("COMMAND_SYNC_GLOBAL_THRESHOLD", "25")),
+    )
+    return bot
+
+cogs_loaded = asyncio.Event()
+
+GATEWAY_LATENCY = metrics.gauge("bot_gateway_latency_seconds", "Websocket heartbeat latency")
+GUILDS = metrics.gauge("bot_guilds", "Guilds the bot is in")
+CACHED_MEMBERS = metrics.gauge("bot_cached_members", "Members held in the member cache")
+TIME_TO_READY = metrics.gauge("bot_time_to_ready_seconds", "Seconds from process start to the first on_ready")
+
+def collect_bot_metrics():
+    if bot.is_ready():
+        GATEWAY_LATENCY.set(bot.latency)
+    GUILDS.set(len(bot.guilds))
+    CACHED_MEMBERS.set(sum(len(guild.members) for guild in bot.guilds))
 
 async def set_rich_presence():
     activity = nextcord.Activity(
@@ -30,79 +77,61 @@ async def set_rich_presence():
         name="/anime",)
     await bot.change_presence(status=nextcord.Status.dnd, activity=activity)
 
-@bot.event
 async def on_ready():
     print(f"Logged in as {bot.user} (ID: {bot.user.id})")
+    if not TIME_TO_READY.get():
+        TIME_TO_READY.set(time.perf_counter() - STARTED_AT)
+        print(f"⏱️ Ready {TIME_TO_READY.get():.2f}s after start")
     await set_rich_presence()
-    
-    # Sync commands with Discord on startup
-    print("Syncing application commands...")
-    for guild in bot.guilds:
-        try:
-            synced = await bot.sync_application_commands(guild_id=guild.id)
-            print(f"Synced {len(synced)} commands to {guild.name}")
-        except Exception as e:
-            print(f"Failed to sync commands to {guild.name}: {e}")
-
-@bot.event
+
+async def on_connect():
+    """Replaces nextcord's sync on every connect with one that only syncs what changed"""
+    bot.add_all_application_commands()
+    # Commands of cogs that are still loading would look deleted
+    await cogs_loaded.wait()
+    await bot.command_sync.sync()
+
+async def on_guild_available(guild):
+    await bot.command_sync.sync_guild(guild.id)
+
 async def on_command_error(ctx, error):
     print(f"An error occurred: {error}")
     print(traceback.format_exc())
     await ctx.send(f"An error occurred: {error}")
 
-@bot.event
 async def on_guild_join(guild):
-    """Sync commands when joining a new guild"""
-    try:
-        synced = await bot.sync_application_commands(guild_id=guild.id)
-        print(f"Synced {len(synced)} commands to new guild: {guild.name}")
-    except Exception as e:
-        print(f"Failed to sync commands to {guild.name}: {e}")
+    """Sync commands when joining a new guild, if it has any of its own"""
+    await bot.command_sync.sync_guild(guild.id)
 
 async def load_cogs():
-
-    if not os.path.exists(COGS_DIR):
-        try:
-            os.makedirs(COGS_DIR)
-            print(f"Created cogs directory at: {COGS_DIR}")
-        except Exception as e:
-            print(f"Failed to create cogs directory: {e}")
-            return
-    
-    # Load cogs directly in the cogs folder
-    for filename in os.listdir(COGS_DIR):
-        if filename.endswith(".py"):
-            try:
-                bot.load_extension(f"cogs.{filename[:-3]}")
-                print(f"✅: {filename}")
-            except Exception as e:
-                print(f"Failed to load cog {filename}: {e}")
-                print(traceback.format_exc())
-    
-    # Load cogs from subfolders
-    for foldername in os.listdir(COGS_DIR):
-        folder_path = os.path.join(COGS_DIR, foldername)
-        if os.path.isdir(folder_path):
-            # Make sure there's an __init__.py file
-            init_file = os.path.join(folder_path, "__init__.py")
-            if not os.path.exists(init_file):
-                try:
-                    with open(init_file, 'w') as f:
-                        pass 
-                    print(f"Created __init__.py in {foldername}")
-                except Exception as e:
-                    print(f"Failed to create __init__.py in {foldername}: {e}")
-            
-            for filename in os.listdir(folder_path):
-                if filename.endswith(".py") and filename != "__init__.py":
-                    try:
-                        bot.load_extension(f"cogs.{foldername}.{filename[:-3]}")
-                        print(f"✅: {foldername}/{filename}")
-                    except Exception as e:
-                        print(f"Failed to load cog {foldername}/{filename}: {e}")
-                        print(traceback.format_exc())
+    # cogs/manifest.json decides what loads and in which order
+    loader = CogLoader(bot, os.path.join(COGS_DIR, "manifest.json"), COGS_DIR)
+    await loader.load()
+    cogs_loaded.set()
 
 if __name__ == "__main__":
+    #Logging and checks ts
+    load_dotenv(os.path.join(BASE_DIR, "tkn.env"))
+    token = os.getenv("BOT_TOKEN")
+    print(f"Token loaded: {'SUCCESS' if token else 'FAILED'}")
+    print(f"Working directory: {os.getcwd()}")
+    print(f"Base directory: {BASE_DIR}")
+    print(f"Cogs directory: {COGS_DIR}")
+    print(f"Cogs directory exists: {os.path.exists(COGS_DIR)}")
+
+    bot = build_bot()
+    for handler in (on_ready, on_connect, on_guild_available, on_command_error, on_guild_join):
+        bot.event(handler)
+    metrics.add_collector(collect_bot_metrics)
+    bot.loop_monitor.start(bot.loop)
+    if getattr(bot, "leader", None) is not None:
+        bot.leader.start(bot.loop)
+    # Prometheus scrapes http://METRICS_HOST:METRICS_PORT/metrics; METRICS_PORT=0 turns it off
+    metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+    if metrics_port:
+        bot.loop.create_task(metrics.start_exporter(os.getenv("METRICS_HOST", "127.0.0.1"), metrics_port))
+    # kill -USR1 <pid> writes a profile to profiles/ without touching Discord
+    profiler.install_signal_handler(bot.loop, seconds=int(os.getenv("PROFILE_SECONDS", "30")))
     bot.loop.create_task(load_cogs())
     if BASE_DIR not in sys.path:
         sys.path.insert(0, BASE_DIR)
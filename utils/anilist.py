@@ -3,6 +3,10 @@ import random
 import json
 from datetime import datetime
 import asyncio
+import os
+from utils import jsoncodec
+from utils import metrics
+from utils.circuit import CircuitBreaker
 
 """
     
@@ -10,16 +14,83 @@ import asyncio
     So some of this code is irrelevent now, but I'm too lazy to remove.
     
 """
+
+# Media field selections, smallest first. Pick the cheapest one that covers what
+# you render: "list" for menus and pools, "card" for one embed, "detail" when
+# related seasons are needed too.
+MEDIA_FIELDS = {}
+MEDIA_FIELDS["list"] = """
+    id
+    title {
+        romaji
+        english
+    }
+    season
+    seasonYear
+    episodes
+    genres
+    coverImage {
+        large
+    }
+    siteUrl
+"""
+MEDIA_FIELDS["card"] = MEDIA_FIELDS["list"] + """
+    description
+    format
+    status
+    nextAiringEpisode {
+        episode
+        airingAt
+    }
+    studios(isMain: true) {
+        nodes {
+            name
+        }
+    }
+"""
+MEDIA_FIELDS["detail"] = MEDIA_FIELDS["card"] + """
+    relations {
+        edges {
+            relationType
+            node {
+                id
+                title {
+                    romaji
+                }
+                format
+                type
+                status
+                seasonYear
+                season
+            }
+        }
+    }
+"""
+
+# Shared by every AniListAPI instance so one outage is only discovered once
+ANILIST_BREAKER = CircuitBreaker("AniList")
+
+# Budget AniList reported on its last response
+RATE_LIMIT = metrics.gauge("bot_anilist_ratelimit_limit", "Requests per minute AniList currently allows")
+RATE_REMAINING = metrics.gauge("bot_anilist_ratelimit_remaining", "Requests left in AniList's current minute")
+
+
 class AniListAPI:
     
-    def __init__(self):
-        self.base_url = "https://graphql.anilist.co"
+    def __init__(self, base_url=None, breaker=ANILIST_BREAKER, timeout=10, max_retries=2, max_retry_wait=10):
+        # ANILIST_API_URL points every client at a stub server for offline benchmarks
+        self.base_url = base_url or os.getenv("ANILIST_API_URL", "https://graphql.anilist.co")
         self.session = None
+        self.breaker = breaker
+        # Worst case a call takes (max_retries + 1) * timeout plus backoff, never unbounded
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
         
     async def get_session(self):
         
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            self.session = aiohttp.ClientSession(json_serialize=jsoncodec.dumps, trace_configs=[metrics.http_trace("anilist")])
         return self.session
         
     async def _make_request(self, query, variables=None):
@@ -27,25 +98,53 @@ class AniListAPI:
         if variables is None:
             variables = {}
             
+        if not self.breaker.allow_request():
+            return {"errors": [{"message": "AniList is unavailable right now, please try again later"}]}
+            
         session = await self.get_session()
+        error = "Max retries exceeded"
         
-        try:
-            async with session.post(
-                self.base_url,
-                json={"query": query, "variables": variables},
-                headers={"Content-Type": "application/json", "Accept": "application/json"}
-            ) as response:
-                if response.status == 429:  
-                    
-                    retry_after = int(response.headers.get('Retry-After', 60))
-                    print(f"Rate limited by AniList API, retrying after {retry_after} seconds")
-                    await asyncio.sleep(retry_after)
-                    return await self._make_request(query, variables)
-                    
-                return await response.json()
-        except Exception as e:
-            print(f"Error querying AniList API: {e}")
-            return {"errors": [{"message": str(e)}]}
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with session.post(
+                    self.base_url,
+                    json={"query": query, "variables": variables},
+                    headers={"Content-Type": "application/json", "Accept": "application/json"},
+                    timeout=self.timeout
+                ) as response:
+                    if 'X-RateLimit-Remaining' in response.headers:
+                        RATE_LIMIT.set(int(response.headers.get('X-RateLimit-Limit', 0)))
+                        RATE_REMAINING.set(int(response.headers['X-RateLimit-Remaining']))
+                        
+                    if response.status == 429:  
+                        
+                        retry_after = int(response.headers.get('Retry-After', 60))
+                        if retry_after > self.max_retry_wait or attempt == self.max_retries:
+                            # Waiting would outlive the interaction, so fail fast until the limit resets
+                            print(f"Rate limited by AniList API for {retry_after} seconds, failing fast")
+                            self.breaker.trip(retry_after)
+                            return {"errors": [{"message": "Rate limited by AniList, please try again later"}]}
+                            
+                        print(f"Rate limited by AniList API, retrying after {retry_after} seconds")
+                        await asyncio.sleep(retry_after)
+                        continue
+                        
+                    if response.status >= 500:
+                        error = f"API responded with status {response.status}"
+                        print(f"AniList API error: {error}")
+                    else:
+                        data = await response.json(loads=jsoncodec.loads)
+                        self.breaker.record_success()
+                        return data
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                print(f"Error querying AniList API: {error}")
+                
+            if attempt < self.max_retries:
+                await asyncio.sleep(2 ** attempt)
+                
+        self.breaker.record_failure()
+        return {"errors": [{"message": error}]}
     
     async def get_random_anime_character(self, start_year=2000):
         """Get a random anime character from anime released after the specified year"""
@@ -165,59 +264,19 @@ class AniListAPI:
         else:  
             return "common", 50
             
-    async def search_anime(self, query):
-        """Search for anime by title"""
+    async def search_anime(self, query, profile="detail", per_page=10):
+        """Search for anime by title, returning the fields of the given MEDIA_FIELDS profile"""
         search_query = """
-        query ($search: String) {
-            Page(page: 1, perPage: 10) {
+        query ($search: String, $perPage: Int) {
+            Page(page: 1, perPage: $perPage) {
                 media(search: $search, type: ANIME, sort: POPULARITY_DESC) {
-                    id
-                    title {
-                        romaji
-                        english
-                    }
-                    description
-                    coverImage {
-                        large
-                    }
-                    format
-                    episodes
-                    status
-                    seasonYear
-                    season
-                    nextAiringEpisode {
-                        episode
-                        airingAt
-                    }
-                    studios(isMain: true) {
-                        nodes {
-                            name
-                        }
-                    }
-                    genres
-                    siteUrl
-                    relations {
-                        edges {
-                            relationType
-                            node {
-                                id
-                                title {
-                                    romaji
-                                }
-                                format
-                                type
-                                status
-                                seasonYear
-                                season
-                            }
-                        }
-                    }
+        """ + MEDIA_FIELDS[profile] + """
                 }
             }
         }
         """
         
-        result = await self._make_request(search_query, {'search': query})
+        result = await self._make_request(search_query, {'search': query, 'perPage': per_page})
         
         if 'errors' in result:
             return None
@@ -332,7 +391,104 @@ class AniListAPI:
             return None
             
         return result['data']['Media']
+
+    async def get_media(self, anime_id, profile="detail"):
+        """Get one anime with the fields of the given MEDIA_FIELDS profile"""
+        media_query = """
+        query ($id: Int) {
+            Media(id: $id, type: ANIME) {
+        """ + MEDIA_FIELDS[profile] + """
+            }
+        }
+        """
         
+        result = await self._make_request(media_query, {'id': anime_id})
+        
+        if 'errors' in result:
+            return None
+            
+        return result['data']['Media']
+
+    async def get_season_catalog(self, season, year, per_page=50, max_pages=20):
+        """Get every anime of a season, walking all pages of the result"""
+        # Served straight to /anime search, so relations are needed; tags feed /anilist similar
+        season_query = """
+        query ($page: Int, $perPage: Int, $season: MediaSeason, $seasonYear: Int) {
+            Page(page: $page, perPage: $perPage) {
+                pageInfo {
+                    hasNextPage
+                }
+                media(season: $season, seasonYear: $seasonYear, type: ANIME, sort: POPULARITY_DESC) {
+        """ + MEDIA_FIELDS["detail"] + """
+                    tags {
+                        name
+                        rank
+                    }
+                }
+            }
+        }
+        """
+
+        catalog = []
+        for page in range(1, max_pages + 1):
+            variables = {'page': page, 'perPage': per_page, 'season': season, 'seasonYear': year}
+            result = await self._make_request(season_query, variables)
+
+            if 'errors' in result:
+                return catalog if catalog else None
+
+            page_data = result['data']['Page']
+            catalog.extend(page_data['media'])
+
+            if not page_data['pageInfo']['hasNextPage']:
+                break
+
+        return catalog
+
+    async def get_airing_window(self, start_time, end_time, per_page=50, max_pages=20):
+        """Get every airing schedule between the given timestamps, walking all pages"""
+        airing_query = """
+        query ($page: Int, $perPage: Int, $start: Int, $end: Int) {
+            Page(page: $page, perPage: $perPage) {
+                pageInfo {
+                    hasNextPage
+                }
+                airingSchedules(airingAt_greater: $start, airingAt_lesser: $end, sort: TIME) {
+                    id
+                    airingAt
+                    episode
+                    media {
+                        id
+                        title {
+                            romaji
+                            english
+                        }
+                        coverImage {
+                            large
+                        }
+                        siteUrl
+                    }
+                }
+            }
+        }
+        """
+
+        schedules = []
+        for page in range(1, max_pages + 1):
+            variables = {'page': page, 'perPage': per_page, 'start': start_time, 'end': end_time}
+            result = await self._make_request(airing_query, variables)
+
+            if 'errors' in result:
+                return None
+
+            page_data = result['data']['Page']
+            schedules.extend(page_data['airingSchedules'])
+
+            if not page_data['pageInfo']['hasNextPage']:
+                break
+
+        return schedules
+
     async def cleanup(self):
         
         if self.session and not self.session.closed:
@@ -0,0 +1,90 @@
+import asyncio
+import os
+from collections import OrderedDict
+from utils import metrics
+from utils import rendering
+from utils import runtime
+
+"""
+
+    Avatar tiles for greeting banners.
+
+    Avatars are downloaded as the CDN's 128px static PNG instead of the
+    full resolution original, decoded and scaled once to the banner's RGBA
+    tile on the image executor, and kept in an LRU keyed by avatar hash, so
+    a rejoin or a /greetings test reuses the tile. A new avatar has a new
+    hash and simply misses. Concurrent requests for the same hash share one
+    download.
+
+"""
+
+# Smallest CDN size (a power of two) that still covers rendering.AVATAR_SIZE
+FETCH_SIZE = 128
+
+
+class AvatarCache:
+
+    def __init__(self, session, max_entries=None):
+        """
+        Args:
+            session (aiohttp.ClientSession): Session the CDN requests go through
+            max_entries (int): Tiles kept, AVATAR_CACHE_SIZE or 256 by default (about 40 KiB each)
+        """
+        self.session = session
+        self.max_entries = max_entries or int(os.getenv("AVATAR_CACHE_SIZE", "256"))
+        self.tiles = OrderedDict()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self.tiles)
+
+    @staticmethod
+    def fetch_url(asset):
+        # png, not with_static_format, which would keep an animated avatar as a GIF
+        return asset.with_format("png").with_size(FETCH_SIZE).url
+
+    async def _fetch(self, url):
+        try:
+            async with self.session.get(url) as response:
+                if response.status != 200:
+                    print(f"Avatar download failed with HTTP {response.status}")
+                    return None
+                data = await response.read()
+        except Exception as e:
+            print(f"Error getting avatar image: {e}")
+            return None
+        return await runtime.run_in("image", rendering.decode_avatar, data)
+
+    async def _load(self, key, url):
+        tile = await self._fetch(url)
+        # Failures aren't cached, the next greeting tries again
+        if tile is not None:
+            self.tiles[key] = tile
+            while len(self.tiles) > self.max_entries:
+                self.tiles.popitem(last=False)
+        return tile
+
+    async def get(self, asset):
+        """
+        The RGBA tile for an avatar asset
+
+        Args:
+            asset (nextcord.Asset): Usually member.display_avatar
+
+        Returns:
+            bytes|None: rendering.AVATAR_SIZE square RGBA pixels, None when it couldn't be fetched
+        """
+        key = asset.key
+        tile = self.tiles.get(key)
+        metrics.record_cache("avatars", tile is not None)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, self.fetch_url(asset)))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # Shielded so one waiter being cancelled doesn't cancel the download for the others
+        return await asyncio.shield(task)
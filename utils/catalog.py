@@ -0,0 +1,129 @@
+import bisect
+import re
+import time
+from datetime import datetime
+from utils import jsoncodec
+from utils import metrics
+
+"""
+
+    In-memory index of the seasonal anime catalog.
+    Filled by AnimeCog's prefetch task so in-season lookups never hit AniList.
+
+"""
+
+SEASONS = ["WINTER", "SPRING", "SUMMER", "FALL"]
+
+
+def get_season(date=None):
+    """Return the (season, year) AniList files the given date under"""
+    date = date or datetime.now()
+    return SEASONS[(date.month - 1) // 3], date.year
+
+
+def get_next_season(season, year):
+    """Return the (season, year) that follows the given one"""
+    index = SEASONS.index(season)
+    if index == len(SEASONS) - 1:
+        return SEASONS[0], year + 1
+    return SEASONS[index + 1], year
+
+
+def normalize_title(title):
+    """Lowercase a title and strip everything but letters and digits"""
+    if not title:
+        return ""
+    return re.sub(r"[\W_]+", "", title.casefold())
+
+
+def media_from_cache_row(row):
+    """Shape an anime_cache row like an AniList card so embeds can render it while AniList is down"""
+    genres = row.get('genres')
+    if isinstance(genres, (str, bytes, bytearray)):
+        genres = jsoncodec.loads(genres)
+
+    return {
+        'id': row['anime_id'],
+        'title': {'romaji': row['title_romaji'], 'english': row.get('title_english')},
+        'description': row.get('description'),
+        'coverImage': {'large': row.get('cover_image_url')},
+        'format': row.get('format'),
+        'episodes': row.get('episodes'),
+        'status': row.get('status'),
+        'season': row.get('season'),
+        'seasonYear': row.get('season_year'),
+        'genres': genres or [],
+        'siteUrl': row.get('site_url') or f"https://anilist.co/anime/{row['anime_id']}",
+        'nextAiringEpisode': None,
+        'studios': {'nodes': []},
+        'relations': {'edges': []},
+    }
+
+
+def airing_from_cache_row(row):
+    """Shape an airing_schedule/anime_cache join row like an AniList airingSchedule"""
+    return {
+        'airingAt': row['airing_at'],
+        'episode': row['episode'],
+        'media': {
+            'id': row['anime_id'],
+            'title': {'romaji': row['title_romaji'], 'english': row.get('title_english')},
+            'coverImage': {'large': row.get('cover_image_url')},
+            'siteUrl': row.get('site_url'),
+        },
+    }
+
+
+class AnimeCatalog:
+
+    def __init__(self):
+        self.media = {}
+        self.titles = {}
+        self.airing = []
+        self.airing_times = []
+        self.airing_start = None
+        self.airing_end = None
+        self.last_refresh = None
+
+    def __len__(self):
+        return len(self.media)
+
+    def add_media(self, media_list):
+        """Index full media objects by id and normalized titles"""
+        for media in media_list:
+            self.media[media['id']] = media
+            for title in (media['title'].get('romaji'), media['title'].get('english')):
+                key = normalize_title(title)
+                if key:
+                    self.titles[key] = media['id']
+        self.last_refresh = time.time()
+
+    def set_airing(self, schedules, start_time, end_time):
+        """Replace the airing window with the given AniList airingSchedules"""
+        self.airing = sorted(schedules, key=lambda s: s['airingAt'])
+        self.airing_times = [s['airingAt'] for s in self.airing]
+        self.airing_start = start_time
+        self.airing_end = end_time
+
+    def get(self, anime_id):
+        return self.media.get(anime_id)
+
+    def search(self, query):
+        """Return the media whose romaji or English title matches the query exactly"""
+        anime_id = self.titles.get(normalize_title(query))
+        metrics.record_cache("catalog", anime_id is not None)
+        if anime_id is None:
+            return []
+        return [self.media[anime_id]]
+
+    def covers_airing(self, start_time, end_time):
+        """Whether the cached airing window fully contains the given range"""
+        covered = self.airing_start is not None and self.airing_start <= start_time and end_time <= self.airing_end
+        metrics.record_cache("airing_window", covered)
+        return covered
+
+    def get_airing(self, start_time, end_time):
+        """Return the cached airing schedules between two timestamps"""
+        lo = bisect.bisect_left(self.airing_times, start_time)
+        hi = bisect.bisect_right(self.airing_times, end_time)
+        return self.airing[lo:hi]
@@ -0,0 +1,73 @@
+import time
+
+"""
+
+    Circuit breaker for upstream APIs.
+    After enough consecutive failures calls fail fast instead of waiting on
+    retries, then a single probe request decides whether to close again.
+
+"""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        """
+        Args:
+            name (str): Shown in log lines
+            failure_threshold (int): Consecutive failures before the circuit opens
+            reset_timeout (int): Seconds to stay open before letting a probe through
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.open_for = reset_timeout
+        self.probe_started_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.open_for:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow_request(self):
+        """Whether a call may go upstream right now"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+
+        # Half open: one probe at a time, but don't wait forever on a probe that never reported back
+        now = time.monotonic()
+        if self.probe_started_at is None or now - self.probe_started_at > self.reset_timeout:
+            self.probe_started_at = now
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            print(f"{self.name} circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.trip(self.reset_timeout)
+
+    def trip(self, seconds):
+        """Open the circuit for the given number of seconds, e.g. an upstream Retry-After"""
+        if self.opened_at is None:
+            print(f"{self.name} circuit opened for {seconds}s after {self.failures} failures")
+        self.opened_at = time.monotonic()
+        self.open_for = seconds
+        self.probe_started_at = None
@@ -0,0 +1,110 @@
+import asyncio
+import importlib
+import os
+import time
+import traceback
+from utils import jsoncodec
+from utils import metrics
+
+"""
+
+    Manifest-driven extension loader.
+    cogs/manifest.json lists the extensions to load, in order. Each one is
+    timed in three phases: import (first execution of the module and its
+    dependencies), setup (nextcord's load_extension) and, for cogs that
+    define it, the async cog_setup() hook. The cog_setup hooks of every cog
+    run concurrently once all extensions are loaded, so slow one-off work
+    like opening a DB pool overlaps instead of queueing.
+
+"""
+
+COG_STARTUP = metrics.gauge("bot_cog_startup_seconds", "Time each extension took to start, by phase", ("extension", "phase"))
+PHASES = ("import", "setup", "cog_setup")
+
+
+def read_manifest(path):
+    with open(path, "rb") as f:
+        return list(jsoncodec.loads(f.read())["extensions"])
+
+
+def discover(cogs_dir, package="cogs"):
+    """Every extension module under cogs_dir, for trees without a manifest"""
+    names = []
+    for root, dirs, files in os.walk(cogs_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("__"))
+        relative = os.path.relpath(root, cogs_dir)
+        prefix = package if relative == "." else f"{package}.{relative.replace(os.sep, '.')}"
+        names.extend(f"{prefix}.{filename[:-3]}" for filename in sorted(files)
+                     if filename.endswith(".py") and filename != "__init__.py")
+    return names
+
+
+class CogLoader:
+
+    def __init__(self, bot, manifest_path, cogs_dir):
+        self.bot = bot
+        self.manifest_path = manifest_path
+        self.cogs_dir = cogs_dir
+        self.attempted = []
+        self.timings = {}
+        self.errors = {}
+
+    def extensions(self):
+        if os.path.exists(self.manifest_path):
+            return read_manifest(self.manifest_path)
+        print(f"No cog manifest at {self.manifest_path}, loading everything in {self.cogs_dir}")
+        return discover(self.cogs_dir)
+
+    def record(self, name, phase, seconds):
+        self.timings.setdefault(name, dict.fromkeys(PHASES, 0.0))[phase] = seconds
+        COG_STARTUP.set(seconds, extension=name, phase=phase)
+
+    def load_one(self, name):
+        """Import and set up one extension; returns the cogs it added"""
+        self.attempted.append(name)
+        before = set(self.bot.cogs)
+        try:
+            started = time.perf_counter()
+            importlib.import_module(name)
+            self.record(name, "import", time.perf_counter() - started)
+
+            # Dependencies are cached now, so this is nextcord's own load plus setup()
+            started = time.perf_counter()
+            self.bot.load_extension(name)
+            self.record(name, "setup", time.perf_counter() - started)
+        except Exception as e:
+            self.errors[name] = e
+            print(f"Failed to load cog {name}: {e}")
+            print(traceback.format_exc())
+            return []
+
+        print(f"✅: {name}")
+        return [(name, self.bot.cogs[cog_name]) for cog_name in set(self.bot.cogs) - before]
+
+    async def cog_setup(self, name, cog):
+        started = time.perf_counter()
+        try:
+            await cog.cog_setup()
+        except Exception as e:
+            self.errors[name] = e
+            print(f"cog_setup of {cog.qualified_name} failed: {e}")
+            print(traceback.format_exc())
+        self.record(name, "cog_setup", time.perf_counter() - started)
+
+    async def load(self):
+        started = time.perf_counter()
+        loaded = []
+        for name in self.extensions():
+            loaded.extend(self.load_one(name))
+            # Let the gateway and other tasks breathe between extensions
+            await asyncio.sleep(0)
+
+        await asyncio.gather(*(self.cog_setup(name, cog) for name, cog in loaded if hasattr(cog, "cog_setup")))
+        self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        loaded = [name for name in self.attempted if name not in self.errors]
+        print(f"⏱️ Loaded {len(loaded)}/{len(self.attempted)} extensions in {elapsed * 1000:.0f}ms")
+        print(f"   {'extension':<32} {'import':>8} {'setup':>8} {'cog_setup':>10}")
+        for name, phases in sorted(self.timings.items(), key=lambda item: -sum(item[1].values())):
+            print(f"   {name:<32} {phases['import'] * 1000:>6.1f}ms {phases['setup'] * 1000:>6.1f}ms {phases['cog_setup'] * 1000:>8.1f}ms")
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import traceback
+from nextcord import Forbidden, NotFound
+from utils import jsoncodec
+from utils import metrics
+
+"""
+
+    Diff-based application command sync.
+    Every scope (global, or one guild) gets a hash of the payloads nextcord
+    would upsert for it, and the hash that was last synced is kept on disk.
+    On connect only scopes whose hash changed talk to Discord; unchanged ones
+    just fetch once per process so nextcord can associate command IDs, and
+    gateway reconnects cost nothing. Delete the state file to force a full
+    resync, e.g. after editing commands from the developer portal.
+
+"""
+
+COMMAND_SYNCS = metrics.counter("bot_command_syncs_total", "Application command sync decisions by scope and action", ("scope", "action"))
+SYNC_DURATION = metrics.gauge("bot_command_sync_seconds", "Duration of the last application command sync pass")
+
+
+def command_key(command):
+    if command.type.value == 1:
+        return f"/{command.name}"
+    return f"{command.name} ({command.type.name})"
+
+
+def payload_hash(payload):
+    # Sorted keys so dict ordering never looks like a change
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def diff(old, new):
+    """Added, removed and changed command keys between two {key: hash} maps"""
+    added = sorted(set(new) - set(old))
+    removed = sorted(set(old) - set(new))
+    changed = sorted(key for key in set(old) & set(new) if old[key] != new[key])
+    return added, removed, changed
+
+
+class CommandSyncManager:
+
+    def __init__(self, bot, state_path, global_threshold=25, concurrency=4):
+        """
+        Args:
+            bot: The bot whose application commands are synced
+            state_path (str): JSON file holding the last synced hashes
+            global_threshold (int): Guild-only commands rolled out to at least this many guilds are registered globally instead
+            concurrency (int): Guild syncs allowed in flight at once
+        """
+        self.bot = bot
+        self.state_path = state_path
+        self.global_threshold = global_threshold
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.state = self.load_state()
+        # Scopes whose commands are associated with their Discord IDs in this process
+        self.associated = set()
+        self.lock = asyncio.Lock()
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {"application_id": None, "scopes": {}}
+        try:
+            with open(self.state_path, "rb") as f:
+                return jsoncodec.loads(f.read())
+        except Exception as e:
+            print(f"Ignoring unreadable command sync state {self.state_path}: {e}")
+            return {"application_id": None, "scopes": {}}
+
+    def save_state(self):
+        temporary = self.state_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(jsoncodec.dumps(self.state))
+        os.replace(temporary, self.state_path)
+
+    def promote_widespread(self):
+        """Register guild-only commands rolled out to many guilds once, globally, instead of once per guild"""
+        for command in list(self.bot.get_all_application_commands()):
+            rollout = command.guild_ids_to_rollout
+            if command.force_global or len(rollout) < self.global_threshold:
+                continue
+            print(f"Registering /{command.name} globally instead of in {len(rollout)} guilds")
+            self.bot._connection.remove_application_command(command)
+            rollout.clear()
+            command.force_global = True
+            self.bot.add_application_command(command, use_rollout=True)
+
+    def local_scopes(self):
+        """{scope: {command key: payload hash}} for every scope that has commands"""
+        scopes = {"global": {}}
+        for command in self.bot.get_all_application_commands():
+            if command.is_global:
+                scopes["global"][command_key(command)] = payload_hash(command.get_payload(None))
+            for guild_id in command.guild_ids_to_rollout:
+                scopes.setdefault(str(guild_id), {})[command_key(command)] = payload_hash(command.get_payload(guild_id))
+        return scopes
+
+    async def sync_scope(self, scope, commands, report):
+        guild_id = None if scope == "global" else int(scope)
+        stored = self.state["scopes"].get(scope)
+        tree_hash = payload_hash(commands)
+
+        if stored is not None and stored["hash"] == tree_hash:
+            if scope in self.associated or not commands:
+                COMMAND_SYNCS.inc(scope="global" if guild_id is None else "guild", action="skipped")
+                return
+            # Unchanged, but this process still needs the command IDs; a read and no writes
+            async with self.semaphore:
+                await self.bot.sync_application_commands(guild_id=guild_id, associate_known=True, delete_unknown=False,
+                                                         update_known=False, register_new=False)
+            self.associated.add(scope)
+            COMMAND_SYNCS.inc(scope="global" if guild_id is None else "guild", action="associated")
+            return
+
+        async with self.semaphore:
+            await self.bot.sync_application_commands(guild_id=guild_id)
+        self.associated.add(scope)
+        COMMAND_SYNCS.inc(scope="global" if guild_id is None else "guild", action="synced")
+
+        added, removed, changed = diff(stored["commands"] if stored else {}, commands)
+        report.append((scope, added, removed, changed))
+        if commands:
+            self.state["scopes"][scope] = {"hash": tree_hash, "commands": commands, "synced_at": int(time.time())}
+        else:
+            # Nothing lives there any more, the sync above deleted what was left
+            self.state["scopes"].pop(scope, None)
+
+    async def sync(self, guild_ids=None):
+        """
+        Sync every scope whose commands changed since the last run
+
+        Args:
+            guild_ids: Only consider these guilds (plus global); None means every known guild
+        """
+        async with self.lock:
+            started = time.perf_counter()
+            if self.state.get("application_id") != self.bot.application_id:
+                # A different application never saw these commands
+                self.state = {"application_id": self.bot.application_id, "scopes": {}}
+                self.associated.clear()
+
+            self.promote_widespread()
+            local = self.local_scopes()
+            # Guilds that had commands last time but have none now still need their old ones deleted
+            scopes = set(local) | set(self.state["scopes"])
+            if guild_ids is not None:
+                wanted = {str(guild_id) for guild_id in guild_ids}
+                scopes = {scope for scope in scopes if scope == "global" or scope in wanted}
+
+            report = []
+            results = await asyncio.gather(*(self.sync_scope(scope, local.get(scope, {}), report) for scope in sorted(scopes)),
+                                           return_exceptions=True)
+            for scope, result in zip(sorted(scopes), results):
+                if isinstance(result, (Forbidden, NotFound)) and scope != "global":
+                    # Left the guild or lost the applications.commands scope, stop retrying it
+                    print(f"Can't sync commands to guild {scope} any more ({result.status}), forgetting it")
+                    self.state["scopes"].pop(scope, None)
+                elif isinstance(result, BaseException):
+                    COMMAND_SYNCS.inc(scope="global" if scope == "global" else "guild", action="failed")
+                    print(f"Failed to sync commands to {scope}: {result}")
+                    print("".join(traceback.format_exception(result)))
+
+            self.save_state()
+            elapsed = time.perf_counter() - started
+            SYNC_DURATION.set(elapsed)
+            if report or guild_ids is None:
+                self.report(report, len(scopes), elapsed)
+
+    def tracks(self, guild_id):
+        """Whether a guild has commands of its own now or had some at the last sync"""
+        if str(guild_id) in self.state["scopes"]:
+            return True
+        return any(guild_id in command.guild_ids_to_rollout for command in self.bot.get_all_application_commands())
+
+    async def sync_guild(self, guild_id):
+        """Sync one guild after a join or an outage, skipping guilds that only ever see global commands"""
+        if self.tracks(guild_id):
+            await self.sync(guild_ids=[guild_id])
+
+    def report(self, report, scopes, elapsed):
+        if not report:
+            print(f"Application commands unchanged across {scopes} scope(s), nothing synced ({elapsed * 1000:.0f}ms)")
+            return
+        print(f"Synced application commands to {len(report)}/{scopes} scope(s) in {elapsed:.2f}s")
+        for scope, added, removed, changed in sorted(report):
+            parts = [f"{label} {', '.join(keys)}" for label, keys in (("+", added), ("-", removed), ("~", changed)) if keys]
+            print(f"   {scope}: {'; '.join(parts) or 'resynced, no local changes'}")
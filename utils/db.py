@@ -1,13 +1,24 @@
-import mysql.connector
-from mysql.connector import pooling
 import os
 from dotenv import load_dotenv
-import asyncio
-import json
+import threading
+import time
+from utils import jsoncodec
+from utils import metrics
+from utils import runtime
+from utils.lazy import LazyModule
+
+# Imported on the first query, not when a cog holding a DatabaseManager loads
+mysql_connector = LazyModule("mysql.connector")
 
 class DatabaseManager:
-    def __init__(self, bot=None):
+    def __init__(self, bot=None, name="anime_bot"):
+        """
+        Args:
+            bot (commands.Bot): Owning bot
+            name (str): Pool label for metrics and /diag, one per owner so their pools don't share series
+        """
         self.bot = bot
+        self.name = name
         load_dotenv()
         
         
@@ -20,28 +31,44 @@ class DatabaseManager:
         }
         
         
-        try:
-            self.pool = mysql.connector.pooling.MySQLConnectionPool(
-                pool_name="anime_bot_pool",
-                pool_size=20,  
-                **self.db_config
-            )
-            self._last_conn_error = None  
-            print(f"✅ Connected to MySQL pool for {self.db_config['database']}")
-        except Exception as e:
-            print(f"❌ Database connection pool error: {e}")
-            self.pool = None
+        # The pool's 20 connections are opened by the first query, on its worker thread
+        self.pool = None
+        self._pool_attempted = False
+        self._pool_lock = threading.Lock()
+        self._last_conn_error = None
+    
+    def ensure_pool(self):
+        """Create the connection pool once; blocking, so call it from a worker thread"""
+        if self._pool_attempted:
+            return self.pool
+        with self._pool_lock:
+            if not self._pool_attempted:
+                try:
+                    self.pool = mysql_connector.pooling.MySQLConnectionPool(
+                        pool_name=f"{self.name}_pool",
+                        pool_size=20,  
+                        **self.db_config
+                    )
+                    metrics.track_pool(self.name, self.pool)
+                    print(f"✅ Connected to MySQL pool for {self.db_config['database']}")
+                except Exception as e:
+                    print(f"❌ Database connection pool error: {e}")
+                    self.pool = None
+                self._pool_attempted = True
+        return self.pool
     
     def get_connection(self):
         """Get a connection from the pool"""
         try:
-            if self.pool:
-                return self.pool.get_connection()
-            else:
-                
-                return mysql.connector.connect(**self.db_config)
+            with metrics.DB_ACQUIRE.time(pool=self.name):
+                pool = self.ensure_pool()
+                if pool:
+                    return pool.get_connection()
+                else:
+                    
+                    return mysql_connector.connect(**self.db_config)
         except Exception as e:
-            
+            metrics.DB_ERRORS.inc(pool=self.name, stage="connect")
             error_msg = str(e)
             if not hasattr(self, '_last_conn_error') or self._last_conn_error != error_msg:
                 print(f"Database connection error: {e}")
@@ -62,10 +89,11 @@ class DatabaseManager:
             list|int: Query results if fetch=True, otherwise number of affected rows
         """
         
-        return await asyncio.to_thread(self._execute_query_sync, query, params, fetch, many)
+        return await runtime.run_in("db", self._execute_query_sync, query, params, fetch, many)
     
     def _execute_query_sync(self, query, params=None, fetch=False, many=False):
-        """Synchronous version of execute_query for use with asyncio.to_thread"""
+        """Synchronous version of execute_query, run on the db executor"""
+        started = time.perf_counter()
         conn = self.get_connection()
         if not conn:
             return None
@@ -85,7 +113,7 @@ class DatabaseManager:
                 result = cursor.rowcount
                 
             return result
-        except mysql.connector.errors.IntegrityError as e:
+        except mysql_connector.errors.IntegrityError as e:
             
             if "Duplicate entry" in str(e):
                 conn.rollback()
@@ -96,6 +124,7 @@ class DatabaseManager:
                 print(f"Params: {params}")
                 return None
         except Exception as e:
+            metrics.DB_ERRORS.inc(pool=self.name, stage="query")
             print(f"Query execution error: {e}")
             print(f"Query: {query}")
             print(f"Params: {params}")
@@ -104,6 +133,7 @@ class DatabaseManager:
             if 'cursor' in locals():
                 cursor.close()
             conn.close()
+            metrics.DB_QUERY.observe(time.perf_counter() - started, pool=self.name)
     
     
     async def add_subscription(self, user_id, anime_id, anime_title):
@@ -200,8 +230,7 @@ class DatabaseManager:
             result = await self.execute_query(exists_query, (anime_data['id'],), fetch=True)
             
             
-            import json
-            genres_json = json.dumps(anime_data.get('genres', []))
+            genres_json = jsoncodec.dumps(anime_data.get('genres', []))
             
             if result:
                 
@@ -269,11 +298,131 @@ class DatabaseManager:
             return None
 
     
+    async def bulk_upsert(self, table, columns, rows, update_columns, extra_updates=None, chunk_size=500):
+        """
+        Insert or update many rows with multi-row INSERT ... ON DUPLICATE KEY UPDATE statements
+
+        The new row is referenced through the AS new_data alias, like the settings upserts,
+        which needs MySQL 8.0.19 or later; MariaDB and older MySQL only know VALUES(column).
+
+        Args:
+            table (str): Table to write to
+            columns (list): Column names, in the same order as each row
+            rows (list): Row tuples
+            update_columns (list): Columns to overwrite when the key already exists
+            extra_updates (list): Raw assignments added to the UPDATE clause
+            chunk_size (int): Rows per statement
+
+        Returns:
+            int|None: Total affected rows, or None if a chunk failed
+        """
+        placeholders = f"({', '.join(['%s'] * len(columns))})"
+        update_parts = [f"{column} = new_data.{column}" for column in update_columns]
+        update_parts.extend(extra_updates or [])
+
+        total = 0
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            query = f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            VALUES {', '.join([placeholders] * len(chunk))} AS new_data
+            ON DUPLICATE KEY UPDATE {', '.join(update_parts)}
+            """
+            params = [value for row in chunk for value in row]
+
+            result = await self.execute_query(query, params)
+            if result is None:
+                return None
+            total += result
+
+        return total
+
+    async def bulk_cache_anime(self, anime_list):
+        """Cache many anime in as few round trips as possible"""
+        columns = [
+            'anime_id', 'title_romaji', 'title_english', 'description',
+            'cover_image_url', 'status', 'format', 'episodes',
+            'season', 'season_year', 'genres', 'site_url', 'tags'
+        ]
+
+        rows = []
+        for anime_data in anime_list:
+            rows.append((
+                anime_data['id'],
+                anime_data['title']['romaji'],
+                anime_data['title'].get('english'),
+                anime_data.get('description'),
+                (anime_data.get('coverImage') or {}).get('large'),
+                anime_data.get('status'),
+                anime_data.get('format'),
+                anime_data.get('episodes'),
+                anime_data.get('season'),
+                anime_data.get('seasonYear'),
+                jsoncodec.dumps(anime_data['genres']) if 'genres' in anime_data else None,
+                anime_data.get('siteUrl'),
+                jsoncodec.dumps(anime_data['tags']) if 'tags' in anime_data else None
+            ))
+
+        if not rows:
+            return 0
+
+        # Airing schedule media only carries titles, cover and link; what it lacks
+        # (and tags, which only some queries fetch) must not erase what was cached before
+        always_present = ['title_romaji', 'title_english', 'cover_image_url', 'site_url']
+        kept_when_missing = [column for column in columns[1:] if column not in always_present]
+        return await self.bulk_upsert(
+            'anime_cache', columns, rows, always_present,
+            extra_updates=[f"{column} = COALESCE(new_data.{column}, anime_cache.{column})" for column in kept_when_missing]
+            + ["last_updated = CURRENT_TIMESTAMP"]
+        )
+
     async def get_cached_anime(self, anime_id):
         query = "SELECT * FROM anime_cache WHERE anime_id = %s"
         result = await self.execute_query(query, (anime_id,), fetch=True)
         return result[0] if result else None
     
+    async def search_cached_anime(self, title, limit=1):
+        """Find cached anime by title, most recently refreshed first"""
+        query = """
+        SELECT * FROM anime_cache
+        WHERE title_romaji LIKE %s ESCAPE '\\\\' OR title_english LIKE %s ESCAPE '\\\\'
+        ORDER BY (title_romaji = %s OR title_english = %s) DESC, last_updated DESC
+        LIMIT %s
+        """
+        # Titles like "100%" or "_" are matched literally, not as wildcards
+        escaped = title.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        result = await self.execute_query(query, (pattern, pattern, title, title, limit), fetch=True)
+        return result or []
+    
+    async def get_cached_anime_between(self, year_min, year_max, genres=None, limit=50):
+        """Get cached anime from a year range that have every one of the given genres"""
+        query = "SELECT * FROM anime_cache WHERE season_year >= %s AND season_year <= %s"
+        params = [year_min, year_max]
+        
+        for genre in genres or []:
+            query += " AND JSON_CONTAINS(genres, %s)"
+            params.append(jsoncodec.dumps(genre))
+        
+        query += " ORDER BY RAND() LIMIT %s"
+        params.append(limit)
+        
+        result = await self.execute_query(query, params, fetch=True)
+        return result or []
+    
+    async def update_anime_tags(self, anime_id, tags):
+        query = "UPDATE anime_cache SET tags = %s WHERE anime_id = %s"
+        return await self.execute_query(query, (jsoncodec.dumps(tags), anime_id))
+    
+    async def get_similarity_rows(self):
+        """Get the columns the similar anime index is built from for every cached anime"""
+        query = """
+        SELECT anime_id, title_romaji, title_english, cover_image_url,
+               season_year, site_url, genres, tags
+        FROM anime_cache
+        """
+        return await self.execute_query(query, fetch=True)
+    
     
     async def update_airing_schedule(self, anime_id, episode, airing_at):
         """Update airing schedule with updated MySQL syntax"""
@@ -303,6 +452,16 @@ class DatabaseManager:
             print(f"Error updating airing schedule: {e}")
             return None
     
+    async def bulk_update_airing_schedule(self, schedules):
+        """Upsert many (anime_id, episode, airing_at) rows at once"""
+        if not schedules:
+            return 0
+
+        return await self.bulk_upsert(
+            'airing_schedule', ['anime_id', 'episode', 'airing_at'],
+            list(schedules), ['airing_at']
+        )
+
     async def get_upcoming_episodes(self, start_time, end_time):
         query = """
         SELECT a.*, c.title_romaji, c.title_english, c.cover_image_url, c.site_url
@@ -469,6 +628,7 @@ class DatabaseManager:
                     season_year INT,
                     genres JSON,
                     site_url VARCHAR(255),
+                    tags JSON,
                     last_updated DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             """,
@@ -517,6 +677,20 @@ class DatabaseManager:
             print("✅ All database tables already exist")
         else:
             print(f"✅ Created {tables_created} new database tables")
+        
+        # anime_cache tables created before tags were stored need the column added
+        if "anime_cache" in existing_table_names:
+            tags_column = await self.execute_query(
+                """
+                SELECT COLUMN_NAME FROM information_schema.columns
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'anime_cache' AND COLUMN_NAME = 'tags'
+                """,
+                (self.db_config['database'],),
+                fetch=True
+            )
+            if not tags_column:
+                await self.execute_query("ALTER TABLE anime_cache ADD COLUMN tags JSON AFTER site_url")
+                print("✅ Added column: anime_cache.tags")
 
 
 def create_database():
@@ -532,7 +706,7 @@ def create_database():
     }
     
     
-    conn = mysql.connector.connect(**db_config)
+    conn = mysql_connector.connect(**db_config)
     cursor = conn.cursor()
     
     try:
@@ -586,6 +760,7 @@ def create_database():
                 season_year INT,
                 genres JSON,
                 site_url VARCHAR(255),
+                tags JSON,
                 last_updated DATETIME DEFAULT CURRENT_TIMESTAMP
             )
             """,
@@ -631,7 +806,7 @@ def create_database():
             
         print("✅ All tables have been created successfully")
         
-    except mysql.connector.Error as err:
+    except mysql_connector.Error as err:
         print(f"❌ Error: {err}")
     finally:
         cursor.close()
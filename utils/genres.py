@@ -0,0 +1,137 @@
+import re
+
+"""
+
+    Genre normalization for /anilist recommend.
+    Every lookup table is built once at import; matching is a dict hit on a
+    casefolded, punctuation-free key, with edit distance only for typos.
+
+"""
+
+# Complete list of genres used by AniList
+ANILIST_GENRES = (
+    "Action", "Adventure", "Comedy", "Drama", "Ecchi", "Fantasy",
+    "Horror", "Mahou Shoujo", "Mecha", "Music", "Mystery", "Psychological",
+    "Romance", "Sci-Fi", "Slice of Life", "Sports", "Supernatural",
+    "Thriller", "Hentai", "Isekai", "Josei", "Kids", "Seinen",
+    "Shoujo", "Shounen", "Yaoi", "Yuri", "Parody", "Demons",
+    "Game", "Historical", "Martial Arts", "Military", "School",
+    "Space", "Vampire", "Cars", "Dementia", "Harem", "Magic"
+)
+
+# Common spellings people type that AniList files under another name
+GENRE_ALIASES = {
+    "Science Fiction": "Sci-Fi",
+    "SOL": "Slice of Life",
+    "Magical Girl": "Mahou Shoujo",
+    "Mahou Shojo": "Mahou Shoujo",
+    "Shonen": "Shounen",
+    "Shojo": "Shoujo",
+    "Psych": "Psychological",
+    "Sport": "Sports",
+    "Vampires": "Vampire",
+    "Demon": "Demons",
+    "Games": "Game",
+    "History": "Historical",
+    "Martial Art": "Martial Arts",
+    "Robots": "Mecha",
+    "Musical": "Music",
+}
+
+
+def _genre_key(name):
+    """Casefold and drop spaces, dashes and other punctuation"""
+    return re.sub(r"[\W_]+", "", name.casefold())
+
+
+GENRE_LOOKUP = {_genre_key(genre): genre for genre in ANILIST_GENRES}
+GENRE_LOOKUP.update({_genre_key(alias): genre for alias, genre in GENRE_ALIASES.items()})
+
+
+def _edit_distance(a, b):
+    """Levenshtein distance between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+
+def normalize_genre(name):
+    """Return the AniList spelling of a genre, or None if it isn't one"""
+    return GENRE_LOOKUP.get(_genre_key(name))
+
+
+def suggest_genres(name, limit=3, max_distance=2):
+    """Return the closest AniList genres to a misspelled name"""
+    key = _genre_key(name)
+    if not key:
+        return []
+
+    scored = []
+    for candidate_key, genre in GENRE_LOOKUP.items():
+        distance = _edit_distance(key, candidate_key)
+        if distance <= max_distance:
+            scored.append((distance, genre))
+
+    suggestions = []
+    for _, genre in sorted(scored):
+        if genre not in suggestions:
+            suggestions.append(genre)
+    return suggestions[:limit]
+
+
+def parse_genres(text):
+    """
+    Split a comma-separated genre string
+
+    Returns:
+        tuple: (valid genres in AniList spelling, list of (unknown name, suggestions))
+    """
+    valid = []
+    invalid = []
+    for name in (part.strip() for part in (text or "").split(',')):
+        if not name:
+            continue
+        genre = normalize_genre(name)
+        if genre:
+            if genre not in valid:
+                valid.append(genre)
+        else:
+            invalid.append((name, suggest_genres(name)))
+    return valid, invalid
+
+
+def complete_genres(text, limit=25):
+    """Autocomplete choices for a comma-separated genre string, completing the last entry"""
+    parts = [part.strip() for part in (text or "").split(',')]
+    done, partial = parts[:-1], parts[-1]
+
+    chosen = [normalize_genre(part) or part for part in done if part]
+    prefix = ", ".join(chosen)
+    key = _genre_key(partial)
+
+    if key:
+        matched = {genre for candidate_key, genre in GENRE_LOOKUP.items() if candidate_key.startswith(key)}
+        matches = [genre for genre in ANILIST_GENRES if genre in matched]
+        if not matches:
+            matches = suggest_genres(partial, limit=limit)
+    else:
+        matches = list(ANILIST_GENRES)
+
+    choices = []
+    for genre in matches:
+        if genre in chosen:
+            continue
+        choice = f"{prefix}, {genre}" if prefix else genre
+        if len(choice) <= 100:
+            choices.append(choice)
+    return choices[:limit]
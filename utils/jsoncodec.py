@@ -0,0 +1,35 @@
+import json
+
+"""
+
+    One JSON codec for every HTTP client and JSON column.
+    Uses orjson when it is installed and falls back to the stdlib otherwise.
+
+"""
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+
+    def loads(data):
+        """Decode JSON from str or bytes"""
+        return orjson.loads(data)
+
+    def dumps(obj):
+        """Encode to a JSON str"""
+        return orjson.dumps(obj).decode()
+else:
+    BACKEND = "json"
+
+    def loads(data):
+        """Decode JSON from str or bytes"""
+        return json.loads(data)
+
+    def dumps(obj):
+        """Encode to a JSON str"""
+        return json.dumps(obj, separators=(",", ":"))
@@ -0,0 +1,21 @@
+import importlib
+
+"""
+
+    Deferred imports for heavy optional modules (PIL, mysql.connector,
+    aiomysql), so loading a cog doesn't pay for them until they are used.
+
+"""
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
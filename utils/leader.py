@@ -0,0 +1,169 @@
+import asyncio
+import os
+from utils import metrics
+from utils import runtime
+from utils.lazy import LazyModule
+
+try:
+    import fcntl
+except ImportError:
+    # Windows; only the MySQL lock is available there
+    fcntl = None
+
+"""
+
+    Leader election for a cluster of bot processes.
+    Exactly one process holds the lock at a time and runs the once-per-bot
+    jobs (sharding.is_elected). The MySQL lock is a GET_LOCK held by one
+    dedicated connection, so it is released by the server the moment the
+    holder dies or loses its connection, and another process picks it up on
+    its next attempt. The file lock does the same with flock for clusters on
+    one host without a database, like the local harness runs.
+
+"""
+
+mysql_connector = LazyModule("mysql.connector")
+
+LEADER = metrics.gauge("bot_cluster_leader", "1 while this process holds the cluster leader lock", ("lock",))
+
+
+class LeaderLock:
+
+    def __init__(self, name, interval=10):
+        """
+        Args:
+            name (str): Lock name, the same in every process of the cluster
+            interval (float): Seconds between attempts to take, or confirm, the lock
+        """
+        self.name = name
+        self.interval = interval
+        self.held = False
+        # Set once the first attempt finished, so startup jobs know whether they lead
+        self.decided = asyncio.Event()
+        self._task = None
+
+    def try_acquire(self):
+        """Take the lock, or confirm it is still ours; blocking, so call it from a worker thread"""
+        raise NotImplementedError
+
+    def release(self):
+        raise NotImplementedError
+
+    def start(self, loop=None):
+        if self._task is not None:
+            return
+        loop = loop or asyncio.get_running_loop()
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await runtime.run_in("db", self.release)
+        self.set_held(False)
+
+    def set_held(self, held):
+        if held != self.held:
+            print(f"👑 Took the {self.name} leader lock" if held else f"Lost the {self.name} leader lock")
+        self.held = held
+        LEADER.set(int(held), lock=self.name)
+
+    async def _run(self):
+        while True:
+            try:
+                held = await runtime.run_in("db", self.try_acquire)
+            except Exception as e:
+                print(f"Leader lock {self.name} check failed: {e}")
+                held = False
+            self.set_held(held)
+            self.decided.set()
+            await asyncio.sleep(self.interval)
+
+
+class MySQLLeaderLock(LeaderLock):
+
+    def __init__(self, name, db_config, interval=10):
+        super().__init__(name, interval)
+        self.db_config = db_config
+        self.connection = None
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def try_acquire(self):
+        try:
+            if self.connection is None or not self.connection.is_connected():
+                # The lock belonged to the old connection, if anything
+                self.close()
+                self.connection = mysql_connector.connect(**self.db_config)
+                self.held = False
+
+            cursor = self.connection.cursor()
+            try:
+                if self.held:
+                    cursor.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", (self.name,))
+                else:
+                    cursor.execute("SELECT GET_LOCK(%s, 0)", (self.name,))
+                (result,) = cursor.fetchone()
+            finally:
+                cursor.close()
+            return result == 1
+        except Exception as e:
+            print(f"Leader lock {self.name} unavailable: {e}")
+            self.close()
+            return False
+
+    def release(self):
+        if self.connection is None:
+            return
+        try:
+            if self.held:
+                cursor = self.connection.cursor()
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (self.name,))
+                cursor.fetchone()
+                cursor.close()
+        finally:
+            self.close()
+
+
+class FileLeaderLock(LeaderLock):
+
+    def __init__(self, name, path, interval=10):
+        super().__init__(name, interval)
+        if fcntl is None:
+            raise RuntimeError("File leader locks need fcntl, use the MySQL lock on this platform")
+        self.path = path
+        self.fd = None
+
+    def try_acquire(self):
+        if self.fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+def leader_lock_from_env(name, interval=None):
+    """The file lock when LEADER_LOCK_FILE is set, otherwise a MySQL lock on the DB_* database"""
+    interval = interval or float(os.getenv("LEADER_LOCK_INTERVAL", "10"))
+    path = os.getenv("LEADER_LOCK_FILE")
+    if path:
+        return FileLeaderLock(name, path, interval)
+    from utils.db import DatabaseManager
+    return MySQLLeaderLock(name, DatabaseManager().db_config, interval)
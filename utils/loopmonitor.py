@@ -0,0 +1,163 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from utils import metrics
+
+"""
+
+    Event loop lag monitor.
+    A ticker coroutine measures how late the loop wakes it up; a watchdog
+    thread notices when the loop stops ticking altogether and grabs the stack
+    of whatever is holding it, so a blocking call can be traced back to the
+    cog and command it came from.
+
+"""
+
+# Seconds, so the exported histogram reads like every other duration
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LOOP_LAG = metrics.histogram("bot_event_loop_lag_seconds", "How late the event loop ran a timer", buckets=LAG_BUCKETS)
+LOOP_BLOCKS = metrics.counter("bot_event_loop_blocks_total", "Times the loop stalled past the threshold", ("cog",))
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LoopMonitor:
+
+    def __init__(self, interval=0.25, threshold=0.25, window=2400, keep_blocks=20):
+        """
+        Args:
+            interval (float): Seconds between ticks
+            threshold (float): Lag in seconds that counts as a blocked loop and captures a stack
+            window (int): Recent lag samples kept for percentiles (2400 ticks = 10 minutes)
+            keep_blocks (int): Most recent blocking events kept for /ping
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.histogram = LOOP_LAG
+        self.recent = deque(maxlen=window)
+        self.blocks = deque(maxlen=keep_blocks)
+        self.loop = None
+        self.loop_thread_id = None
+        self.last_tick = None
+        self._pending_block = None
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+
+    def start(self, loop=None):
+        """Schedule the ticker on loop (the running one by default) and start the watchdog thread"""
+        if self._task is not None:
+            return
+        self.loop = loop or asyncio.get_running_loop()
+        self._stopped.clear()
+        self._task = self.loop.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _tick(self):
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.last_tick = now
+            self.record(max(0.0, now - started - self.interval))
+
+    def record(self, lag):
+        lag_ms = lag * 1000
+        self.histogram.observe(lag)
+        self.recent.append(lag_ms)
+
+        block = self._pending_block
+        self._pending_block = None
+        if block is not None and lag >= self.threshold:
+            block["lag_ms"] = lag_ms
+            self.blocks.append(block)
+            LOOP_BLOCKS.inc(cog=block["cog"] or "none")
+            print(f"⚠️ Event loop blocked for {lag_ms:.0f}ms in {describe(block)}")
+            print("".join(block["stack"][-8:]).rstrip())
+
+    def _watch(self):
+        # Poll often enough to catch a stall shortly after it crosses the threshold
+        poll = min(self.interval, self.threshold) / 2
+        captured_for = None
+        while not self._stopped.wait(poll):
+            last_tick = self.last_tick
+            if last_tick is None or last_tick == captured_for:
+                continue
+            if time.monotonic() - last_tick > self.interval + self.threshold:
+                captured_for = last_tick
+                self._pending_block = self.capture()
+
+    def capture(self):
+        """Stack and owner of whatever the loop thread is running right now"""
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return None
+
+        task = None
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            pass
+
+        block = {
+            "at": time.time(),
+            "lag_ms": None,
+            "task": task.get_name() if task is not None else None,
+            "cog": None,
+            "command": None,
+            "function": frame.f_code.co_name,
+            "stack": traceback.format_stack(frame),
+        }
+
+        # Innermost cog method and application command on the stack win
+        while frame is not None:
+            local_vars = frame.f_locals
+            owner = local_vars.get("self")
+            if block["cog"] is None and hasattr(owner, "__cog_name__"):
+                block["cog"] = owner.__cog_name__
+                block["function"] = frame.f_code.co_name
+            interaction = local_vars.get("interaction")
+            command = getattr(interaction, "application_command", None)
+            if block["command"] is None and command is not None:
+                block["command"] = getattr(command, "qualified_name", None) or getattr(command, "name", None)
+            frame = frame.f_back
+        return block
+
+    def snapshot(self):
+        samples = list(self.recent)
+        return {
+            "p50_ms": percentile(samples, 0.50),
+            "p99_ms": percentile(samples, 0.99),
+            "max_ms": max(samples, default=0.0),
+            "samples": len(samples),
+            "blocks": len(self.blocks),
+            "last_block": self.blocks[-1] if self.blocks else None,
+        }
+
+
+def describe(block):
+    """One line naming where a blocking event happened"""
+    where = f"{block['cog']}.{block['function']}" if block["cog"] else block["function"]
+    if block["command"]:
+        where += f" (/{block['command']})"
+    if block["task"]:
+        where += f" [{block['task']}]"
+    return where
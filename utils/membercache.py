@@ -0,0 +1,139 @@
+import os
+import time
+from collections import OrderedDict
+import nextcord
+from utils import metrics
+
+"""
+
+    Gateway intents and member cache profiles, picked with CACHE_PROFILE.
+
+    full: every intent the bot used to ask for, presences included, and
+          every member cached and chunked at startup.
+    lean: no presences, the highest-volume gateway event and one no cog
+          reads. The members intent stays for join, leave and role events,
+          but only the bot itself and members in voice are cached. Cogs
+          that need anyone else ask for them through find_members, which
+          queries the gateway on demand and keeps the answers cached.
+          Users a query didn't find are remembered as absent for
+          MEMBER_ABSENT_TTL seconds, so a recurring check asks about each
+          non-member once per TTL instead of every pass; joining clears it.
+
+"""
+
+DEFAULT_PROFILE = "lean"
+# Discord answers at most 100 user IDs per member request
+QUERY_BATCH = 100
+# {(guild id, user id): monotonic time the absence expires}, oldest first
+_absent = OrderedDict()
+ABSENT_TTL = int(os.getenv("MEMBER_ABSENT_TTL", "900"))
+ABSENT_MAX = int(os.getenv("MEMBER_ABSENT_MAX", "100000"))
+
+
+def cache_profile(name=None):
+    """
+    Client keyword arguments for a profile
+
+    Returns:
+        dict: intents, member_cache_flags and chunk_guilds_at_startup
+    """
+    name = (name or os.getenv("CACHE_PROFILE", DEFAULT_PROFILE)).strip().lower()
+    intents = nextcord.Intents.default()
+    intents.members = True
+    # $steal is still a prefix command
+    intents.message_content = True
+    intents.voice_states = True
+
+    if name == "full":
+        intents.presences = True
+        return {
+            "intents": intents,
+            "member_cache_flags": nextcord.MemberCacheFlags.from_intents(intents),
+            "chunk_guilds_at_startup": True,
+        }
+    if name == "lean":
+        return {
+            "intents": intents,
+            "member_cache_flags": nextcord.MemberCacheFlags(voice=True, joined=False),
+            "chunk_guilds_at_startup": False,
+        }
+    raise ValueError(f"Unknown CACHE_PROFILE {name!r}, expected full or lean")
+
+
+async def find_members(guild, user_ids, first=False):
+    """
+    Members of guild among user_ids, from the cache and then from the gateway
+
+    Args:
+        guild (nextcord.Guild): Guild to look in
+        user_ids (list[int]): Users to look for
+        first (bool): Stop at the first member found, for "is anyone of these here" checks
+
+    Returns:
+        list[nextcord.Member]: The members found; queried ones are cached from then on
+    """
+    found = []
+    missing = []
+    for user_id in user_ids:
+        member = guild.get_member(user_id)
+        if member is None:
+            missing.append(user_id)
+            continue
+        found.append(member)
+        if first:
+            metrics.record_cache("members", True)
+            return found
+
+    # A chunked guild's cache already has everyone
+    if not missing or guild.chunked:
+        metrics.CACHE_LOOKUPS.inc(len(found), cache="members", result="hit")
+        return found
+
+    now = time.monotonic()
+    unknown = [user_id for user_id in missing if not is_absent(guild.id, user_id, now)]
+    # Known absences answer without a query, like a cached member
+    metrics.CACHE_LOOKUPS.inc(len(found) + len(missing) - len(unknown), cache="members", result="hit")
+    metrics.CACHE_LOOKUPS.inc(len(unknown), cache="members", result="miss")
+    for start in range(0, len(unknown), QUERY_BATCH):
+        batch = unknown[start:start + QUERY_BATCH]
+        members = await guild.query_members(user_ids=batch, limit=len(batch), cache=True)
+        present = {member.id for member in members}
+        for user_id in batch:
+            if user_id not in present:
+                mark_absent(guild.id, user_id, now)
+        found.extend(members)
+        if first and found:
+            break
+    return found
+
+
+def is_absent(guild_id, user_id, now=None):
+    """Whether a query found user_id missing from the guild less than ABSENT_TTL ago"""
+    key = (guild_id, user_id)
+    expires = _absent.get(key)
+    if expires is None:
+        return False
+    if expires <= (now if now is not None else time.monotonic()):
+        del _absent[key]
+        return False
+    return True
+
+
+def mark_absent(guild_id, user_id, now=None):
+    key = (guild_id, user_id)
+    _absent.pop(key, None)
+    _absent[key] = (now if now is not None else time.monotonic()) + ABSENT_TTL
+    while len(_absent) > ABSENT_MAX:
+        _absent.popitem(last=False)
+
+
+def forget_absent(guild_id, user_id):
+    _absent.pop((guild_id, user_id), None)
+
+
+def instrument_bot(bot):
+    """Clear a member's remembered absence when they join, so find_members sees them straight away"""
+    async def on_member_join(member):
+        forget_absent(member.guild.id, member.id)
+
+    bot.add_listener(on_member_join)
@@ -0,0 +1,498 @@
+import asyncio
+import functools
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+import aiohttp
+from aiohttp import web
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+"""
+
+    In-process metrics with a Prometheus text exporter.
+    Counters, gauges and histograms live in one registry; collectors refresh
+    gauges that are cheaper to read at scrape time (pool usage, cache sizes).
+    Helpers below hook commands, component callbacks, aiohttp sessions,
+    MySQL pools and tasks.loop coroutines into it.
+
+"""
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; wide enough for both a cached lookup and a slow AniList page
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        # DB metrics are updated from executor threads
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def remove(self, **labels):
+        self.values.pop(self._key(labels), None)
+
+    def items(self):
+        """[(labels dict, value)] for every label set seen so far"""
+        return [(dict(zip(self.labelnames, key)), value) for key, value in list(self.values.items())]
+
+    def samples(self):
+        """[(suffix, [(label, value)], value)]"""
+        return [("", list(zip(self.labelnames, key)), value) for key, value in list(self.values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+
+class HistogramChild:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(upper bound, observations <= bound)], ending with (inf, count)"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Estimate like Prometheus' histogram_quantile: linear within the bucket the rank falls in"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        lower_bound, lower_count = 0.0, 0
+        for bound, count in self.cumulative():
+            if count >= rank:
+                if bound == float("inf"):
+                    return lower_bound
+                return lower_bound + (bound - lower_bound) * (rank - lower_count) / max(1, count - lower_count)
+            lower_bound, lower_count = bound, count
+        return lower_bound
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def labels(self, **labels):
+        key = self._key(labels)
+        child = self.values.get(key)
+        if child is None:
+            with self._lock:
+                child = self.values.setdefault(key, HistogramChild(self.buckets))
+        return child
+
+    def observe(self, value, **labels):
+        child = self.labels(**labels)
+        with self._lock:
+            child.observe(value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        result = []
+        for key, child in list(self.values.items()):
+            labels = list(zip(self.labelnames, key))
+            for bound, count in child.cumulative():
+                result.append(("_bucket", labels + [("le", format_value(float(bound)))], count))
+            result.append(("_sum", labels, child.sum))
+            result.append(("_count", labels, child.count))
+        return result
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        # Cogs get reloaded, so asking for an existing metric hands back the same one
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered with a different type or labels")
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collector):
+        """collector() is called before every scrape to refresh gauges; returning False unregisters it"""
+        self.collectors.append(collector)
+
+    def collect(self):
+        for collector in list(self.collectors):
+            try:
+                if collector() is False:
+                    self.collectors.remove(collector)
+            except Exception as e:
+                print(f"Metrics collector {collector} failed: {e}")
+
+    def render(self):
+        self.collect()
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+add_collector = REGISTRY.add_collector
+
+
+# Commands and components
+
+COMMAND_DURATION = histogram(
+    "bot_command_duration_seconds", "Time spent running a command or component callback", ("command", "kind")
+)
+COMMAND_RESULTS = counter("bot_command_results_total", "Finished commands by outcome", ("command", "kind", "status"))
+COMMAND_ERRORS = counter("bot_command_errors_total", "Command failures by exception type", ("command", "kind", "error"))
+
+
+def record_command(command, kind, duration, error=None):
+    if duration is not None:
+        COMMAND_DURATION.observe(duration, command=command, kind=kind)
+    COMMAND_RESULTS.inc(command=command, kind=kind, status="error" if error is not None else "ok")
+    if error is not None:
+        # Unwrap ApplicationInvokeError/CommandInvokeError to the exception the callback raised
+        error = getattr(error, "original", None) or error
+        COMMAND_ERRORS.inc(command=command, kind=kind, error=type(error).__name__)
+
+
+def instrument_bot(bot):
+    """Time every slash command, subcommand, prefix command and View/Modal callback of bot"""
+    started = {}
+
+    @bot.application_command_before_invoke
+    async def start_application_command(interaction):
+        started[interaction.id] = time.perf_counter()
+
+    def application_command_name(interaction):
+        command = interaction.application_command
+        return getattr(command, "qualified_name", None) or getattr(command, "name", "unknown")
+
+    async def on_application_command_completion(interaction):
+        began = started.pop(interaction.id, None)
+        record_command(application_command_name(interaction), "application",
+                       time.perf_counter() - began if began is not None else None)
+
+    async def on_application_command_error(interaction, error):
+        # Failed checks never reach the before-invoke hook, so they have no duration
+        began = started.pop(interaction.id, None)
+        record_command(application_command_name(interaction), "application",
+                       time.perf_counter() - began if began is not None else None, error)
+
+    async def on_command(ctx):
+        started[id(ctx)] = time.perf_counter()
+
+    async def on_command_completion(ctx):
+        began = started.pop(id(ctx), None)
+        record_command(ctx.command.qualified_name, "prefix", time.perf_counter() - began if began is not None else None)
+
+    async def on_command_error(ctx, error):
+        began = started.pop(id(ctx), None)
+        name = ctx.command.qualified_name if ctx.command else "unknown"
+        record_command(name, "prefix", time.perf_counter() - began if began is not None else None, error)
+
+    for listener in (on_application_command_completion, on_application_command_error,
+                     on_command, on_command_completion, on_command_error):
+        bot.add_listener(listener)
+
+    instrument_components()
+
+
+def component_name(owner, item=None):
+    callback = getattr(item, "callback", None) if item is not None else getattr(owner, "callback", None)
+    callback = getattr(callback, "func", callback)
+    return f"{type(owner).__name__}.{getattr(callback, '__name__', type(item).__name__)}"
+
+
+def instrument_components():
+    """Wrap nextcord's View/Modal dispatch so component callbacks are timed like commands"""
+    from nextcord import ui
+
+    if getattr(ui.View._scheduled_task, "__metrics__", False):
+        return
+
+    view_task = ui.View._scheduled_task
+    modal_task = ui.Modal._scheduled_task
+
+    # Views and modals swallow callback errors into on_error, so only duration and volume show up here
+    @functools.wraps(view_task)
+    async def view_scheduled_task(self, item, interaction):
+        started = time.perf_counter()
+        try:
+            return await view_task(self, item, interaction)
+        finally:
+            record_command(component_name(self, item), "component", time.perf_counter() - started)
+
+    @functools.wraps(modal_task)
+    async def modal_scheduled_task(self, interaction):
+        started = time.perf_counter()
+        try:
+            return await modal_task(self, interaction)
+        finally:
+            record_command(component_name(self), "modal", time.perf_counter() - started)
+
+    view_scheduled_task.__metrics__ = modal_scheduled_task.__metrics__ = True
+    ui.View._scheduled_task = view_scheduled_task
+    ui.Modal._scheduled_task = modal_scheduled_task
+
+
+# Caches
+
+CACHE_LOOKUPS = counter("bot_cache_lookups_total", "Lookups answered locally (hit) or sent upstream (miss)", ("cache", "result"))
+
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def cache_hit_ratio(cache):
+    """Share of lookups served from cache since startup, None before the first lookup"""
+    hits = CACHE_LOOKUPS.get(cache=cache, result="hit")
+    total = hits + CACHE_LOOKUPS.get(cache=cache, result="miss")
+    return hits / total if total else None
+
+
+# Outgoing HTTP
+
+HTTP_DURATION = histogram("bot_http_request_duration_seconds", "Outgoing HTTP request time", ("client",))
+HTTP_REQUESTS = counter("bot_http_requests_total", "Outgoing HTTP requests by status", ("client", "status"))
+
+
+def http_trace(client):
+    """
+    aiohttp TraceConfig recording requests under client, e.g. ClientSession(trace_configs=[http_trace("anilist")]).
+    A single request can report under another name with trace_request_ctx={"client": name}.
+    """
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.client = (context.trace_request_ctx or {}).get("client", client)
+        context.started = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        HTTP_DURATION.observe(time.perf_counter() - context.started, client=context.client)
+        HTTP_REQUESTS.inc(client=context.client, status=params.response.status)
+
+    async def on_request_exception(session, context, params):
+        HTTP_DURATION.observe(time.perf_counter() - context.started, client=context.client)
+        HTTP_REQUESTS.inc(client=context.client, status=type(params.exception).__name__)
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
+
+
+# Database pools
+
+DB_POOL_SIZE = gauge("bot_db_pool_size", "Connections a pool may hold", ("pool",))
+DB_POOL_IN_USE = gauge("bot_db_pool_in_use", "Connections currently checked out", ("pool",))
+DB_ACQUIRE = histogram("bot_db_acquire_seconds", "Time to get a connection from a pool", ("pool",))
+DB_QUERY = histogram("bot_db_query_seconds", "Query time including the connection checkout", ("pool",))
+DB_ERRORS = counter("bot_db_errors_total", "Failed connection checkouts and queries", ("pool", "stage"))
+
+
+def track_pool(name, pool):
+    """Report size and checked out connections of a mysql.connector or aiomysql pool at scrape time"""
+    ref = weakref.ref(pool)
+
+    def collect():
+        pool = ref()
+        if pool is None:
+            DB_POOL_SIZE.remove(pool=name)
+            DB_POOL_IN_USE.remove(pool=name)
+            return False
+        if hasattr(pool, "_cnx_queue"):
+            # mysql.connector keeps idle connections in a queue and never grows past pool_size
+            size = pool.pool_size
+            in_use = size - pool._cnx_queue.qsize()
+        else:
+            size = pool.maxsize
+            in_use = pool.size - pool.freesize
+        DB_POOL_SIZE.set(size, pool=name)
+        DB_POOL_IN_USE.set(in_use, pool=name)
+
+    add_collector(collect)
+
+
+# Background loops
+
+LOOP_DURATION = histogram("bot_loop_duration_seconds", "Time one iteration of a background loop took", ("loop",))
+LOOP_RUNS = counter("bot_loop_runs_total", "Background loop iterations by outcome", ("loop", "status"))
+LOOP_LAST_RUN = gauge("bot_loop_last_run_timestamp_seconds", "When a background loop last finished", ("loop",))
+LOOP_LAST_DURATION = gauge("bot_loop_last_duration_seconds", "How long the last iteration took", ("loop",))
+
+
+def timed_loop(name):
+    """Decorator for a tasks.loop coroutine, placed under @tasks.loop"""
+    def decorator(coro):
+        @functools.wraps(coro)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status = "error"
+            try:
+                result = await coro(*args, **kwargs)
+                status = "ok"
+                return result
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            finally:
+                duration = time.perf_counter() - started
+                LOOP_DURATION.observe(duration, loop=name)
+                LOOP_RUNS.inc(loop=name, status=status)
+                LOOP_LAST_RUN.set(time.time(), loop=name)
+                LOOP_LAST_DURATION.set(duration, loop=name)
+        return wrapper
+    return decorator
+
+
+# Process
+
+PROCESS_RSS = gauge("process_resident_memory_bytes", "Resident memory size in bytes")
+
+
+def resident_memory():
+    """Current RSS in bytes, the peak where /proc is unavailable, or None on Windows"""
+    if resource is None:
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def collect_process():
+    rss = resident_memory()
+    if rss is None:
+        return False
+    PROCESS_RSS.set(rss)
+
+
+add_collector(collect_process)
+
+
+# Exporter
+
+async def start_exporter(host="127.0.0.1", port=9108, registry=REGISTRY):
+    """Serve registry on http://host:port/metrics; returns the runner to clean up"""
+    async def handle(request):
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"📈 Metrics exporter listening on http://{host}:{port}/metrics")
+    return runner
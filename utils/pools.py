@@ -0,0 +1,103 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from utils import metrics
+
+"""
+
+    Shared candidate pools for /anilist recommend.
+    Each (year range, genre set) gets one pool that every user samples from,
+    so only the first request for a combination waits on AniList.
+
+"""
+
+
+class CandidatePool:
+
+    def __init__(self):
+        self.items = {}
+        self.created_at = time.time()
+
+    def __len__(self):
+        return len(self.items)
+
+    def merge(self, media_list):
+        for media in media_list:
+            self.items[media['id']] = media
+
+
+class CandidatePoolStore:
+
+    def __init__(self, fetch, ttl=3600, low_water=15, max_pools=256):
+        """
+        Args:
+            fetch (callable): Coroutine taking (year_min, year_max, genres) and returning a media list
+            ttl (int): Seconds before a pool is thrown away and fetched again
+            low_water (int): Pool size below which a background refill is started
+            max_pools (int): Least recently used pools are dropped past this count
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self.low_water = low_water
+        self.max_pools = max_pools
+        self.pools = OrderedDict()
+        self._pending = {}
+
+    @staticmethod
+    def make_key(year_min, year_max, genres=None):
+        """Normalize a request so equivalent genre orderings share a pool"""
+        return (year_min, year_max, tuple(sorted(set(genres or []))))
+
+    def _is_fresh(self, pool):
+        return pool is not None and len(pool) > 0 and time.time() - pool.created_at < self.ttl
+
+    async def _fill(self, key):
+        year_min, year_max, genres = key
+        try:
+            media_list = await self.fetch(year_min, year_max, list(genres))
+        except Exception as e:
+            print(f"Error filling recommendation pool {key}: {e}")
+            return
+
+        pool = self.pools.get(key)
+        if pool is None or time.time() - pool.created_at >= self.ttl:
+            pool = CandidatePool()
+            self.pools[key] = pool
+        pool.merge(media_list or [])
+
+        while len(self.pools) > self.max_pools:
+            self.pools.popitem(last=False)
+
+    def _start_fill(self, key):
+        """Start a fill for key unless one is already running and return its task"""
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fill(key))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return task
+
+    async def sample(self, year_min, year_max, genres=None, count=5):
+        """Draw up to count distinct candidates, removing them from the shared pool"""
+        key = self.make_key(year_min, year_max, genres)
+
+        fresh = self._is_fresh(self.pools.get(key))
+        metrics.record_cache("recommend_pool", fresh)
+        if not fresh:
+            # Shielded so one caller being cancelled doesn't cancel the fill the others wait on
+            await asyncio.shield(self._start_fill(key))
+
+        pool = self.pools.get(key)
+        if not pool:
+            return []
+        self.pools.move_to_end(key)
+
+        picks = random.sample(list(pool.items.values()), min(count, len(pool)))
+        for media in picks:
+            del pool.items[media['id']]
+
+        if len(pool) < self.low_water:
+            self._start_fill(key)
+
+        return picks
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+"""
+
+    Sampling profiler for a live bot.
+    A background thread snapshots every thread's Python stack at a fixed
+    interval, which costs the event loop nothing beyond the GIL hand-off.
+    Output is collapsed stacks ("frame;frame;frame count" per line), ready
+    for flamegraph.pl, speedscope or inferno. An optional tracemalloc diff
+    shows which lines allocated the most while the profile ran.
+
+"""
+
+PROFILE_DIR = "profiles"
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def is_idle(frame):
+    """Threads parked on a lock or an empty executor queue say nothing about where time goes"""
+    code = frame.f_code
+    if code.co_name == "wait" and code.co_filename.endswith("threading.py"):
+        return True
+    # The executor's queue.get is C, so an idle worker's innermost Python frame is _worker itself
+    return code.co_name == "_worker" and code.co_filename.endswith(os.path.join("concurrent", "futures", "thread.py"))
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval=0.01, include_idle=False):
+        """
+        Args:
+            interval (float): Seconds between samples
+            include_idle (bool): Keep samples of threads blocked in threading waits
+        """
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self.loop_thread_id = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def thread_name(self, thread_id, names):
+        if thread_id == self.loop_thread_id:
+            return "event-loop"
+        return names.get(thread_id, f"thread-{thread_id}")
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (not self.include_idle and is_idle(frame)):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.append(self.thread_name(thread_id, names))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_frames(self, count=10):
+        """Leaf frames with the most samples, i.e. where threads actually were"""
+        leaves = Counter()
+        for stack, hits in self.stacks.items():
+            thread, _, rest = stack.partition(";")
+            leaves[(thread, rest.rsplit(";", 1)[-1])] += hits
+        return leaves.most_common(count)
+
+
+def allocation_diff(before, after, limit=25):
+    lines = [f"Top {limit} allocation changes by line"]
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        lines.append(str(stat))
+    return "\n".join(lines) + "\n"
+
+
+_profile_lock = asyncio.Lock()
+
+
+def profile_running():
+    return _profile_lock.locked()
+
+
+async def run_profile(seconds, trace_memory=False, interval=0.01, directory=PROFILE_DIR):
+    """
+    Sample the event loop thread and every worker thread for seconds
+
+    Returns:
+        dict: paths of the written files, sample count and the hottest leaf frames
+    """
+    async with _profile_lock:
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(directory, f"profile-{stamp}")
+
+        started_tracing = False
+        before = None
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+                started_tracing = True
+            before = tracemalloc.take_snapshot()
+
+        # Tracing left on after a cancelled or failed profile would slow every later allocation
+        try:
+            profiler = SamplingProfiler(interval)
+            started = time.perf_counter()
+            profiler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.stop()
+            elapsed = time.perf_counter() - started
+
+            result = {
+                "collapsed": base + ".collapsed",
+                "memory": None,
+                "samples": profiler.samples,
+                "seconds": elapsed,
+                "top": profiler.top_frames(),
+            }
+            with open(result["collapsed"], "w", encoding="utf-8") as f:
+                f.write(profiler.collapsed())
+
+            if trace_memory:
+                after = tracemalloc.take_snapshot()
+                result["memory"] = base + ".tracemalloc.txt"
+                with open(result["memory"], "w", encoding="utf-8") as f:
+                    f.write(allocation_diff(before, after))
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        print(f"📊 Profiled {elapsed:.1f}s ({profiler.samples} samples) into {result['collapsed']}")
+        return result
+
+
+def install_signal_handler(loop, seconds=30, trace_memory=False):
+    """Profile for seconds whenever the process gets SIGUSR1 (no-op where that signal does not exist)"""
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+
+    def on_signal():
+        if profile_running():
+            print("Profile already running, ignoring SIGUSR1")
+            return
+        loop.create_task(run_profile(seconds, trace_memory))
+
+    loop.add_signal_handler(signal.SIGUSR1, on_signal)
+    return True
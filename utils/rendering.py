@@ -0,0 +1,268 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from utils import metrics
+
+"""
+
+    Greeting banner rendering in a process pool.
+
+    Decoding the avatar, masking, compositing and PNG encoding are all CPU
+    bound PIL work; on the event loop a mass join stalls the whole bot, and
+    in a thread it still holds the GIL for most of each banner. Workers take
+    a template id and the avatar's RGBA tile (utils/avatars.py) and return
+    the encoded PNG, so nothing but bytes crosses the process boundary.
+
+    At most max_pending banners are queued or rendering at a time. Past that
+    render() returns None straight away and the caller sends its greeting
+    without a banner: during a raid a late or missing banner is better than
+    every greeting, command and heartbeat waiting behind the queue.
+
+"""
+
+# Template id: (background image relative to the working directory, colour used when it is missing)
+TEMPLATES = {
+    "welcome": ("assets/welcome_banner.jpg", (67, 181, 129)),  # Discord green
+    "goodbye": ("assets/goodbye_banner.jpg", (240, 71, 71)),  # Discord red
+}
+BANNER_SIZE = (600, 200)
+AVATAR_SIZE = 100
+# Most avatars a group banner shows in its one row, and the space around each
+GROUP_AVATARS = 8
+GROUP_GAP = 16
+# zlib level 1 encodes a banner about 3x faster than the default 6 for a file about a quarter larger
+PNG_COMPRESS_LEVEL = 1
+
+RENDER_PENDING = metrics.gauge("bot_render_pending", "Banners queued or rendering in the render pool")
+RENDERS = metrics.counter("bot_renders_total", "Banner render requests by outcome", ("template", "result"))
+RENDER_DURATION = metrics.histogram(
+    "bot_render_duration_seconds", "Time from submitting a banner to getting its PNG back, queueing included", ("template",)
+)
+
+
+# Each worker's decoded backgrounds, {template id: (mtime, RGBA image)}; None mtime is the plain colour
+_templates = {}
+# The circle is drawn this many times larger and scaled down, which anti-aliases its edge
+MASK_SUPERSAMPLE = 4
+
+
+def template_image(template_id):
+    """
+    The template's background decoded, resized to BANNER_SIZE and converted to RGBA once per worker
+
+    Editing the asset on disk changes its mtime, and the next render reloads it.
+    """
+    background_path, colour = TEMPLATES[template_id]
+    try:
+        mtime = os.stat(background_path).st_mtime_ns
+    except OSError:
+        mtime = None
+    cached = _templates.get(template_id)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    from PIL import Image
+
+    if mtime is None:
+        background = Image.new("RGBA", BANNER_SIZE, colour)
+    else:
+        with Image.open(background_path) as source:
+            background = source.convert("RGBA").resize(BANNER_SIZE, Image.LANCZOS)
+    _templates[template_id] = (mtime, background)
+    return background
+
+
+@functools.lru_cache(maxsize=8)
+def circle_mask(size):
+    """Anti-aliased circular alpha mask for a square avatar of this size"""
+    from PIL import Image, ImageDraw
+
+    large = size * MASK_SUPERSAMPLE
+    mask = Image.new("L", (large, large), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, large - 1, large - 1), fill=255)
+    return mask.resize((size, size), Image.LANCZOS)
+
+
+def decode_avatar(data):
+    """
+    Decode a downloaded avatar into the tile render_banner pastes
+
+    Returns:
+        bytes|None: AVATAR_SIZE square RGBA pixels, None for an unreadable image
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(BytesIO(data)) as avatar:
+            return avatar.convert("RGBA").resize((AVATAR_SIZE, AVATAR_SIZE), Image.LANCZOS).tobytes()
+    except Exception as e:
+        print(f"Unreadable avatar image: {e}")
+        return None
+
+
+def avatar_image(tile):
+    from PIL import Image
+
+    if tile is None:
+        # Grey placeholder for a failed download or a corrupt image
+        return Image.new("RGBA", (AVATAR_SIZE, AVATAR_SIZE), (128, 128, 128, 255))
+    return Image.frombytes("RGBA", (AVATAR_SIZE, AVATAR_SIZE), tile)
+
+
+def render_banner(template_id, avatar_tile):
+    """
+    Paste the circular avatar onto the template's banner; runs in a pool worker
+
+    Args:
+        template_id (str): Key of TEMPLATES
+        avatar_tile (bytes): decode_avatar's RGBA tile, None for the placeholder
+
+    Returns:
+        bytes: The banner as PNG
+    """
+    banner = template_image(template_id).copy()
+    avatar = avatar_image(avatar_tile)
+    position = ((banner.size[0] - avatar.size[0]) // 2, (banner.size[1] - avatar.size[1]) // 2)
+    # The mask stands in for the avatar's own alpha, as the circle crop always has
+    banner.paste(avatar, position, circle_mask(avatar.size[0]))
+
+    byte_io = BytesIO()
+    banner.save(byte_io, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return byte_io.getvalue()
+
+
+def render_group_banner(template_id, avatar_tiles):
+    """
+    One row of circular avatars on the template's banner, for a batch of joins; runs in a pool worker
+
+    Args:
+        template_id (str): Key of TEMPLATES
+        avatar_tiles (list[bytes]): Up to GROUP_AVATARS tiles, None entries for placeholders
+
+    Returns:
+        bytes: The banner as PNG
+    """
+    from PIL import Image
+
+    banner = template_image(template_id).copy()
+    tiles = avatar_tiles[:GROUP_AVATARS]
+    count = max(1, len(tiles))
+    size = min(AVATAR_SIZE, (banner.size[0] - GROUP_GAP * (count + 1)) // count)
+    mask = circle_mask(size)
+    left = (banner.size[0] - count * size - (count - 1) * GROUP_GAP) // 2
+    top = (banner.size[1] - size) // 2
+    for index, tile in enumerate(tiles):
+        avatar = avatar_image(tile)
+        if size != AVATAR_SIZE:
+            avatar = avatar.resize((size, size), Image.LANCZOS)
+        banner.paste(avatar, (left + index * (size + GROUP_GAP), top), mask)
+
+    byte_io = BytesIO()
+    banner.save(byte_io, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return byte_io.getvalue()
+
+
+def warm_worker():
+    """Pay for the PIL import, template decoding and the mask before the first real banner"""
+    for template_id in TEMPLATES:
+        template_image(template_id)
+    circle_mask(AVATAR_SIZE)
+    return os.getpid()
+
+
+def pool_context():
+    """
+    forkserver where the platform has it, spawn elsewhere
+
+    The pool starts long after the bot's threads (executors, the loop monitor),
+    and a plain fork then could copy a lock some other thread holds into the
+    worker. The fork server is a fresh process, so its forks start clean. Both
+    import main.py in the workers, which only builds the bot as the script.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class BannerRenderer:
+
+    def __init__(self, workers=None, max_pending=None):
+        """
+        Args:
+            workers (int): Render processes, RENDER_WORKERS or the CPU count by default
+            max_pending (int): Banners queued or rendering before render() sheds load,
+                RENDER_QUEUE_DEPTH or 4 per worker by default
+        """
+        self.workers = workers or int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+        self.max_pending = max_pending or int(os.getenv("RENDER_QUEUE_DEPTH", self.workers * 4))
+        self.pending = 0
+        self.pool = None
+
+    def executor(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=pool_context())
+        return self.pool
+
+    async def start(self):
+        """Start every worker now, rather than on the first join"""
+        loop = asyncio.get_running_loop()
+        pool = self.executor()
+        pids = await asyncio.gather(*(loop.run_in_executor(pool, warm_worker) for _ in range(self.workers)))
+        print(f"🖼️ Banner render pool up with {len(set(pids))} workers, queue depth {self.max_pending}")
+
+    def saturated(self):
+        return self.pending >= self.max_pending
+
+    async def render(self, template_id, avatar_tile):
+        """
+        Render a banner in the pool
+
+        Returns:
+            bytes|None: The PNG, or None when the queue is full or the render failed
+        """
+        return await self._submit(template_id, render_banner, template_id, avatar_tile)
+
+    async def render_group(self, template_id, avatar_tiles):
+        """Render one banner for several members, like render()"""
+        return await self._submit(template_id, render_group_banner, template_id, avatar_tiles)
+
+    async def _submit(self, template_id, func, *args):
+        if self.saturated():
+            RENDERS.inc(template=template_id, result="shed")
+            return None
+
+        loop = asyncio.get_running_loop()
+        pool = self.executor()
+        self.pending += 1
+        RENDER_PENDING.set(self.pending)
+        started = time.perf_counter()
+        try:
+            png = await loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            # A worker died (OOM killer, a crash in PIL); the next render starts a fresh pool
+            if self.pool is pool:
+                print("Banner render pool broke, restarting it")
+                pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+            RENDERS.inc(template=template_id, result="error")
+            return None
+        except Exception as e:
+            print(f"Error rendering {template_id} banner: {e}")
+            RENDERS.inc(template=template_id, result="error")
+            return None
+        finally:
+            self.pending -= 1
+            RENDER_PENDING.set(self.pending)
+        RENDER_DURATION.observe(time.perf_counter() - started, template=template_id)
+        RENDERS.inc(template=template_id, result="rendered")
+        return png
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,113 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils import metrics
+
+try:
+    import uvloop
+except ImportError:
+    # Not installed, or Windows, where uvloop doesn't build
+    uvloop = None
+
+"""
+
+    Event loop and executor setup, done once before the bot is built.
+
+    The loop is uvloop when it is installed (UVLOOP=0 turns it off), which
+    runs the gateway, HTTP and timer callbacks with less overhead than the
+    pure Python loop. Blocking work goes to a named thread pool instead of
+    the loop's one default executor, so a burst in one subsystem can only
+    queue behind itself:
+
+    db      MySQL queries and pool setup, as many threads as the pool has
+            connections (EXECUTOR_DB_THREADS)
+    image   CPU bound builds that stay in process, like the similarity
+            index (EXECUTOR_IMAGE_THREADS); greeting banners have their
+            own process pool in utils/rendering.py
+    io      sqlite and file reads and writes (EXECUTOR_IO_THREADS)
+
+    Anything still calling asyncio.to_thread keeps using the default executor.
+
+"""
+
+EXECUTOR_THREADS = {
+    "db": 20,
+    "image": max(2, min(8, os.cpu_count() or 1)),
+    "io": 4,
+}
+
+EXECUTOR_PENDING = metrics.gauge("bot_executor_pending", "Jobs submitted to a named executor and not finished", ("executor",))
+EXECUTOR_WAIT = metrics.histogram(
+    "bot_executor_wait_seconds", "Time a job waited for a free executor thread", ("executor",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+_executors = {}
+# Which loop install_event_loop picked
+loop_name = "asyncio"
+
+
+def install_event_loop():
+    """
+    Use uvloop for every loop created from here on; call before the bot is constructed
+
+    Returns:
+        str: "uvloop" or "asyncio", whichever loop the bot will run on
+    """
+    global loop_name
+    if uvloop is not None and os.getenv("UVLOOP", "1") != "0":
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        loop_name = "uvloop"
+    return loop_name
+
+
+def executor_threads(name):
+    return int(os.getenv(f"EXECUTOR_{name.upper()}_THREADS", EXECUTOR_THREADS[name]))
+
+
+def executor(name):
+    """The named thread pool, created on first use"""
+    pool = _executors.get(name)
+    if pool is None:
+        if name not in EXECUTOR_THREADS:
+            raise KeyError(f"Unknown executor {name!r}, expected one of {', '.join(EXECUTOR_THREADS)}")
+        pool = _executors[name] = ThreadPoolExecutor(executor_threads(name), thread_name_prefix=f"bot-{name}")
+    return pool
+
+
+async def run_in(name, func, *args, **kwargs):
+    """
+    Run a blocking call on the named executor, like asyncio.to_thread does on the default one
+
+    Args:
+        name (str): db, image or io
+        func (callable): The blocking function
+    """
+    loop = asyncio.get_running_loop()
+    submitted = time.perf_counter()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+
+    def job():
+        EXECUTOR_WAIT.observe(time.perf_counter() - submitted, executor=name)
+        return call()
+
+    EXECUTOR_PENDING.inc(executor=name)
+    try:
+        return await loop.run_in_executor(executor(name), job)
+    finally:
+        EXECUTOR_PENDING.dec(executor=name)
+
+
+def describe():
+    """One line for startup logs and /diag"""
+    sizes = ", ".join(f"{name}={executor_threads(name)}" for name in EXECUTOR_THREADS)
+    return f"{loop_name} loop, executors {sizes}"
+
+
+def shutdown(wait=False):
+    for pool in _executors.values():
+        pool.shutdown(wait=wait, cancel_futures=True)
+    _executors.clear()
@@ -0,0 +1,134 @@
+import os
+from nextcord import AutoShardedClient
+from utils import metrics
+
+"""
+
+    Shard helpers.
+    A plain commands.Bot counts as shard 0 of 1, so cogs can ask the same
+    questions either way. Loops that work on guilds should skip guilds that
+    belong to shards of other processes (owns_guild); loops that must happen
+    once per bot, like DMing subscribers, run only in the elected process
+    (is_elected): the leader-lock holder in a cluster, otherwise the one
+    running shard 0.
+
+"""
+
+# Outside a cluster, the process running this shard runs the once-per-bot loops
+ELECTED_SHARD = 0
+
+SHARD_LATENCY = metrics.gauge("bot_shard_latency_seconds", "Heartbeat latency per shard", ("shard",))
+SHARD_GUILDS = metrics.gauge("bot_shard_guilds", "Guilds served by each shard", ("shard",))
+SHARD_EVENTS = metrics.counter("bot_shard_events_total", "Gateway dispatch events received per shard", ("shard",))
+SHARD_CONNECTIONS = metrics.counter("bot_shard_connection_events_total",
+                                    "Shard connects, resumes, disconnects and readies; reconnects are connects beyond the first",
+                                    ("shard", "event"))
+
+
+def shard_config():
+    """
+    Sharding options for the bot from SHARD_COUNT and SHARD_IDS
+
+    Returns:
+        dict | None: AutoShardedBot keyword arguments, or None to run unsharded
+    """
+    count = os.getenv("SHARD_COUNT", "").strip().lower()
+    if not count:
+        return None
+    if count == "auto":
+        # Discord recommends the count; every shard runs here
+        return {"shard_count": None}
+    ids = os.getenv("SHARD_IDS", "").strip()
+    return {
+        "shard_count": int(count),
+        "shard_ids": [int(shard_id) for shard_id in ids.split(",")] if ids else None,
+    }
+
+
+def is_sharded(bot):
+    return isinstance(bot, AutoShardedClient)
+
+
+def shard_count(bot):
+    return bot.shard_count or 1
+
+
+def local_shards(bot):
+    """IDs of the shards this process runs"""
+    if not is_sharded(bot):
+        return [bot.shard_id or 0]
+    if bot.shard_ids is not None:
+        return list(bot.shard_ids)
+    return list(range(shard_count(bot)))
+
+
+def shard_of(bot, guild_id):
+    return (guild_id >> 22) % shard_count(bot)
+
+
+def owns_guild(bot, guild_id):
+    """Whether this process's shards receive the guild's events"""
+    return shard_of(bot, guild_id) in local_shards(bot)
+
+
+def is_elected(bot):
+    """Whether this process runs the once-per-bot jobs: the cluster leader, or else whoever runs ELECTED_SHARD"""
+    leader = getattr(bot, "leader", None)
+    if leader is not None:
+        return leader.held
+    return ELECTED_SHARD in local_shards(bot)
+
+
+async def wait_for_election(bot):
+    """Wait until is_elected means something, i.e. the cluster leader lock has been tried once"""
+    leader = getattr(bot, "leader", None)
+    if leader is not None:
+        await leader.decided.wait()
+
+
+def gateways(bot):
+    """{shard id: websocket} for every shard that has connected"""
+    if not is_sharded(bot):
+        return {bot.shard_id or 0: bot.ws} if bot.ws is not None else {}
+    return {shard_id: shard._parent.ws for shard_id, shard in bot.shards.items()}
+
+
+def instrument_shards(bot):
+    """Per-shard latency, guild count, event rate and connection events for the metrics registry"""
+    # (session, sequence) last seen per shard; the gateway sequence goes up by one per dispatch event
+    seen = {}
+
+    def collect_shards():
+        latencies = bot.latencies if is_sharded(bot) else [(local_shards(bot)[0], bot.latency)]
+        for shard_id, latency in latencies:
+            if latency == latency and latency != float("inf"):
+                SHARD_LATENCY.set(latency, shard=str(shard_id))
+
+        guilds = dict.fromkeys(local_shards(bot), 0)
+        for guild in bot.guilds:
+            guilds[guild.shard_id] = guilds.get(guild.shard_id, 0) + 1
+        for shard_id, count in guilds.items():
+            SHARD_GUILDS.set(count, shard=str(shard_id))
+
+        for shard_id, ws in gateways(bot).items():
+            session, sequence = getattr(ws, "session_id", None), getattr(ws, "sequence", None)
+            if sequence is None:
+                continue
+            last_session, last_sequence = seen.get(shard_id, (None, 0))
+            # A new session starts counting from 1 again
+            received = sequence - last_sequence if session == last_session and sequence >= last_sequence else sequence
+            if received:
+                SHARD_EVENTS.inc(received, shard=str(shard_id))
+            seen[shard_id] = (session, sequence)
+
+    metrics.add_collector(collect_shards)
+
+    def record(event):
+        async def listener(shard_id=None):
+            SHARD_CONNECTIONS.inc(shard=str(local_shards(bot)[0] if shard_id is None else shard_id), event=event)
+        return listener
+
+    # A sharded bot fires both connect and shard_connect, so only listen to the variant that names the shard
+    prefix = "on_shard_" if is_sharded(bot) else "on_"
+    for event in ("connect", "resumed", "disconnect", "ready"):
+        bot.add_listener(record(event), prefix + event)
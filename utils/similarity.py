@@ -0,0 +1,153 @@
+import time
+import numpy as np
+from utils.catalog import normalize_title
+from utils import jsoncodec
+
+"""
+
+    Content-based "similar anime" ranking over the local anime_cache.
+    Every title becomes an L2-normalized genre/tag vector, so one
+    matrix-vector product scores the whole catalog at once.
+
+"""
+
+
+def _load_list(value):
+    """JSON columns come back as str, bytes or already decoded depending on the driver"""
+    if value is None:
+        return []
+    if isinstance(value, (str, bytes, bytearray)):
+        return jsoncodec.loads(value)
+    return value
+
+
+class SimilarityIndex:
+
+    def __init__(self, tag_weight=0.8, min_tag_rank=40):
+        """
+        Args:
+            tag_weight (float): Weight of a rank 100 tag relative to a genre
+            min_tag_rank (int): Tags AniList ranks below this are treated as noise
+        """
+        self.tag_weight = tag_weight
+        self.min_tag_rank = min_tag_rank
+        self.features = {}
+        self.rows = {}
+        self.titles = {}
+        self.entries = []
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.built_at = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _features_of(self, genres, tags):
+        """Yield (feature name, weight) pairs for one title"""
+        for genre in genres:
+            yield f"genre:{genre}", 1.0
+        for tag in tags:
+            rank = tag.get('rank') or 0
+            if rank >= self.min_tag_rank:
+                yield f"tag:{tag['name']}", self.tag_weight * rank / 100
+
+    def build(self, entries):
+        """
+        Build the feature matrix
+
+        Args:
+            entries (list): Dicts with at least 'id', 'genres' and 'tags' keys
+        """
+        features = {}
+        coords = []
+        for row, entry in enumerate(entries):
+            for name, weight in self._features_of(entry['genres'], entry['tags']):
+                column = features.setdefault(name, len(features))
+                coords.append((row, column, weight))
+
+        matrix = np.zeros((len(entries), max(len(features), 1)), dtype=np.float32)
+        if coords:
+            rows, columns, weights = zip(*coords)
+            matrix[rows, columns] = weights
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        matrix /= norms
+
+        self.features = features
+        self.entries = entries
+        self.rows = {entry['id']: row for row, entry in enumerate(entries)}
+        self.titles = {}
+        for entry in entries:
+            for title in (entry['title'].get('romaji'), entry['title'].get('english')):
+                if title:
+                    self.titles[normalize_title(title)] = entry['id']
+        self.matrix = matrix
+        self.built_at = time.time()
+
+    @classmethod
+    def from_cache_rows(cls, cache_rows, **kwargs):
+        """Build an index straight from anime_cache rows"""
+        entries = []
+        for row in cache_rows:
+            entries.append({
+                'id': row['anime_id'],
+                'title': {'romaji': row['title_romaji'], 'english': row['title_english']},
+                'seasonYear': row.get('season_year'),
+                'coverImage': {'large': row.get('cover_image_url')},
+                'siteUrl': row.get('site_url'),
+                'genres': _load_list(row.get('genres')),
+                'tags': _load_list(row.get('tags')),
+            })
+
+        index = cls(**kwargs)
+        index.build(entries)
+        return index
+
+    def vectorize(self, genres, tags):
+        """Turn an arbitrary title into a query vector over this index's features"""
+        vector = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        for name, weight in self._features_of(genres, tags):
+            column = self.features.get(name)
+            if column is not None:
+                vector[column] = weight
+
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def most_similar(self, vector, k=5, exclude=None):
+        """
+        Rank the catalog by cosine similarity to a query vector
+
+        Args:
+            vector (np.ndarray): Normalized query vector from vectorize() or the matrix itself
+            k (int): Number of results
+            exclude (int): Anime id to leave out, usually the query title
+
+        Returns:
+            list: (entry, score) pairs, best first
+        """
+        if not len(self.entries):
+            return []
+
+        scores = self.matrix @ vector
+        if exclude in self.rows:
+            scores[self.rows[exclude]] = -1
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(self.entries[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def find(self, title):
+        """Return the anime id whose romaji or English title matches exactly, if any"""
+        return self.titles.get(normalize_title(title))
+
+    def similar_to(self, anime_id, k=5):
+        """Rank titles similar to one that is already in the index"""
+        row = self.rows.get(anime_id)
+        if row is None:
+            return []
+        return self.most_similar(self.matrix[row], k, exclude=anime_id)
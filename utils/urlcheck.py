@@ -0,0 +1,79 @@
+import asyncio
+import os
+import time
+from utils import metrics
+
+"""
+
+    Remembered reachability checks for user supplied image URLs.
+
+    A URL is checked with a HEAD request when it is saved, and the answer
+    is what the hot path reads. is_valid() never waits on the network: an
+    answer older than its TTL is still returned while a background check
+    refreshes it, and a URL never seen before counts as invalid until its
+    first check finishes. Failures are remembered too, for a shorter TTL,
+    so a dead link costs one request per retry period instead of one per
+    join.
+
+"""
+
+
+class ImageURLValidator:
+
+    def __init__(self, session, ttl=None, failure_ttl=None, timeout=5):
+        """
+        Args:
+            session (aiohttp.ClientSession): Session the HEAD requests go through
+            ttl (int): Seconds a working URL is trusted before a recheck, GREETING_IMAGE_TTL or 6 hours
+            failure_ttl (int): Seconds a failing URL is left alone, GREETING_IMAGE_FAILURE_TTL or 15 minutes
+            timeout (float): Seconds a check may take
+        """
+        self.session = session
+        self.ttl = ttl or int(os.getenv("GREETING_IMAGE_TTL", 6 * 3600))
+        self.failure_ttl = failure_ttl or int(os.getenv("GREETING_IMAGE_FAILURE_TTL", 15 * 60))
+        self.timeout = timeout
+        # {url: (valid, reason, checked at)}
+        self.results = {}
+        self._pending = {}
+
+    async def _check(self, url):
+        try:
+            async with self.session.head(url, timeout=self.timeout, trace_request_ctx={"client": "greeting_images"}) as resp:
+                valid = resp.status == 200
+                reason = None if valid else f"HTTP {resp.status}"
+        except asyncio.TimeoutError:
+            valid, reason = False, f"no answer within {self.timeout}s"
+        except Exception as e:
+            valid, reason = False, type(e).__name__
+        self.results[url] = (valid, reason, time.time())
+        return valid, reason
+
+    def refresh(self, url):
+        """Start a check of url unless one is already running and return its task"""
+        task = self._pending.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._check(url))
+            self._pending[url] = task
+            task.add_done_callback(lambda _: self._pending.pop(url, None))
+        return task
+
+    async def check(self, url):
+        """
+        Check url now, for when it is saved
+
+        Returns:
+            tuple[bool, str|None]: Whether it loads, and why not when it doesn't
+        """
+        return await asyncio.shield(self.refresh(url))
+
+    def is_valid(self, url):
+        """The remembered answer for url, refreshed in the background once it is stale; never waits"""
+        result = self.results.get(url)
+        metrics.record_cache("greeting_images", result is not None)
+        if result is None:
+            self.refresh(url)
+            return False
+        valid, reason, checked_at = result
+        if time.time() - checked_at >= (self.ttl if valid else self.failure_ttl):
+            self.refresh(url)
+        return valid